@@ -0,0 +1,77 @@
+"""
+Benchmarks encode speed against file size for the encoder profiles and presets.
+
+Frames are rendered from a synthetic scene (a moving gradient with moving boxes,
+similar to an overlay on a static background) and encoded with the writer
+parameters of RenderSettings.
+
+Usage:
+    python benchmarks/bench_encoder_profiles.py [--frames 250] [--size 1280x720]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import imageio
+import numpy as np
+
+from observation_library.render_settings import ENCODER_PROFILES, RenderSettings
+
+
+def generate_frames(num_frames, width, height):
+    gradient = np.linspace(0, 255, width, dtype=np.uint8)
+    background = np.repeat(np.tile(gradient, (height, 1))[..., None], 3, axis=2)
+    frames = []
+    for idx in range(num_frames):
+        frame = np.roll(background, 2 * idx, axis=1)
+        x = (7 * idx) % (width - 64)
+        y = (3 * idx) % (height - 64)
+        frame[y : y + 64, x : x + 64] = (255, 105, 101)
+        frames.append(frame)
+    return frames
+
+
+def encode(frames, output_file, render_settings, fps=25):
+    start = time.perf_counter()
+    writer = imageio.get_writer(
+        output_file,
+        fps=fps,
+        macro_block_size=render_settings.macro_block_size,
+        **render_settings.get_writer_parameters(),
+    )
+    for frame in frames:
+        writer.append_data(frame)
+    writer.close()
+    return len(frames) / (time.perf_counter() - start), os.path.getsize(output_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--frames", type=int, default=250)
+    parser.add_argument("--size", type=str, default="1280x720")
+    args = parser.parse_args()
+    width, height = map(int, args.size.split("x"))
+    frames = generate_frames(args.frames, width, height)
+    configurations = [
+        (profile, {"encoder_profile": profile}) for profile in ENCODER_PROFILES
+    ]
+    configurations += [
+        (f"preset {preset}", {"encoder_preset": preset})
+        for preset in RenderSettings().encoder_preset_options
+    ]
+    print(f"{'configuration':<24} {'encode fps':>10} {'size (kB)':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, settings in configurations:
+            render_settings = RenderSettings()
+            for key, value in settings.items():
+                setattr(render_settings, key, value)
+            fps, num_bytes = encode(
+                frames, os.path.join(directory, "snippet.mp4"), render_settings
+            )
+            print(f"{name:<24} {fps:>10.1f} {num_bytes / 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
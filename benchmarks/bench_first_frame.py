@@ -0,0 +1,82 @@
+"""
+Benchmarks the time from selecting a snippet (a row click) to its first decoded frame.
+
+Each click moves the snippet to a random interval, reads its output file as the
+snippet display and cut do, checks the snippet cache, prepares the cut and decodes
+the first frame. With --no-memo, the render job is recomputed on every access as
+before it was memoized.
+
+Usage:
+    python benchmarks/bench_first_frame.py [--video VIDEO] [--clicks 50] [--no-memo]
+"""
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+import imageio
+import numpy as np
+
+from observation_library.video_snippet import VideoSnippet
+
+
+def write_test_video(path, *, num_frames=3000, width=1280, height=720, fps=25):
+    writer = imageio.get_writer(
+        path, fps=fps, codec="libx264", macro_block_size=8, ffmpeg_params=["-g", "250"]
+    )
+    gradient = np.linspace(0, 255, width, dtype=np.uint8)
+    frame = np.repeat(np.tile(gradient, (height, 1))[..., None], 3, axis=2)
+    for idx in range(num_frames):
+        writer.append_data(np.roll(frame, 8 * idx, axis=1))
+    writer.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--video", type=str, default=None)
+    parser.add_argument("--clicks", type=int, default=50)
+    parser.add_argument("--no-memo", action="store_true")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        video = args.video or write_test_video(f"{directory}/video.mp4")
+        snippet = VideoSnippet(
+            [video], start=0, stop=100, video_server_directory=directory
+        )
+        random.seed(0)
+        durations = []
+        for _ in range(args.clicks):
+            start = random.randrange(snippet.cap.total_frames - 200)
+            begin = time.perf_counter()
+            snippet.start, snippet.stop = start, start + 100
+            snippet.observation_data = {
+                "observations": [
+                    {
+                        "category": "a",
+                        "start": start,
+                        "stop": start + 100,
+                        "actor": 1,
+                        "recipient": 2,
+                    }
+                ]
+            }
+            for _ in range(4):
+                if args.no_memo:
+                    snippet._invalidate()
+                _ = snippet.output_file
+            snippet.snippet_cache.contains(snippet.output_file)
+            job = snippet._prepare_cut()
+            next(snippet._read_frames(job))
+            durations.append(time.perf_counter() - begin)
+        durations.sort()
+        print(
+            f"time to first frame ({'no memo' if args.no_memo else 'memo'}): "
+            f"median {1000 * statistics.median(durations):.1f} ms, "
+            f"p95 {1000 * durations[int(0.95 * (len(durations) - 1))]:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmarks random seek latency on a long video, with and without the keyframe index.
+
+A synthetic clip (ffmpeg test pattern, default two hours at 25 fps) is encoded with
+long GOPs and b-frames, the keyframe index is built once (timed) and random frames
+are read with seeking only (no grabbing). Frames read with the index are compared
+with frames read without it.
+
+Usage:
+    python benchmarks/bench_keyframe_seek.py [--video VIDEO] [--minutes 120]
+        [--seeks 100] [--gop 250] [--size 320x180]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+
+import cv2
+import imageio_ffmpeg
+import numpy as np
+
+from observation_library.keyframe_index import load_keyframe_index
+from observation_library.multi_video_capture import MultiVideoCapture
+from observation_library.video_metadata import VideoMetadataStore
+
+
+def write_test_video(path, *, minutes, gop, size, fps=25):
+    subprocess.run(
+        [
+            imageio_ffmpeg.get_ffmpeg_exe(),
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc2=size={size}:rate={fps}",
+            "-t",
+            str(60 * minutes),
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-g",
+            str(gop),
+            "-bf",
+            "2",
+            "-sc_threshold",
+            "0",
+            "-pix_fmt",
+            "yuv420p",
+            path,
+        ],
+        check=True,
+    )
+    return path
+
+
+def seek(cap, frames):
+    latencies = []
+    images = []
+    for frame in frames:
+        begin = time.perf_counter()
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame)
+        ret, img = cap.read()
+        latencies.append(time.perf_counter() - begin)
+        images.append(img if ret else None)
+    return latencies, images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--video", type=str, default=None)
+    parser.add_argument("--minutes", type=float, default=120)
+    parser.add_argument("--seeks", type=int, default=100)
+    parser.add_argument("--gop", type=int, default=250)
+    parser.add_argument("--size", type=str, default="320x180")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        # a fresh cache, so that the keyframe index is built
+        os.environ["OBSERVATION_LIBRARY_CACHE"] = directory
+        video = args.video
+        if video is None:
+            begin = time.perf_counter()
+            video = write_test_video(
+                f"{directory}/video.mp4",
+                minutes=args.minutes,
+                gop=args.gop,
+                size=args.size,
+            )
+            print(f"encoded test video in {time.perf_counter() - begin:.1f} s")
+        begin = time.perf_counter()
+        index = load_keyframe_index(video)
+        assert index is not None
+        print(
+            f"built keyframe index ({index.num_frames} frames, "
+            f"{len(index.keyframes)} keyframes) in {time.perf_counter() - begin:.1f} s"
+        )
+        random.seed(0)
+        frames = [random.randrange(index.num_frames) for _ in range(args.seeks)]
+        results = {}
+        for use_keyframe_index in (False, True):
+            cap = MultiVideoCapture(
+                [video],
+                use_keyframe_index=use_keyframe_index,
+                max_grab_frames=0,  # always seek
+                metadata_store=VideoMetadataStore(directory),
+            )
+            latencies, images = seek(cap, frames)
+            cap.release()
+            results[use_keyframe_index] = images
+            latencies.sort()
+            print(
+                f"use_keyframe_index={use_keyframe_index}: "
+                f"median {1000 * statistics.median(latencies):.1f} ms, "
+                f"p95 {1000 * latencies[int(0.95 * (len(latencies) - 1))]:.1f} ms, "
+                f"max {1000 * latencies[-1]:.1f} ms"
+            )
+        identical = sum(
+            a is not None and b is not None and np.array_equal(a, b)
+            for a, b in zip(results[False], results[True])
+        )
+        print(f"identical frames with and without index: {identical}/{len(frames)}")
+
+
+if __name__ == "__main__":
+    main()
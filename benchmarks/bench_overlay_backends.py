@@ -0,0 +1,91 @@
+"""
+Benchmarks the overlay backends (opencv and matplotlib) on the same clip.
+
+For each backend, the frames of a snippet are decoded once and then overlaid with
+its observation labels (overlay fps), and the snippet is cut end to end, including
+decoding and encoding (cut fps).
+
+Usage:
+    python benchmarks/bench_overlay_backends.py [--video VIDEO] [--frames 250]
+"""
+
+import argparse
+import tempfile
+import time
+
+import imageio
+import numpy as np
+
+from observation_library.overlay import OVERLAY_BACKENDS
+from observation_library.video_snippet import VideoSnippet
+
+
+def write_test_video(path, *, num_frames=500, width=1280, height=720, fps=25):
+    writer = imageio.get_writer(
+        path, fps=fps, codec="libx264", macro_block_size=8, ffmpeg_params=["-g", "250"]
+    )
+    gradient = np.linspace(0, 255, width, dtype=np.uint8)
+    frame = np.repeat(np.tile(gradient, (height, 1))[..., None], 3, axis=2)
+    for idx in range(num_frames):
+        writer.append_data(np.roll(frame, 8 * idx, axis=1))
+    writer.close()
+    return path
+
+
+def get_observation_data(start, stop):
+    # overlapping observations, so that labels change within the snippet
+    step = max(1, (stop - start) // 4)
+    return {
+        "observations": [
+            {
+                "category": f"category {idx}",
+                "start": observation_start,
+                "stop": observation_start + 2 * step,
+                "actor": 1,
+                "recipient": 2,
+            }
+            for idx, observation_start in enumerate(range(start, stop, step))
+        ],
+        "highlight": [0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--video", type=str, default=None)
+    parser.add_argument("--frames", type=int, default=250)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        video = args.video or write_test_video(
+            f"{directory}/video.mp4", num_frames=args.frames + 100
+        )
+        print(f"{'backend':<12} {'overlay fps':>12} {'cut fps':>10}")
+        for backend in OVERLAY_BACKENDS:
+            snippet = VideoSnippet(
+                [video],
+                start=50,
+                stop=50 + args.frames,
+                video_server_directory=f"{directory}/{backend}",
+            )
+            snippet.render_settings.overlay_backend = backend
+            snippet.render_settings.interval_padding = 0
+            snippet.observation_data = get_observation_data(snippet.start, snippet.stop)
+            job = snippet._prepare_cut()
+            frames = list(snippet._read_frames(job))
+            original_size, crop_size, frame_scaled = frames[0]
+            overlay = snippet._get_overlay(
+                original_size, crop_size, frame_scaled.shape[:2][::-1]
+            )
+            begin = time.perf_counter()
+            for idx, (_, _, frame_scaled) in enumerate(frames):
+                job.render(overlay, frame_scaled, idx)
+            overlay_fps = len(frames) / (time.perf_counter() - begin)
+            overlay.close()
+            begin = time.perf_counter()
+            snippet.cut()
+            cut_fps = job.num_frames / (time.perf_counter() - begin)
+            print(f"{backend:<12} {overlay_fps:>12.1f} {cut_fps:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
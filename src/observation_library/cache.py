@@ -0,0 +1,37 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+CACHE_DIRECTORY_VARIABLE = "OBSERVATION_LIBRARY_CACHE"
+
+
+def get_cache_directory(*subdirectories: str) -> str:
+    """
+    Returns (and creates) the cache directory of the package.
+
+    The location defaults to ~/.cache/observation_library and can be configured with
+    the OBSERVATION_LIBRARY_CACHE environment variable.
+    """
+    directory = os.environ.get(
+        CACHE_DIRECTORY_VARIABLE,
+        os.path.join(os.path.expanduser("~"), ".cache", "observation_library"),
+    )
+    directory = os.path.join(directory, *subdirectories)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def get_file_signature(path: str | Path) -> dict[str, str | int]:
+    # cached entries are invalidated when a file is replaced or modified
+    stat = os.stat(path)
+    return {
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+    }
+
+
+def get_file_key(path: str | Path) -> str:
+    signature = json.dumps(get_file_signature(path), sort_keys=True)
+    return hashlib.sha1(signature.encode("utf-8")).hexdigest()
@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from collections.abc import Sequence
+from pathlib import Path
+from threading import RLock
+
+from .multi_video_capture import MultiVideoCapture
+
+
+class CapturePool:
+    """
+    A least-recently-used pool of MultiVideoCapture objects keyed by video files.
+
+    Attributes:
+        max_captures: The maximum number of pooled captures.
+        max_open_files: The maximum number of open video files across all captures.
+    """
+
+    def __init__(self, *, max_captures: int = 16, max_open_files: int = 32):
+        self.max_captures = max_captures
+        self.max_open_files = max_open_files
+        self._captures: OrderedDict[tuple, MultiVideoCapture] = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, video_files: Sequence[str | Path], **kwargs) -> MultiVideoCapture:
+        """
+        Returns a pooled capture for the video files, creating it if necessary.
+
+        Args:
+            video_files: The video files of the capture.
+            **kwargs: Keyword arguments passed to MultiVideoCapture.
+
+        Returns:
+            The capture.
+        """
+        key = (tuple(map(str, video_files)), tuple(sorted(kwargs.items())))
+        evicted = []
+        with self._lock:
+            if key in self._captures:
+                self._captures.move_to_end(key)
+                return self._captures[key]
+            capture = MultiVideoCapture(video_files, **kwargs)
+            capture.on_open = self._on_open
+            self._captures[key] = capture
+            while len(self._captures) > self.max_captures:
+                evicted.append(self._captures.popitem(last=False)[1])
+        # outside of the pool lock, readers of evicted captures may call _on_open
+        for evicted_capture in evicted:
+            evicted_capture.on_open = None
+            # captures in use are released when they are garbage collected
+            if not evicted_capture.lock.acquire(blocking=False):
+                continue
+            try:
+                evicted_capture.release()
+            finally:
+                evicted_capture.lock.release()
+        self._on_open(capture)
+        return capture
+
+    def _on_open(self, capture: MultiVideoCapture) -> None:
+        with self._lock:
+            num_open_files = sum(
+                pooled.num_open_files for pooled in self._captures.values()
+            )
+            for pooled in list(self._captures.values()):
+                if num_open_files <= self.max_open_files:
+                    break
+                if pooled is capture or pooled.num_open_files == 0:
+                    continue
+                # skip captures that are currently read from
+                if not pooled.lock.acquire(blocking=False):
+                    continue
+                try:
+                    num_open_files -= pooled.num_open_files
+                    pooled.release()
+                finally:
+                    pooled.lock.release()
+
+    def clear(self) -> None:
+        with self._lock:
+            captures = list(self._captures.values())
+            self._captures.clear()
+        for capture in captures:
+            capture.on_open = None
+            with capture.lock:
+                capture.release()
+
+
+capture_pool = CapturePool()
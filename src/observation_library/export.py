@@ -0,0 +1,415 @@
+import argparse
+import json
+import os
+import pickle
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Literal, NamedTuple
+
+import pandas as pd
+from vassi.data_structures import Trajectory
+from vassi.dataset import AnnotatedDataset
+from vassi.dataset.utils import GroupIdentifier, IndividualIdentifier
+from vassi.logging import set_logging_level
+
+from .observations import drop_na_observations, get_observation_data
+from .render_settings import RenderSettings
+from .scheduling import plan_render_jobs
+from .video_snippet import VideoSnippet
+
+
+class ExportJob(NamedTuple):
+    index: int
+    group: GroupIdentifier
+    start: int
+    stop: int
+    observation_data: dict[str, list]
+
+
+class ExportResult(NamedTuple):
+    index: int
+    status: Literal["rendered", "skipped", "failed"]
+    output_file: str | None
+    num_frames: int
+    error: str | None = None
+
+
+class ExportSummary(NamedTuple):
+    rendered: int
+    skipped: int
+    failed: list[ExportResult]
+    num_frames: int
+    elapsed: float
+
+    @property
+    def fps(self) -> float:
+        return self.num_frames / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"rendered {self.rendered} snippets ({self.num_frames} frames, "
+            f"{self.fps:.1f} frames/s), skipped {self.skipped} existing, "
+            f"{len(self.failed)} failed in {self.elapsed:.1f}s"
+        )
+
+
+# per worker process, initialized once to avoid pickling trajectories per job
+_worker_snippet: VideoSnippet | None = None
+_worker_video_lookup: dict[GroupIdentifier, Sequence[str | Path]] = {}
+_worker_trajectory_lookup: (
+    dict[GroupIdentifier, dict[IndividualIdentifier, Trajectory]] | None
+) = None
+
+
+def get_render_settings(
+    config: dict[str, Any] | None = None, *, num_keypoints: int | None = None
+) -> RenderSettings:
+    render_settings = RenderSettings()
+    if num_keypoints is not None:
+        render_settings.available_keypoints = list(range(num_keypoints))
+    for key, value in (config or {}).items():
+        setattr(render_settings, key, value)
+    return render_settings
+
+
+def _initialize_worker(
+    video_lookup,
+    trajectory_lookup,
+    render_settings_config,
+    num_keypoints,
+    video_snippet_directory,
+):
+    global _worker_snippet, _worker_video_lookup, _worker_trajectory_lookup
+    _worker_video_lookup = video_lookup
+    _worker_trajectory_lookup = trajectory_lookup
+    _worker_snippet = VideoSnippet(
+        [],
+        start=0,
+        stop=0,
+        render_settings=get_render_settings(
+            render_settings_config, num_keypoints=num_keypoints
+        ),
+        video_server_directory=video_snippet_directory,
+    )
+
+
+def _render_job(job: ExportJob) -> ExportResult:
+    snippet = _worker_snippet
+    if snippet is None:
+        raise ValueError("worker not initialized")
+    output_file = None
+    num_frames = 0
+    try:
+        if _worker_trajectory_lookup is not None:
+            snippet.trajectories = _worker_trajectory_lookup[job.group]
+        snippet.video_files = _worker_video_lookup[job.group]
+        snippet.start = job.start
+        snippet.stop = job.stop
+        snippet.observation_data = job.observation_data
+        output_file = snippet.output_file
+        if snippet.snippet_cache.contains(output_file):
+            return ExportResult(job.index, "skipped", output_file, 0)
+        num_frames = int(snippet.padded_stop) - int(snippet.padded_start)
+        if not snippet.cut():
+            return ExportResult(
+                job.index, "failed", output_file, 0, "could not read all frames"
+            )
+    except Exception as e:  # noqa: BLE001 (reported per job, the export continues)
+        return ExportResult(job.index, "failed", output_file, 0, repr(e))
+    return ExportResult(job.index, "rendered", output_file, num_frames)
+
+
+def _render_group_jobs(jobs: list[ExportJob]) -> list[ExportResult]:
+    snippet = _worker_snippet
+    if snippet is None:
+        raise ValueError("worker not initialized")
+    group = jobs[0].group
+    if _worker_trajectory_lookup is not None:
+        snippet.trajectories = _worker_trajectory_lookup[group]
+    snippet.video_files = _worker_video_lookup[group]
+    results = {}
+    pending = []
+    for job in jobs:
+        snippet.start = job.start
+        snippet.stop = job.stop
+        snippet.observation_data = job.observation_data
+        output_file = snippet.output_file
+        if snippet.snippet_cache.contains(output_file):
+            results[job.index] = ExportResult(job.index, "skipped", output_file, 0)
+            continue
+        num_frames = int(snippet.padded_stop) - int(snippet.padded_start)
+        pending.append((job, output_file, num_frames))
+    # overlapping snippets share decoded frames
+    successes = snippet.cut_many(
+        [
+            {
+                "start": job.start,
+                "stop": job.stop,
+                "observation_data": job.observation_data,
+            }
+            for job, *_ in pending
+        ]
+    )
+    for (job, output_file, num_frames), success in zip(pending, successes):
+        results[job.index] = (
+            ExportResult(job.index, "rendered", output_file, num_frames)
+            if success
+            else ExportResult(
+                job.index, "failed", output_file, 0, "could not read all frames"
+            )
+        )
+    return [results[job.index] for job in jobs]
+
+
+def _render_jobs(jobs: list[ExportJob]) -> list[ExportResult]:
+    # jobs of one video in order of start, the capture is reused between jobs
+    groups: dict[GroupIdentifier, list[ExportJob]] = {}
+    for job in jobs:
+        groups.setdefault(job.group, []).append(job)
+    results = {}
+    for group_jobs in groups.values():
+        try:
+            group_results = _render_group_jobs(group_jobs)
+        except Exception:  # noqa: BLE001
+            # render individually to report errors per job
+            group_results = [_render_job(job) for job in group_jobs]
+        results.update({result.index: result for result in group_results})
+    return [results[job.index] for job in jobs]
+
+
+def get_export_jobs(
+    observations: pd.DataFrame,
+    *,
+    selected_observations_mode: Literal["selected", "dyad"] = "dyad",
+    highlight_observations_mode: (
+        Literal["selected", "category"] | Callable[[dict, dict], bool]
+    ) = "selected",
+) -> list[ExportJob]:
+    return [
+        ExportJob(
+            index=index,
+            group=observation["group"],
+            start=int(observation["start"]),
+            stop=int(observation["stop"]),
+            observation_data=get_observation_data(
+                observations,
+                observation,
+                selected_observations_mode=selected_observations_mode,
+                highlight_observations_mode=highlight_observations_mode,
+            ),
+        )
+        for index, observation in enumerate(observations.to_dict(orient="records"))
+    ]
+
+
+def export_snippets(
+    observations: pd.DataFrame | AnnotatedDataset,
+    *,
+    video_lookup: dict[GroupIdentifier, Sequence[str | Path]],
+    trajectory_lookup: dict[GroupIdentifier, dict[IndividualIdentifier, Trajectory]]
+    | None = None,
+    render_settings: RenderSettings | dict[str, Any] | None = None,
+    num_keypoints: int | None = None,
+    video_snippet_directory: str = "video_snippets",
+    selected_observations_mode: Literal["selected", "dyad"] = "dyad",
+    highlight_observations_mode: (
+        Literal["selected", "category"] | Callable[[dict, dict], bool]
+    ) = "selected",
+    observations_transform: Callable[[pd.DataFrame], pd.DataFrame] | None = None,
+    num_workers: int | None = None,
+    verbose: bool = True,
+) -> ExportSummary:
+    """
+    Renders the video snippets of all observations with a pool of worker processes.
+
+    Snippets are named like in the interactive ObservationLibrary (with the same
+    arguments and render settings), so that existing files are skipped and exports
+    can be resumed after interruptions.
+
+    Returns:
+        An ExportSummary with the number of rendered and skipped snippets, failures
+        and throughput.
+    """
+    if isinstance(observations, AnnotatedDataset):
+        trajectory_lookup = {
+            identifier: group.trajectories for identifier, group in observations
+        }
+        observations = observations.observations
+    observations = drop_na_observations(observations)
+    if observations_transform is not None:
+        observations = observations_transform(observations)
+    if isinstance(render_settings, RenderSettings):
+        render_settings = render_settings.config()
+    jobs = get_export_jobs(
+        observations,
+        selected_observations_mode=selected_observations_mode,
+        highlight_observations_mode=highlight_observations_mode,
+    )
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    chunks = plan_render_jobs(
+        jobs,
+        video_key=lambda job: tuple(map(str, video_lookup.get(job.group, ()))),
+        start_key=lambda job: job.start,
+        num_workers=num_workers,
+    )
+    logger = set_logging_level()
+    results = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        initializer=_initialize_worker,
+        initargs=(
+            video_lookup,
+            trajectory_lookup,
+            render_settings,
+            num_keypoints,
+            video_snippet_directory,
+        ),
+    ) as executor:
+        futures = {executor.submit(_render_jobs, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                chunk_results = future.result()
+            except BrokenProcessPool as e:
+                # a worker crashed, unfinished jobs are rendered when resuming
+                chunk_results = [
+                    ExportResult(job.index, "failed", None, 0, repr(e)) for job in chunk
+                ]
+            for job, result in zip(chunk, chunk_results):
+                results.append(result)
+                if not verbose:
+                    continue
+                if result.status == "failed":
+                    logger.warning(f"Failed to render {job.index}: {result.error}")
+                else:
+                    logger.info(
+                        f"[{len(results)}/{len(jobs)}] {result.status} "
+                        f"{result.output_file}"
+                    )
+    summary = ExportSummary(
+        rendered=sum(result.status == "rendered" for result in results),
+        skipped=sum(result.status == "skipped" for result in results),
+        failed=sorted(
+            [result for result in results if result.status == "failed"],
+            key=lambda result: result.index,
+        ),
+        num_frames=sum(result.num_frames for result in results),
+        elapsed=time.perf_counter() - started,
+    )
+    if verbose:
+        logger.info(str(summary))
+    return summary
+
+
+def _read_observations(path: str) -> pd.DataFrame | AnnotatedDataset:
+    if path.endswith(".csv"):
+        return pd.read_csv(path)
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    # pickled DataFrame or AnnotatedDataset
+    return pd.read_pickle(path)
+
+
+def main(args: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Render video snippets of all observations"
+    )
+    parser.add_argument(
+        "observations",
+        type=str,
+        help="Observations (.csv, .parquet) or pickled DataFrame or AnnotatedDataset",
+    )
+    parser.add_argument(
+        "-v",
+        "--video-lookup",
+        type=str,
+        required=True,
+        help="JSON file mapping groups to lists of video files",
+    )
+    parser.add_argument(
+        "-t",
+        "--trajectory-lookup",
+        type=str,
+        default=None,
+        help="Pickled mapping of groups to trajectories of individuals",
+    )
+    parser.add_argument(
+        "-r",
+        "--render-settings",
+        type=str,
+        default=None,
+        help="JSON file with render settings (see RenderSettings.config)",
+    )
+    parser.add_argument(
+        "-k", "--num-keypoints", type=int, default=None, help="Number of keypoints"
+    )
+    parser.add_argument(
+        "-d",
+        "--directory",
+        type=str,
+        default="video_snippets",
+        help="Video snippet directory (default: video_snippets)",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--selected-observations-mode",
+        choices=["selected", "dyad"],
+        default="dyad",
+    )
+    parser.add_argument(
+        "--highlight-observations-mode",
+        choices=["selected", "category"],
+        default="selected",
+    )
+    parsed_args = parser.parse_args(args)
+
+    observations = _read_observations(parsed_args.observations)
+    with open(parsed_args.video_lookup, "r") as f:
+        video_lookup = json.load(f)
+    trajectory_lookup = None
+    if parsed_args.trajectory_lookup is not None:
+        with open(parsed_args.trajectory_lookup, "rb") as f:
+            trajectory_lookup = pickle.load(f)
+    render_settings = None
+    if parsed_args.render_settings is not None:
+        with open(parsed_args.render_settings, "r") as f:
+            render_settings = json.load(f)
+    # json keys are strings, match them to the group identifiers of the observations
+    groups = (
+        observations.observations["group"]
+        if isinstance(observations, AnnotatedDataset)
+        else observations["group"]
+    )
+    video_lookup = {
+        group: video_lookup[str(group)]
+        for group in groups.unique()
+        if str(group) in video_lookup
+    }
+    summary = export_snippets(
+        observations,
+        video_lookup=video_lookup,
+        trajectory_lookup=trajectory_lookup,
+        render_settings=render_settings,
+        num_keypoints=parsed_args.num_keypoints,
+        video_snippet_directory=parsed_args.directory,
+        selected_observations_mode=parsed_args.selected_observations_mode,
+        highlight_observations_mode=parsed_args.highlight_observations_mode,
+        num_workers=parsed_args.workers,
+    )
+    if len(summary.failed) > 0:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import subprocess
+from pathlib import Path
+from typing import NamedTuple
+
+import cv2
+import imageio_ffmpeg
+import numpy as np
+
+PIXEL_FORMAT_CHANNELS = {"bgr24": 3, "rgb24": 3, "rgba": 4, "bgra": 4}
+
+
+class OutputFormat(NamedTuple):
+    roi: tuple[int, int, int, int] | None  # inclusive (x0, y0, x1, y1)
+    size: tuple[int, int] | None  # (width, height) after cropping
+    pixel_format: str = "bgr24"
+
+
+class FFmpegCapture:
+    """
+    A video reader that decodes through an ffmpeg subprocess, with an interface
+    compatible to cv2.VideoCapture (read, grab, set, get, isOpened, release).
+
+    Frames can be cropped, scaled and converted by ffmpeg before they are piped to
+    python (see set_output).
+
+    Attributes:
+        path: The path to the video file.
+        width: The width of the video.
+        height: The height of the video.
+        fps: The frame rate of the video.
+        frames: The number of frames of the video.
+        frame: The index of the next frame.
+        output: The output format of the frames.
+        threads: The number of ffmpeg decoding threads (0 is automatic).
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        width: int,
+        height: int,
+        fps: float,
+        frames: int = 0,
+        output: OutputFormat | None = None,
+        threads: int = 0,
+    ):
+        self.path = str(path)
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frames = frames
+        self.frame = 0
+        self.output = output if output is not None else OutputFormat(None, None)
+        self.threads = threads
+        self._process: subprocess.Popen | None = None
+
+    def _get_crop(self) -> tuple[int, int, int, int]:
+        # (x, y, width, height) of the region of interest, clipped to the frame
+        roi = self.output.roi
+        if roi is None:
+            return 0, 0, self.width, self.height
+        x0, y0 = max(0, roi[0]), max(0, roi[1])
+        x1, y1 = min(self.width - 1, roi[2]), min(self.height - 1, roi[3])
+        return x0, y0, x1 - x0 + 1, y1 - y0 + 1
+
+    @property
+    def output_shape(self) -> tuple[int, int, int]:
+        _, _, width, height = self._get_crop()
+        if self.output.size is not None:
+            width, height = self.output.size
+        return height, width, PIXEL_FORMAT_CHANNELS[self.output.pixel_format]
+
+    def set_output(self, output: OutputFormat | None = None) -> None:
+        """
+        Sets the output format, the decoder restarts at the current frame.
+
+        Raises:
+            ValueError: If the pixel format is not supported.
+        """
+        if output is None:
+            output = OutputFormat(None, None)
+        if output.pixel_format not in PIXEL_FORMAT_CHANNELS:
+            raise ValueError(f"Unsupported pixel format: {output.pixel_format}")
+        if output == self.output:
+            return
+        self.output = output
+        self._stop()
+
+    def _get_filters(self) -> list[str]:
+        size = self.output.size
+        filters = []
+        if self.output.roi is not None:
+            x, y, width, height = self._get_crop()
+            # exact=1 keeps odd offsets of chroma subsampled videos
+            filters.append(f"crop={width}:{height}:{x}:{y}:exact=1")
+        if size is not None:
+            # bilinear matches the cv2.resize default of crop_and_scale
+            filters.append(f"scale={size[0]}:{size[1]}:flags=bilinear")
+        return filters
+
+    def _start(self) -> None:
+        command = [
+            imageio_ffmpeg.get_ffmpeg_exe(),
+            "-v",
+            "error",
+            "-nostdin",
+            "-threads",
+            str(self.threads),
+        ]
+        if self.frame > 0:
+            # input seeking is exact, frames before the position are decoded and
+            # dropped; seek half a frame early to be robust to rounding
+            command += ["-ss", f"{(self.frame - 0.5) / self.fps:.6f}"]
+        command += ["-i", self.path, "-map", "0:v:0", "-an", "-sn"]
+        if filters := self._get_filters():
+            command += ["-vf", ",".join(filters)]
+        command += [
+            "-fps_mode",
+            "passthrough",
+            "-pix_fmt",
+            self.output.pixel_format,
+            "-f",
+            "rawvideo",
+            "-",
+        ]
+        frame_size = int(np.prod(self.output_shape))
+        self._process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=frame_size,
+        )
+
+    def _stop(self) -> None:
+        if self._process is None:
+            return
+        self._process.kill()
+        if self._process.stdout is not None:
+            self._process.stdout.close()
+        self._process.wait()
+        self._process = None
+
+    def isOpened(self) -> bool:
+        return Path(self.path).is_file()
+
+    def release(self) -> None:
+        self._stop()
+
+    def get(self, prop_id: int) -> int | float:
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        elif prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        elif prop_id == cv2.CAP_PROP_FPS:
+            return self.fps
+        elif prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frames
+        elif prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return self.frame
+        return 0
+
+    def set(self, prop_id: int, value: int) -> bool:
+        if prop_id != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        if value != self.frame:
+            self.frame = int(value)
+            self._stop()
+        return True
+
+    def _read_into(self, buffer: memoryview) -> bool:
+        if self._process is None:
+            self._start()
+        assert self._process is not None and self._process.stdout is not None
+        num_read = 0
+        while num_read < len(buffer):
+            num_bytes = self._process.stdout.readinto(buffer[num_read:])
+            if not num_bytes:
+                # end of stream (or decoding error)
+                self._stop()
+                return False
+            num_read += num_bytes
+        self.frame += 1
+        return True
+
+    def read(self) -> tuple[bool, np.ndarray | None]:
+        frame = np.empty(self.output_shape, dtype=np.uint8)
+        if not self._read_into(memoryview(frame).cast("B")):
+            return False, None
+        return True, frame
+
+    def grab(self) -> bool:
+        return self.read()[0]
+
+    def __del__(self):
+        self._stop()
@@ -0,0 +1,186 @@
+import json
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import NamedTuple
+
+import numpy as np
+from vassi.utils import hash_dict
+
+from .cache import get_cache_directory, get_file_signature
+
+MAX_BYTES_VARIABLE = "OBSERVATION_LIBRARY_FRAME_CACHE_BYTES"
+DEFAULT_MAX_BYTES = 2**30
+
+
+class DecodedFrames(NamedTuple):
+    original_size: tuple[int, int]
+    crop_size: tuple[int, int]
+    frames: np.ndarray  # (frames, height, width, channels), read-only
+
+
+def get_frame_cache_key(
+    video_files, *, start, stop, roi, render_size, pixel_format
+) -> str:
+    """
+    Returns the cache key of decoded, cropped and scaled frames.
+
+    Only the inputs of decoding, cropping and scaling are part of the key, so that
+    overlay settings can change without decoding again.
+    """
+    sources = []
+    for video_file in video_files:
+        try:
+            sources.append(get_file_signature(video_file))
+        except OSError:
+            sources.append(str(video_file))  # e.g., glob patterns
+    return hash_dict(
+        {
+            "sources": sources,
+            "start": int(start),
+            "stop": int(stop),
+            "roi": None if roi is None else list(map(int, roi)),
+            "render_size": None if render_size is None else list(map(int, render_size)),
+            "pixel_format": pixel_format,
+        }
+    )
+
+
+class FrameCache:
+    """
+    A least-recently-used cache of decoded (cropped and scaled) frames, bounded in
+    bytes.
+
+    Frames are kept in memory or, if a directory is specified, stored as
+    memory-mapped numpy files. Snippets larger than the budget are neither cached
+    nor collected while decoding.
+
+    The default budget (1 GiB) can be configured with the
+    OBSERVATION_LIBRARY_FRAME_CACHE_BYTES environment variable (set before importing
+    the package for the shared cache of the user interface, 0 disables it).
+
+    Attributes:
+        max_bytes: The maximum size of all cached frames.
+        directory: The directory of memory-mapped frames (None for in-memory).
+    """
+
+    def __init__(self, *, max_bytes: int | None = None, directory: str | None = None):
+        if max_bytes is None:
+            max_bytes = int(os.environ.get(MAX_BYTES_VARIABLE, DEFAULT_MAX_BYTES))
+        self.max_bytes = max_bytes
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._entries: OrderedDict[str, DecodedFrames] = OrderedDict()
+        self._lock = Lock()
+        self._num_bytes = 0
+        if directory is not None:
+            self._load_directory()
+
+    def _get_files(self, key: str) -> tuple[str, str]:
+        assert self.directory is not None
+        path = os.path.join(self.directory, key)
+        return f"{path}.npy", f"{path}.json"
+
+    def _load_directory(self) -> None:
+        # previously stored frames, least recently used first
+        assert self.directory is not None
+        files = [
+            os.path.join(self.directory, file_name)
+            for file_name in os.listdir(self.directory)
+            if file_name.endswith(".json")
+        ]
+        for metadata_file in sorted(files, key=os.path.getmtime):
+            key = os.path.splitext(os.path.basename(metadata_file))[0]
+            try:
+                with open(metadata_file, "r") as f:
+                    metadata = json.load(f)
+                frames = np.load(self._get_files(key)[0], mmap_mode="r")
+            except (OSError, ValueError, KeyError):
+                continue
+            self._insert(
+                key,
+                DecodedFrames(
+                    tuple(metadata["original_size"]),
+                    tuple(metadata["crop_size"]),
+                    frames,
+                ),
+            )
+
+    def accepts(self, num_bytes: int) -> bool:
+        return num_bytes <= self.max_bytes
+
+    def get(self, key: str) -> DecodedFrames | None:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(
+        self,
+        key: str,
+        *,
+        original_size: tuple[int, int],
+        crop_size: tuple[int, int],
+        frames: np.ndarray,
+    ) -> None:
+        """
+        Stores decoded frames, evicting least-recently-used frames if necessary.
+
+        Args:
+            key: The cache key (see get_frame_cache_key).
+            original_size: The size of the video.
+            crop_size: The size of the region of interest.
+            frames: The cropped and scaled frames, made read-only when kept in memory.
+        """
+        if not self.accepts(frames.nbytes):
+            return
+        original_size = tuple(map(int, original_size))
+        crop_size = tuple(map(int, crop_size))
+        if self.directory is not None:
+            frames_file, metadata_file = self._get_files(key)
+            temp_file = f"{frames_file}.{os.getpid()}.tmp.npy"
+            np.save(temp_file, frames)
+            os.replace(temp_file, frames_file)
+            with open(metadata_file, "w") as f:
+                json.dump({"original_size": original_size, "crop_size": crop_size}, f)
+            frames = np.load(frames_file, mmap_mode="r")
+        else:
+            frames.flags.writeable = False
+        with self._lock:
+            self._insert(key, DecodedFrames(original_size, crop_size, frames))
+
+    def _insert(self, key: str, entry: DecodedFrames) -> None:
+        if key in self._entries:
+            self._num_bytes -= self._entries.pop(key).frames.nbytes
+        self._entries[key] = entry
+        self._num_bytes += entry.frames.nbytes
+        while self._num_bytes > self.max_bytes and len(self._entries) > 0:
+            self._evict()
+
+    def _evict(self) -> None:
+        key, entry = self._entries.popitem(last=False)
+        self._num_bytes -= entry.frames.nbytes
+        if self.directory is None:
+            return
+        for file in self._get_files(key):
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            while len(self._entries) > 0:
+                self._evict()
+
+
+def get_disk_frame_cache(max_bytes: int = 8 * 2**30) -> FrameCache:
+    """
+    Returns a memory-mapped frame cache in the package cache directory.
+    """
+    return FrameCache(max_bytes=max_bytes, directory=get_cache_directory("frames"))
+
+
+frame_cache = FrameCache()
@@ -0,0 +1,482 @@
+import glob
+import json
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Protocol
+
+import cv2
+import numpy as np
+
+from .ffmpeg_capture import FFmpegCapture, OutputFormat
+from .video_metadata import VideoMetadata
+
+MEMMAP_HEADER_SIZE = 4096
+MEMMAP_FORMAT = "observation_library.frames"
+MEMMAP_EXTENSIONS = (".frames", ".npy")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+SEQUENCE_METADATA_FILE = "metadata.json"
+
+
+class FrameSource(Protocol):
+    """
+    The interface of frame sources (single video files) read by MultiVideoCapture.
+
+    It is a subset of the cv2.VideoCapture interface, with positions in frames.
+    """
+
+    @property
+    def frames(self) -> int: ...
+
+    def read(self) -> tuple[bool, np.ndarray | None]: ...
+
+    def grab(self) -> bool: ...
+
+    def set(self, prop_id: int, value: int) -> bool: ...
+
+    def get(self, prop_id: int) -> int | float: ...
+
+    def isOpened(self) -> bool: ...
+
+    def release(self) -> None: ...
+
+
+class OpenCVFrameSource:
+    """
+    A frame source decoding with cv2.VideoCapture.
+    """
+
+    def __init__(self, path: str | Path, *, cap: cv2.VideoCapture | None = None):
+        self.cap = cap if cap is not None else cv2.VideoCapture(str(path))
+
+    @property
+    def frames(self) -> int:
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def read(self) -> tuple[bool, np.ndarray | None]:
+        return self.cap.read()
+
+    def grab(self) -> bool:
+        return self.cap.grab()
+
+    def set(self, prop_id: int, value: int) -> bool:
+        return self.cap.set(prop_id, value)
+
+    def get(self, prop_id: int) -> int | float:
+        return self.cap.get(prop_id)
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def release(self) -> None:
+        self.cap.release()
+
+
+def is_memmap_file(path: str | Path) -> bool:
+    return Path(path).suffix.lower() in MEMMAP_EXTENSIONS
+
+
+def _read_memmap_header(path: str | Path) -> dict:
+    with open(path, "rb") as f:
+        header = f.read(MEMMAP_HEADER_SIZE)
+    try:
+        header = json.loads(header.decode("utf-8"))
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get("format") != MEMMAP_FORMAT:
+        raise ValueError(f"Invalid frame store: {path}")
+    return header
+
+
+def _load_memmap(path: str | Path) -> tuple[np.ndarray, float]:
+    if Path(path).suffix.lower() == ".npy":
+        data = np.load(path, mmap_mode="r")
+        # numpy files do not store a frame rate, read it from a sidecar file
+        sidecar_file = Path(path).with_suffix(".json")
+        if not sidecar_file.is_file():
+            raise ValueError(f"Missing frame rate of frame store: {sidecar_file}")
+        with open(sidecar_file, "r") as f:
+            fps = float(json.load(f)["fps"])
+    else:
+        header = _read_memmap_header(path)
+        data = np.memmap(
+            path,
+            dtype=np.uint8,
+            mode="r",
+            offset=MEMMAP_HEADER_SIZE,
+            shape=tuple(header["shape"]),
+        )
+        fps = float(header["fps"])
+    if data.dtype != np.uint8 or data.ndim != 4:
+        raise ValueError(f"Frame stores must be uint8 arrays (frames, h, w, c): {path}")
+    return data, fps
+
+
+def load_memmap_metadata(path: str | Path) -> VideoMetadata:
+    data, fps = _load_memmap(path)
+    frames, height, width = data.shape[:3]
+    return VideoMetadata(
+        width=width, height=height, fps=fps, frames=frames, verified=True
+    )
+
+
+class MemmapFrameSource:
+    """
+    A frame source reading from a memory-mapped store of decoded (BGR) frames.
+
+    Stores are either numpy files (.npy, with the frame rate in a .json sidecar
+    file) or raw frames (.frames) following a JSON header (see transcode_to_memmap).
+    Seeking is O(1) and frames are returned as read-only views without copying.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = str(path)
+        self.data, self.fps = _load_memmap(path)
+        self.frame = 0
+
+    @property
+    def frames(self) -> int:
+        return self.data.shape[0]
+
+    def read(self) -> tuple[bool, np.ndarray | None]:
+        if self.frame >= self.frames:
+            return False, None
+        frame = np.asarray(self.data[self.frame])
+        self.frame += 1
+        return True, frame
+
+    def grab(self) -> bool:
+        if self.frame >= self.frames:
+            return False
+        self.frame += 1
+        return True
+
+    def set(self, prop_id: int, value: int) -> bool:
+        if prop_id != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        self.frame = min(max(0, int(value)), self.frames)
+        return True
+
+    def get(self, prop_id: int) -> int | float:
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.data.shape[2]
+        elif prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.data.shape[1]
+        elif prop_id == cv2.CAP_PROP_FPS:
+            return self.fps
+        elif prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frames
+        elif prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return self.frame
+        return 0
+
+    def isOpened(self) -> bool:
+        return True
+
+    def release(self) -> None:
+        pass  # the memory map is closed when garbage collected
+
+
+def is_image_sequence(path: str | Path) -> bool:
+    if os.path.isdir(path):
+        return True
+    # file names may contain glob characters (e.g., rec[1].mp4), patterns must
+    # select image files
+    return (
+        not os.path.exists(path)
+        and glob.has_magic(str(path))
+        and os.path.splitext(str(path))[1].lower() in IMAGE_EXTENSIONS
+    )
+
+
+def get_snippet_name(path: str | Path) -> tuple[str, str]:
+    """
+    Returns the name and container extension of snippets cut from a video file.
+    """
+    if is_image_sequence(path):
+        directory = str(path) if os.path.isdir(path) else os.path.dirname(str(path))
+        return os.path.basename(os.path.normpath(directory)), ".mp4"
+    name, ext = os.path.splitext(os.path.basename(path))
+    if is_memmap_file(path):
+        return name, ".mp4"
+    return name, ext
+
+
+def _natural_sort_key(path: str) -> list[str | int]:
+    # frame_2.png before frame_10.png
+    return [
+        int(part) if part.isdigit() else part
+        for part in re.split(r"(\d+)", os.path.basename(path))
+    ]
+
+
+def list_image_files(path: str | Path) -> list[str]:
+    """
+    Lists the (naturally sorted) image files of an image sequence.
+
+    Args:
+        path: A directory of images or a glob pattern.
+
+    Returns:
+        The image files.
+    """
+    if os.path.isdir(path):
+        files = [
+            os.path.join(path, file_name)
+            for file_name in os.listdir(path)
+            if os.path.splitext(file_name)[1].lower() in IMAGE_EXTENSIONS
+        ]
+    else:
+        files = glob.glob(str(path))
+    return sorted(files, key=_natural_sort_key)
+
+
+def _decode_image(path: str) -> np.ndarray:
+    # reading and decoding release the GIL
+    frame = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError(f"Error decoding image: {path}")
+    return frame
+
+
+def load_image_sequence_metadata(
+    path: str | Path, *, fps: float | None = None
+) -> VideoMetadata:
+    """
+    Returns the metadata of an image sequence.
+
+    The frame rate is read from a metadata.json file ({"fps": ...}) in the image
+    directory, if it exists, and otherwise has to be specified.
+
+    Args:
+        path: A directory of images or a glob pattern.
+        fps: The frame rate of the image sequence.
+
+    Returns:
+        The metadata of the image sequence.
+
+    Raises:
+        ValueError: If the sequence contains no images or has no frame rate.
+    """
+    files = list_image_files(path)
+    if len(files) == 0:
+        raise ValueError(f"No images found: {path}")
+    directory = str(path) if os.path.isdir(path) else os.path.dirname(str(path))
+    metadata_file = os.path.join(directory, SEQUENCE_METADATA_FILE)
+    if os.path.isfile(metadata_file):
+        with open(metadata_file, "r") as f:
+            fps = float(json.load(f)["fps"])
+    if fps is None:
+        raise ValueError(f"Specify the frame rate of the image sequence: {path}")
+    height, width = _decode_image(files[0]).shape[:2]
+    return VideoMetadata(
+        width=width, height=height, fps=fps, frames=len(files), verified=True
+    )
+
+
+class ImageSequenceSource:
+    """
+    A frame source reading a sequence of image files (e.g., JPEG or PNG frames).
+
+    Images ahead of the read position are decoded in a thread pool, seeking is exact.
+
+    Attributes:
+        files: The image files.
+        fps: The frame rate of the sequence.
+        read_ahead: The maximum number of frames decoded ahead of the read position.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        fps: float,
+        read_ahead: int = 16,
+        num_workers: int | None = None,
+    ):
+        self.files = list_image_files(path)
+        self.fps = fps
+        self.read_ahead = max(1, read_ahead)
+        self.frame = 0
+        self._num_workers = num_workers
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending: OrderedDict[int, Future] = OrderedDict()
+        self._size: tuple[int, int] | None = None
+
+    @property
+    def frames(self) -> int:
+        return len(self.files)
+
+    def _schedule(self) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._num_workers,
+                thread_name_prefix="image_sequence",
+            )
+        # drop frames outside of the read-ahead window, e.g., after seeking
+        window = range(self.frame, min(self.frames, self.frame + self.read_ahead))
+        for frame in list(self._pending):
+            if frame not in window:
+                self._pending.pop(frame).cancel()
+        for frame in window:
+            if frame not in self._pending:
+                self._pending[frame] = self._executor.submit(
+                    _decode_image, self.files[frame]
+                )
+
+    def read(self) -> tuple[bool, np.ndarray | None]:
+        if self.frame >= self.frames:
+            return False, None
+        self._schedule()
+        try:
+            frame = self._pending.pop(self.frame).result()
+        except ValueError:
+            return False, None
+        self.frame += 1
+        return True, frame
+
+    def grab(self) -> bool:
+        if self.frame >= self.frames:
+            return False
+        self.frame += 1
+        return True
+
+    def set(self, prop_id: int, value: int) -> bool:
+        if prop_id != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        self.frame = min(max(0, int(value)), self.frames)
+        return True
+
+    def get(self, prop_id: int) -> int | float:
+        if prop_id in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT):
+            if self._size is None:
+                height, width = _decode_image(self.files[0]).shape[:2]
+                self._size = (width, height)
+            return self._size[0 if prop_id == cv2.CAP_PROP_FRAME_WIDTH else 1]
+        elif prop_id == cv2.CAP_PROP_FPS:
+            return self.fps
+        elif prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frames
+        elif prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return self.frame
+        return 0
+
+    def isOpened(self) -> bool:
+        return self.frames > 0
+
+    def release(self) -> None:
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def open_frame_source(
+    path: str | Path,
+    *,
+    backend: str,
+    metadata: VideoMetadata,
+    output: OutputFormat | None = None,
+) -> FrameSource:
+    """
+    Opens a frame source for a video file.
+
+    Frame stores (see MEMMAP_EXTENSIONS) are always memory-mapped and directories or
+    glob patterns are read as image sequences, other files are decoded with the given
+    backend.
+
+    Args:
+        path: The path to the video file.
+        backend: The decoding backend, "opencv" or "ffmpeg".
+        metadata: The metadata of the video file.
+        output: The output format of the ffmpeg backend.
+
+    Returns:
+        The frame source.
+
+    Raises:
+        ValueError: If the backend is not supported.
+    """
+    if is_memmap_file(path):
+        return MemmapFrameSource(path)
+    if is_image_sequence(path):
+        return ImageSequenceSource(path, fps=metadata.fps)
+    if backend == "ffmpeg":
+        return FFmpegCapture(
+            path,
+            width=metadata.width,
+            height=metadata.height,
+            fps=metadata.fps,
+            frames=metadata.frames,
+            output=output,
+        )
+    if backend == "opencv":
+        return OpenCVFrameSource(path)
+    raise ValueError(f"Unsupported backend: {backend}")
+
+
+def transcode_to_memmap(
+    video_file: str | Path, output_file: str | Path | None = None
+) -> str:
+    """
+    Decodes a video file once into a memory-mappable frame store.
+
+    Frame stores can be used in place of the video file (e.g., in video lookups) for
+    exact seeking without decoding. Note that they are uncompressed (width * height *
+    3 bytes per frame).
+
+    Args:
+        video_file: The path to the video file.
+        output_file: The path of the frame store, defaults to the video file with the
+            .frames extension.
+
+    Returns:
+        The path of the frame store.
+
+    Raises:
+        ValueError: If the video cannot be opened.
+    """
+    if output_file is None:
+        output_file = Path(video_file).with_suffix(".frames")
+    output_file = str(output_file)
+    cap = cv2.VideoCapture(str(video_file))
+    if not cap.isOpened():
+        raise ValueError(f"Error opening video: {video_file}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    shape = None
+    num_frames = 0
+    temp_file = f"{output_file}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, "wb") as f:
+            # the header is written last, when the number of frames is known
+            f.write(b" " * MEMMAP_HEADER_SIZE)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if shape is None:
+                    shape = frame.shape
+                f.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+                num_frames += 1
+            if shape is None:
+                raise ValueError(f"Error reading video: {video_file}")
+            header = json.dumps(
+                {
+                    "format": MEMMAP_FORMAT,
+                    "shape": [num_frames, *shape],
+                    "fps": fps,
+                    "pixel_format": "bgr24",
+                }
+            ).encode("utf-8")
+            f.seek(0)
+            f.write(header.ljust(MEMMAP_HEADER_SIZE, b" "))
+        os.replace(temp_file, output_file)
+    finally:
+        cap.release()
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+    return output_file
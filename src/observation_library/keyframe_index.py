@@ -0,0 +1,121 @@
+import json
+import os
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+from .cache import get_cache_directory, get_file_key
+
+
+class KeyframeIndex(NamedTuple):
+    keyframes: tuple[int, ...]  # sorted frame indices of keyframes
+    num_frames: int  # number of video packets
+    timestamps: tuple[float, ...] = ()  # sorted presentation timestamps (pts)
+
+    def get_keyframe(self, frame: int) -> int:
+        """
+        Returns the last keyframe at or before the given frame.
+        """
+        idx = bisect_right(self.keyframes, frame) - 1
+        if idx < 0:
+            return 0
+        return self.keyframes[idx]
+
+    def get_frame(self, timestamp: float) -> int | None:
+        """
+        Returns the frame index of a presentation timestamp, or None if not indexed.
+        """
+        idx = bisect_left(self.timestamps, timestamp)
+        if idx < len(self.timestamps) and self.timestamps[idx] == timestamp:
+            return idx
+        return None
+
+
+def scan_keyframes(path: str | Path) -> KeyframeIndex:
+    """
+    Builds a keyframe index by reading all video packets without decoding them.
+
+    Args:
+        path: The path to the video file.
+
+    Returns:
+        The keyframe index.
+
+    Raises:
+        ValueError: If the video cannot be opened.
+    """
+    cap = cv2.VideoCapture(str(path), cv2.CAP_FFMPEG)
+    if not cap.isOpened():
+        raise ValueError(f"Error opening video: {path}")
+    # raw stream mode, grab only demuxes packets
+    cap.set(cv2.CAP_PROP_FORMAT, -1)
+    pts_property = getattr(cv2, "CAP_PROP_PTS", None)
+    timestamps = []
+    is_keyframe = []
+    while cap.grab():
+        is_keyframe.append(bool(cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME)))
+        timestamps.append(
+            cap.get(pts_property) if pts_property is not None else len(timestamps)
+        )
+    cap.release()
+    # packets are in decoding order, frame indices follow presentation timestamps
+    timestamps = np.asarray(timestamps, dtype=float)
+    frame_indices = np.empty(len(timestamps), dtype=int)
+    frame_indices[np.argsort(timestamps, kind="stable")] = np.arange(len(timestamps))
+    keyframes = sorted(frame_indices[np.asarray(is_keyframe, dtype=bool)].tolist())
+    return KeyframeIndex(
+        keyframes=tuple(keyframes),
+        num_frames=len(timestamps),
+        timestamps=(
+            tuple(np.sort(timestamps).tolist()) if pts_property is not None else ()
+        ),
+    )
+
+
+def load_keyframe_index(
+    path: str | Path, *, build: bool = True
+) -> KeyframeIndex | None:
+    """
+    Loads the cached keyframe index of a video file, optionally building it first.
+
+    Indices are cached per file path, size and modification time.
+
+    Args:
+        path: The path to the video file.
+        build: Whether to scan the video if no index is cached.
+
+    Returns:
+        The keyframe index, or None if not cached and build is False.
+    """
+    cache_file = os.path.join(
+        get_cache_directory("keyframes"), f"{get_file_key(path)}.json"
+    )
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, "r") as f:
+                data = json.load(f)
+            return KeyframeIndex(
+                keyframes=tuple(data["keyframes"]),
+                num_frames=data["num_frames"],
+                timestamps=tuple(data["timestamps"]),
+            )
+        except (OSError, ValueError, KeyError):
+            pass  # rebuild
+    if not build:
+        return None
+    index = scan_keyframes(path)
+    temp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(temp_file, "w") as f:
+        json.dump(
+            {
+                "keyframes": list(index.keyframes),
+                "num_frames": index.num_frames,
+                "timestamps": list(index.timestamps),
+            },
+            f,
+        )
+    os.replace(temp_file, cache_file)
+    return index
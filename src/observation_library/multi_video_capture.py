@@ -1,15 +1,35 @@
-from typing import Tuple
+from bisect import bisect_right
+from collections.abc import Callable
+from threading import RLock
+from typing import Literal, Tuple
 
 import cv2
 import numpy as np
 
+from .ffmpeg_capture import FFmpegCapture, OutputFormat
+from .frame_sources import (
+    FrameSource,
+    OpenCVFrameSource,
+    is_image_sequence,
+    is_memmap_file,
+    load_image_sequence_metadata,
+    load_memmap_metadata,
+    open_frame_source,
+)
+from .keyframe_index import KeyframeIndex, load_keyframe_index
+from .video_metadata import VideoMetadata, VideoMetadataStore, get_metadata_store
+
 
 class MultiVideoCapture:
     """
     A class for managing multiple video captures as a single unified stream.
 
+    Each video file is read by a frame source (see frame_sources.FrameSource), frame
+    stores (.frames, .npy) are memory-mapped, directories or glob patterns are read
+    as image sequences and other files are decoded with the selected backend.
+
     Attributes:
-        video_captures: A list of OpenCV VideoCapture objects.
+        video_captures: A list of frame sources (None if not opened).
         width: The width of the videos.
         height: The height of the videos.
         fps: The frame rate of the videos.
@@ -18,57 +38,107 @@ class MultiVideoCapture:
         cumulative_frames: A list of the cumulative frame counts for each video.
         frame: The current frame index.
         active_cap_idx: The index of the currently active video capture.
+        max_grab_frames: Maximum distance for which forward seeks grab frames instead.
+        use_keyframe_index: Whether seeks use (cached) keyframe indices of the videos.
+        backend: The reader backend, "opencv" or "ffmpeg".
 
     Methods:
         get(prop_id): Returns the value of the specified property.
         set(prop_id, value): Sets the value of the specified property.
         read(): Reads the next frame from the active video capture.
+        grab(): Grabs (decodes without retrieving) the next frame.
+        release(): Releases all open video files.
     """
 
-    def __init__(self, video_paths):
+    def __init__(
+        self,
+        video_paths,
+        *,
+        max_grab_frames: int = 250,
+        use_keyframe_index: bool = False,
+        verify_frame_count: bool = False,
+        metadata_store: VideoMetadataStore | None = None,
+        backend: Literal["opencv", "ffmpeg"] = "opencv",
+        sequence_fps: float | None = None,
+    ):
         """
         Initializes the MultiVideoCapture object.
 
         Args:
             video_paths: A list of paths to the video files.
+            max_grab_frames: Forward seeks up to this number of frames are performed by
+                grabbing frames instead of seeking, which is faster for long-GOP videos.
+            use_keyframe_index: Seek to the preceding keyframe and grab forward to the
+                exact frame. Keyframe indices are built on first use and cached.
+            verify_frame_count: Count the frames of each video once instead of trusting
+                the container header (e.g., for variable frame rate or damaged files).
+            metadata_store: The store for video metadata, defaults to the persistent
+                store in the package cache directory.
+            backend: The reader backend. The ffmpeg backend decodes in an ffmpeg
+                subprocess and can crop, scale and convert frames (see set_output).
+            sequence_fps: The frame rate of image sequences without a metadata.json
+                file in their directory.
 
         Raises:
             ValueError: If a video file cannot be opened or if the videos have different dimensions or frame rates.
         """
         if len(video_paths) == 0:
             raise ValueError("Specify at least one video")
+        if backend not in ("opencv", "ffmpeg"):
+            raise ValueError(f"Unsupported backend: {backend}")
 
-        self.video_captures = []
+        self.video_paths = list(video_paths)
+        # captures are opened lazily when a seek or read reaches them
+        self.video_captures: list[FrameSource | None] = []
         self._width, self._height, self._fps = None, None, None
         self.total_frames = 0
         self.frames = []
         self.cumulative_frames = []  # Cumulative frame count for each video
 
+        if metadata_store is None:
+            metadata_store = get_metadata_store()
         for path in video_paths:
-            cap = cv2.VideoCapture(str(path))
-            if not cap.isOpened():
-                raise ValueError(f"Error opening video: {path}")
+            cap = None
+            if is_memmap_file(path):
+                metadata = load_memmap_metadata(path)
+            elif is_image_sequence(path):
+                metadata = load_image_sequence_metadata(path, fps=sequence_fps)
+            elif (metadata := metadata_store.get(path)) is None or (
+                verify_frame_count and not metadata.verified
+            ):
+                cap = cv2.VideoCapture(str(path))
+                metadata = metadata_store.load(path, cap=cap, verify=verify_frame_count)
 
             # Validate dimensions and FPS
-            width, height, fps = (
-                int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
-                int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
-                cap.get(cv2.CAP_PROP_FPS),
-            )
+            width, height, fps = metadata.width, metadata.height, metadata.fps
             if self._width is None:
                 self._width, self._height, self._fps = width, height, fps
             else:
                 if width != self.width or height != self.height or fps != self.fps:
                     raise ValueError("All videos must have the same dimensions and FPS")
 
+            # the probing capture is only kept by the backend that decodes with it
+            if cap is not None and backend == "opencv":
+                cap = OpenCVFrameSource(path, cap=cap)
+            elif cap is not None:
+                cap.release()
+                cap = None
             self.video_captures.append(cap)
-            frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            frames = metadata.frames
             self.total_frames += frames
             self.frames.append(frames)
             self.cumulative_frames.append(self.total_frames)
 
         self.frame = 0
         self.active_cap_idx = 0
+        self.max_grab_frames = max_grab_frames
+        self.use_keyframe_index = use_keyframe_index
+        self.backend = backend
+        self.output: OutputFormat | None = None
+        self._keyframe_indices: dict[int, KeyframeIndex | None] = {}
+        # held while reading, pooled captures may be shared between snippets
+        self.lock = RLock()
+        self.on_open: Callable[[MultiVideoCapture], None] | None = None
 
     @property
     def width(self) -> int:
@@ -115,11 +185,96 @@ class MultiVideoCapture:
             raise ValueError("Unsupported property ID")
 
     @property
-    def cap(self) -> cv2.VideoCapture:
+    def num_open_files(self) -> int:
+        return sum(cap is not None for cap in self.video_captures)
+
+    def _open(self, idx: int) -> bool:
+        # returns whether the capture was (re)opened, i.e., is at its first frame
+        if self.video_captures[idx] is not None:
+            return False
+        cap = open_frame_source(
+            self.video_paths[idx],
+            backend=self.backend,
+            metadata=VideoMetadata(
+                width=self.width,
+                height=self.height,
+                fps=self.fps,
+                frames=self.frames[idx],
+            ),
+            output=self.output,
+        )
+        if not cap.isOpened():
+            raise ValueError(f"Error opening video: {self.video_paths[idx]}")
+        self.video_captures[idx] = cap
+        if self.on_open is not None:
+            self.on_open(self)
+        return True
+
+    @property
+    def supports_output(self) -> bool:
+        """
+        Whether frames can be cropped, scaled and converted while decoding.
+        """
+        return self.backend == "ffmpeg" and not any(
+            is_memmap_file(path) or is_image_sequence(path) for path in self.video_paths
+        )
+
+    def set_output(
+        self,
+        *,
+        roi: tuple[int, int, int, int] | None = None,
+        size: tuple[int, int] | None = None,
+        pixel_format: str = "bgr24",
+    ) -> None:
+        """
+        Sets decoder-side cropping, scaling and pixel format of the read frames.
+
+        Calling without arguments restores full-resolution BGR frames.
+
+        Args:
+            roi: The inclusive region of interest (x0, y0, x1, y1) to crop.
+            size: The (width, height) to scale the (cropped) frames to.
+            pixel_format: The ffmpeg pixel format of the frames, e.g. "rgb24".
+
+        Raises:
+            ValueError: If the backend is not "ffmpeg" or not all files are videos.
+        """
+        if not self.supports_output:
+            raise ValueError("Decoder-side output formats require the ffmpeg backend")
+        output = OutputFormat(
+            roi=tuple(map(int, roi)) if roi is not None else None,
+            size=tuple(map(int, size)) if size is not None else None,
+            pixel_format=pixel_format,
+        )
+        self.output = output
+        for cap in self.video_captures:
+            if isinstance(cap, FFmpegCapture):
+                cap.set_output(output)
+
+    def release(self) -> None:
+        """
+        Releases all open video files, they are reopened when needed.
+        """
+        for idx, cap in enumerate(self.video_captures):
+            if cap is None:
+                continue
+            cap.release()
+            self.video_captures[idx] = None
+
+    @property
+    def cap(self) -> FrameSource:
         """
         Returns the currently active VideoCapture object.
         """
-        return self.video_captures[self.active_cap_idx]
+        if self._open(self.active_cap_idx):
+            # restore the position after lazily (re)opening
+            frame = self.frame - ([0] + self.cumulative_frames)[self.active_cap_idx]
+            if frame > 0:
+                self._seek(frame)
+        cap = self.video_captures[self.active_cap_idx]
+        if cap is None:
+            raise ValueError("not initialized")
+        return cap
 
     def set(self, prop_id: int, value: int) -> None:
         """
@@ -136,16 +291,69 @@ class MultiVideoCapture:
             raise ValueError("Unsupported property ID")
         if value < 0 or value > self.total_frames - 1:
             raise ValueError(f"Frame must be within [0, {self.total_frames - 1}]")
-        first_frame = 0
-        idx = 0
-        for idx, _ in enumerate(self.video_captures):
-            first_frame = ([0] + self.cumulative_frames)[idx]
-            last_frame = self.cumulative_frames[idx] - 1
-            if value >= first_frame and value < last_frame:
-                break
+        if 0 <= value - self.frame <= self.max_grab_frames:
+            # reading forward is cheaper than seeking for short distances
+            while self.frame < value:
+                if not self.grab():
+                    break
+            if self.frame == value:
+                return
+        idx = min(
+            bisect_right(self.cumulative_frames, value), len(self.video_captures) - 1
+        )
+        first_frame = ([0] + self.cumulative_frames)[idx]
         self.frame = value
         self.active_cap_idx = idx
-        self.cap.set(prop_id, value - first_frame)
+        if not self._open(idx) or value > first_frame:
+            self._seek(value - first_frame)
+
+    def _get_keyframe_index(self, idx: int) -> KeyframeIndex | None:
+        if idx not in self._keyframe_indices:
+            try:
+                self._keyframe_indices[idx] = load_keyframe_index(self.video_paths[idx])
+            except (OSError, ValueError):
+                self._keyframe_indices[idx] = None
+        return self._keyframe_indices[idx]
+
+    def _seek(self, frame: int) -> None:
+        # seek within the active video capture, only opencv seeks can be inexact
+        if (
+            not isinstance(self.cap, OpenCVFrameSource)
+            or not self.use_keyframe_index
+            or (keyframe_index := self._get_keyframe_index(self.active_cap_idx)) is None
+        ):
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame)
+            return
+        keyframe = keyframe_index.get_keyframe(frame)
+        while True:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+            # opencv estimates frames from timestamps, confirm where the seek landed
+            landed = self._get_landed_frame(keyframe_index, keyframe)
+            if landed <= frame or keyframe == 0:
+                break
+            # overshot the target, retry from the previous keyframe
+            keyframe = keyframe_index.get_keyframe(keyframe - 1)
+        for _ in range(frame - landed):
+            if not self.cap.grab():
+                break
+
+    def _get_landed_frame(self, keyframe_index: KeyframeIndex, keyframe: int) -> int:
+        # the next frame to be read after seeking to keyframe
+        if keyframe == 0:
+            return 0  # rewinding is exact
+        # after seeking, the pts is the one of the frame preceding the position
+        timestamp = self.cap.get(cv2.CAP_PROP_PTS)
+        if (previous_frame := keyframe_index.get_frame(timestamp)) is None:
+            return keyframe  # not indexed (e.g., no pts), trust the seek
+        return previous_frame + 1
+
+    def _advance(self) -> None:
+        # continue with the first frame of the next video
+        if self.active_cap_idx >= len(self.video_captures) - 1:
+            return
+        self.active_cap_idx += 1
+        if not self._open(self.active_cap_idx):
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
 
     def read(self) -> Tuple[bool, np.ndarray | None]:
         """
@@ -158,9 +366,25 @@ class MultiVideoCapture:
             return False, None
         ret, img = self.cap.read()
         if not ret and self.frame >= self.cumulative_frames[self.active_cap_idx]:
-            self.active_cap_idx = min(
-                self.active_cap_idx + 1, len(self.video_captures) - 1
-            )
+            self._advance()
             return self.read()
-        self.frame = min(self.frame + 1, self.total_frames - 1)
+        if ret:
+            self.frame += 1
         return ret, img
+
+    def grab(self) -> bool:
+        """
+        Grabs the next frame from the active video capture without retrieving it.
+
+        Returns:
+            Whether the frame was grabbed successfully.
+        """
+        if self.frame >= self.total_frames:
+            return False
+        ret = self.cap.grab()
+        if not ret and self.frame >= self.cumulative_frames[self.active_cap_idx]:
+            self._advance()
+            return self.grab()
+        if ret:
+            self.frame += 1
+        return ret
@@ -1,36 +1,21 @@
-from collections.abc import Callable, Hashable, Sequence
+from collections.abc import Callable, Sequence
 from pathlib import Path
-from typing import Any, Literal, Optional, Type
+from typing import Literal, Optional
 
 import ipyvuetify as v
 import pandas as pd
 from interactive_table import InteractiveTable
 from interactive_table.v_dialog import Dialog
-from lazyfilter import lazy_filter
 from vassi.data_structures import Trajectory
 from vassi.dataset import AnnotatedDataset
 from vassi.dataset.utils import GroupIdentifier, IndividualIdentifier
-from vassi.logging import set_logging_level
 
+from .observations import drop_na_observations, get_observation_data
 from .v_utils.v_render_settings_dialog import RenderSettingsDialog
 from .v_utils.v_video_snippet_display import VideoSnippetDisplay
 from .video_snippet import VideoSnippet
 
 
-def is_same_observation(
-    observation: pd.Series | dict[Hashable, Any],
-    reference: pd.Series | dict[Hashable, Any],
-) -> bool:
-    return all([observation[str(key)] == reference[str(key)] for key in observation])
-
-
-def is_same_category(
-    observation: pd.Series | dict[Hashable, Any],
-    reference: pd.Series | dict[Hashable, Any],
-) -> bool:
-    return observation["category"] == reference["category"]
-
-
 class ObservationLibrary(InteractiveTable):
     def __init__(
         self,
@@ -55,18 +40,7 @@ class ObservationLibrary(InteractiveTable):
                 identifier: group.trajectories for identifier, group in observations
             }
             observations = observations.observations
-        na_rows = observations.isna().any(axis=1)
-        invalid_observations_error = ValueError(
-            "observations must be a valid pandas DataFrame or Dataset"
-        )
-        if not isinstance(na_rows, pd.Series):
-            raise invalid_observations_error
-        if (num_na_rows := na_rows.sum()) > 0:
-            set_logging_level().warning(f"Dropping {num_na_rows} rows with NaN values")
-            observations_cleaned = observations[~na_rows].reset_index(drop=True)
-            if not isinstance(observations_cleaned, pd.DataFrame):
-                raise invalid_observations_error
-            observations = observations_cleaned
+        observations = drop_na_observations(observations)
         if observations_transform is not None:
             observations = observations_transform(observations)
         if trajectory_lookup is not None and num_keypoints is None:
@@ -145,37 +119,10 @@ class ObservationLibrary(InteractiveTable):
 
     def open_video_snippet_dialog(self, observation):
         self.set_observation(observation)
-        if self.selected_observations_mode == "selected":
-            observations = [observation]
-        else:
-            selection: dict[str | Type[pd.Index], tuple] = {
-                "group": ("selected_values", (observation["group"],)),
-                "actor": ("selected_values", (observation["actor"],)),
-            }
-            if "recipient" in observation:
-                selection["recipient"] = (
-                    "selected_values",
-                    (observation["recipient"],),
-                )
-            observations = (
-                lazy_filter(self.observations)
-                .update(selection)
-                .to_dict(orient="records")
-            )
-        highlight = []
-        for idx, selected_observation in enumerate(observations):
-            if self.highlight_observations_mode == "selected":
-                if not is_same_observation(selected_observation, observation):
-                    continue
-                highlight.append(idx)
-            elif self.highlight_observations_mode == "category":
-                if not is_same_category(selected_observation, observation):
-                    continue
-                highlight.append(idx)
-            elif self.highlight_observations_mode(selected_observation, observation):
-                highlight.append(idx)
-        self.video_snippet.observation_data = {
-            "observations": observations,
-            "highlight": highlight,
-        }
+        self.video_snippet.observation_data = get_observation_data(
+            self.observations,
+            observation,
+            selected_observations_mode=self.selected_observations_mode,
+            highlight_observations_mode=self.highlight_observations_mode,
+        )
         self.video_snippet_dialog.dialog = True
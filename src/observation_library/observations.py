@@ -0,0 +1,78 @@
+from collections.abc import Callable, Hashable
+from typing import Any, Literal
+
+import pandas as pd
+from lazyfilter import lazy_filter
+from vassi.logging import set_logging_level
+
+
+def is_same_observation(
+    observation: pd.Series | dict[Hashable, Any],
+    reference: pd.Series | dict[Hashable, Any],
+) -> bool:
+    return all([observation[str(key)] == reference[str(key)] for key in observation])
+
+
+def is_same_category(
+    observation: pd.Series | dict[Hashable, Any],
+    reference: pd.Series | dict[Hashable, Any],
+) -> bool:
+    return observation["category"] == reference["category"]
+
+
+def drop_na_observations(observations: pd.DataFrame) -> pd.DataFrame:
+    na_rows = observations.isna().any(axis=1)
+    invalid_observations_error = ValueError(
+        "observations must be a valid pandas DataFrame or Dataset"
+    )
+    if not isinstance(na_rows, pd.Series):
+        raise invalid_observations_error
+    if (num_na_rows := na_rows.sum()) > 0:
+        set_logging_level().warning(f"Dropping {num_na_rows} rows with NaN values")
+        observations_cleaned = observations[~na_rows].reset_index(drop=True)
+        if not isinstance(observations_cleaned, pd.DataFrame):
+            raise invalid_observations_error
+        observations = observations_cleaned
+    return observations
+
+
+def get_observation_data(
+    observations: pd.DataFrame,
+    observation: pd.Series | dict[Hashable, Any],
+    *,
+    selected_observations_mode: Literal["selected", "dyad"] = "dyad",
+    highlight_observations_mode: (
+        Literal["selected", "category"] | Callable[[dict, dict], bool]
+    ) = "selected",
+) -> dict[str, list]:
+    if selected_observations_mode == "selected":
+        selected_observations = [observation]
+    else:
+        selection: dict[str | type[pd.Index], tuple] = {
+            "group": ("selected_values", (observation["group"],)),
+            "actor": ("selected_values", (observation["actor"],)),
+        }
+        if "recipient" in observation:
+            selection["recipient"] = (
+                "selected_values",
+                (observation["recipient"],),
+            )
+        selected_observations = (
+            lazy_filter(observations).update(selection).to_dict(orient="records")
+        )
+    highlight = []
+    for idx, selected_observation in enumerate(selected_observations):
+        if highlight_observations_mode == "selected":
+            if not is_same_observation(selected_observation, observation):
+                continue
+            highlight.append(idx)
+        elif highlight_observations_mode == "category":
+            if not is_same_category(selected_observation, observation):
+                continue
+            highlight.append(idx)
+        elif highlight_observations_mode(selected_observation, observation):
+            highlight.append(idx)
+    return {
+        "observations": selected_observations,
+        "highlight": highlight,
+    }
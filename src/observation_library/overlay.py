@@ -0,0 +1,307 @@
+import cv2
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgb
+from vassi.visualization import adjust_lightness
+
+from .utils import ImageOverlay
+
+# fixed point precision for sub-pixel accurate opencv drawing
+SHIFT = 4
+
+
+def to_rgb_uint8(color) -> tuple[int, int, int]:
+    red, green, blue = (round(value * 255) for value in to_rgb(color))
+    return red, green, blue
+
+
+def rounded_rectangle(x0, y0, x1, y1, radius) -> np.ndarray:
+    radius = max(0, min(radius, (x1 - x0) / 2, (y1 - y0) / 2))
+    corners = (
+        ((x1 - radius, y0 + radius), 270),
+        ((x1 - radius, y1 - radius), 0),
+        ((x0 + radius, y1 - radius), 90),
+        ((x0 + radius, y0 + radius), 180),
+    )
+    factor = 1 << SHIFT
+    points = [
+        cv2.ellipse2Poly(
+            (round(center[0] * factor), round(center[1] * factor)),
+            (round(radius * factor), round(radius * factor)),
+            angle,
+            0,
+            90,
+            10,
+        )
+        for center, angle in corners
+    ]
+    return np.concatenate(points).astype(np.int32)
+
+
+class MatplotlibOverlay(ImageOverlay):
+    """
+    Draws overlays with matplotlib.
+
+    Artists (one text per label, one line collection and scatter per individual) are
+    created once and only updated per frame, unless incremental is False.
+    """
+
+    color_conversion = cv2.COLOR_BGR2RGB
+    pixel_format = "rgb24"  # ffmpeg equivalent of color_conversion
+
+    def __init__(self, original_size, render_size, crop_size=None, *, incremental=True):
+        super().__init__(original_size, render_size, crop_size=crop_size)
+        self.incremental = incremental
+        self._labels = []
+        self._individuals = []
+        self._num_labels = 0
+        self._num_individuals = 0
+
+    def clear(self):
+        if not self.incremental:
+            self.get_axes(clear=True)
+            self._labels = []
+            self._individuals = []
+        self._num_labels = 0
+        self._num_individuals = 0
+
+    def _get_label(self):
+        if self._num_labels == len(self._labels):
+            self._labels.append(
+                self.ax.text(
+                    0.5,
+                    0.1,
+                    "",
+                    ha="center",
+                    va="center",
+                    fontsize=12,
+                    bbox={"boxstyle": "round"},
+                    zorder=3,
+                    transform=self.ax.transAxes,
+                )
+            )
+        label = self._labels[self._num_labels]
+        self._num_labels += 1
+        return label
+
+    def _get_individual(self):
+        if self._num_individuals == len(self._individuals):
+            lines = LineCollection([], transform=self.ax.transAxes)
+            self.ax.add_collection(lines, autolim=False)
+            points = self.ax.scatter([], [], lw=0, transform=self.ax.transAxes)
+            self._individuals.append((lines, points))
+        individual = self._individuals[self._num_individuals]
+        self._num_individuals += 1
+        return individual
+
+    def draw_label(self, text, *, color, box_color, highlighted):
+        label = self._get_label()
+        label.set_text(text)
+        label.set_color(color)
+        bbox = label.get_bbox_patch()
+        bbox.set_linewidth(1 if highlighted else 0)
+        bbox.set_edgecolor(box_color)
+        bbox.set_facecolor((*adjust_lightness(box_color, 1.5), 0.5))
+        label.set_visible(True)
+
+    def draw_individual(self, keypoints, segments, *, color, size, zorder):
+        # axes coordinates start at the bottom
+        keypoints = keypoints.copy()
+        segments = segments.copy()
+        keypoints[..., 1] = 1 - keypoints[..., 1]
+        segments[..., 1] = 1 - segments[..., 1]
+        lines, points = self._get_individual()
+        lines.set_segments(segments)
+        lines.set_color(color)
+        lines.set_linewidth(self.get_pixel_size(size / 2))
+        lines.set_zorder(zorder)
+        points.set_offsets(keypoints)
+        points.set_sizes([self.get_pixel_size(size) ** 2])
+        points.set_facecolor(color)
+        points.set_zorder(zorder)
+        lines.set_visible(True)
+        points.set_visible(True)
+
+    def draw_overlay(self, img):
+        # hide artists that were not drawn in this frame
+        for label in self._labels[self._num_labels :]:
+            label.set_visible(False)
+        for lines, points in self._individuals[self._num_individuals :]:
+            lines.set_visible(False)
+            points.set_visible(False)
+        return super().draw_overlay(img)
+
+    def close(self):
+        self.fig.clear()
+        self._labels = []
+        self._individuals = []
+
+
+class OpenCVOverlay:
+    """
+    Draws overlays directly into the (RGB) frame buffer with anti-aliased primitives.
+
+    Sizes and positions mirror the matplotlib overlay (see MatplotlibOverlay) so that
+    both backends produce visually equivalent output.
+    """
+
+    color_conversion = cv2.COLOR_BGR2RGB
+    pixel_format = "rgb24"  # ffmpeg equivalent of color_conversion
+    font = cv2.FONT_HERSHEY_SIMPLEX
+
+    def __init__(
+        self,
+        original_size,
+        render_size,
+        crop_size=None,
+    ):
+        self.original_size = np.asarray(original_size)
+        self.render_size = np.asarray(render_size)
+        self.crop_size = np.asarray(
+            crop_size if crop_size is not None else original_size
+        )
+        self._items = []
+
+    @property
+    def scale(self):
+        return (self.render_size / self.crop_size).min()
+
+    @property
+    def crop_scale(self):
+        return (self.original_size / self.crop_size).min()
+
+    @property
+    def points(self):
+        # typographic point in render pixels (matplotlib overlay: 300dpi at full hd)
+        return self.render_size[1] * 300 / 1080 / 72
+
+    def get_pixel_size(self, num_pixels):
+        return (
+            (num_pixels * self.crop_scale / self.original_size[1])
+            * self.crop_size[1]
+            * self.scale
+        )
+
+    def clear(self):
+        self._items = []
+
+    def draw_label(self, text, *, color, box_color, highlighted):
+        self._items.append((3, self._draw_label, (text, color, box_color, highlighted)))
+
+    def draw_individual(self, keypoints, segments, *, color, size, zorder):
+        self._items.append(
+            (zorder, self._draw_individual, (keypoints, segments, color, size))
+        )
+
+    def _draw_individual(self, img, keypoints, segments, color, size):
+        color = to_rgb_uint8(color)
+        factor = (1 << SHIFT) * self.render_size
+        segments = segments[np.isfinite(segments).all(axis=(-2, -1))]
+        keypoints = keypoints[np.isfinite(keypoints).all(axis=-1)]
+        if len(segments) > 0:
+            cv2.polylines(
+                img,
+                np.round(segments * factor).astype(np.int32),
+                isClosed=False,
+                color=color,
+                thickness=max(1, round(self.get_pixel_size(size / 2))),
+                lineType=cv2.LINE_AA,
+                shift=SHIFT,
+            )
+        radius = round(self.get_pixel_size(size) / 2 * (1 << SHIFT))
+        for center in np.round(keypoints * factor).astype(np.int32):
+            cv2.circle(
+                img,
+                tuple(center.tolist()),
+                radius,
+                color=color,
+                thickness=cv2.FILLED,
+                lineType=cv2.LINE_AA,
+                shift=SHIFT,
+            )
+
+    def _draw_label(self, img, text, color, box_color, highlighted):
+        font_size = 12 * self.points
+        # the cap height, width and stroke width of the scaled hershey font match
+        # matplotlib's default font (DejaVu Sans) at the same font size, the strokes
+        # scale with the font, a larger thickness renders bold text
+        thickness = 1
+        font_scale = cv2.getFontScaleFromHeight(self.font, round(font_size), thickness)
+        (text_width, text_height), _ = cv2.getTextSize(
+            text, self.font, font_scale, thickness
+        )
+        # matplotlib "round" boxstyle with default pad of 0.3 fontsize
+        pad = 0.3 * font_size
+        center_x, center_y = 0.5 * self.render_size[0], 0.9 * self.render_size[1]
+        x0, x1 = center_x - text_width / 2 - pad, center_x + text_width / 2 + pad
+        y0, y1 = center_y - text_height / 2 - pad, center_y + text_height / 2 + pad
+        box = rounded_rectangle(x0, y0, x1, y1, radius=pad)
+        height, width = img.shape[:2]
+        left, top = max(0, int(x0) - 1), max(0, int(y0) - 1)
+        right, bottom = min(width, int(x1) + 2), min(height, int(y1) + 2)
+        if right > left and bottom > top:
+            region = img[top:bottom, left:right]
+            filled = region.copy()
+            offset = np.array([left, top]) * (1 << SHIFT)
+            cv2.fillPoly(
+                filled,
+                [box - offset],
+                color=to_rgb_uint8(adjust_lightness(box_color, 1.5)),
+                lineType=cv2.LINE_AA,
+                shift=SHIFT,
+            )
+            cv2.addWeighted(filled, 0.5, region, 0.5, 0, dst=region)
+            if highlighted:
+                cv2.polylines(
+                    region,
+                    [box - offset],
+                    isClosed=True,
+                    color=to_rgb_uint8(box_color),
+                    thickness=max(1, round(self.points)),
+                    lineType=cv2.LINE_AA,
+                    shift=SHIFT,
+                )
+        cv2.putText(
+            img,
+            text,
+            (
+                round(center_x - text_width / 2),
+                round(center_y + text_height / 2),
+            ),
+            self.font,
+            font_scale,
+            to_rgb_uint8(color),
+            thickness,
+            cv2.LINE_AA,
+        )
+
+    def draw_overlay(self, img):
+        img_width = img.shape[1]
+        img_height = img.shape[0]
+        if img_width != self.render_size[0] or img_height != self.render_size[1]:
+            raise ValueError(
+                f"image size ({img_width, img_height}) does not match render size ({tuple(self.render_size)})"
+            )
+        img = np.ascontiguousarray(img[..., :3])
+        for _, draw, args in sorted(self._items, key=lambda item: item[0]):
+            draw(img, *args)
+        return img
+
+    def close(self):
+        self._items = []
+
+
+OVERLAY_BACKENDS = {
+    "opencv": OpenCVOverlay,
+    "matplotlib": MatplotlibOverlay,
+}
+
+
+def get_overlay(backend, *, original_size, render_size, crop_size=None):
+    if backend not in OVERLAY_BACKENDS:
+        raise ValueError(f"invalid overlay backend: {backend}")
+    return OVERLAY_BACKENDS[backend](
+        original_size=original_size,
+        render_size=render_size,
+        crop_size=crop_size,
+    )
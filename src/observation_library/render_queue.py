@@ -0,0 +1,172 @@
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+from typing import Any
+
+SPEC_KEYS = (
+    "video_files",
+    "start",
+    "stop",
+    "observation_data",
+    "render_settings",
+    "backend",
+    "sequence_fps",
+)
+
+
+def validate_spec(spec: Any) -> dict[str, Any]:
+    """
+    Validates the structure of a snippet specification of a render request.
+
+    A specification is a mapping with video_files (a list of paths), start and stop
+    (frame numbers) and optionally observation_data (see
+    observations.get_observation_data), render_settings (a mapping of render setting
+    config keys to values), backend and sequence_fps (see VideoSnippet).
+
+    Args:
+        spec: The (decoded JSON) specification.
+
+    Returns:
+        The specification.
+
+    Raises:
+        ValueError: If the specification is invalid.
+    """
+    # all invalid specifications raise ValueError (bad request), also invalid types
+    if not isinstance(spec, dict):
+        raise ValueError("snippet specification must be a mapping")  # noqa: TRY004
+    if len(unknown := sorted(set(spec) - set(SPEC_KEYS))) > 0:
+        raise ValueError(f"unknown snippet specification keys: {unknown}")
+    video_files = spec.get("video_files")
+    if (
+        not isinstance(video_files, list)
+        or len(video_files) == 0
+        or not all(isinstance(video_file, str) for video_file in video_files)
+    ):
+        raise ValueError("video_files must be a non-empty list of paths")
+    for key in ("start", "stop"):
+        if not isinstance(spec.get(key), (int, float)):
+            raise ValueError(f"{key} must be a frame number")  # noqa: TRY004
+    for key in ("observation_data", "render_settings"):
+        if not isinstance(spec.get(key, {}), dict):
+            raise ValueError(f"{key} must be a mapping")  # noqa: TRY004
+    return spec
+
+
+def get_spec_key(spec: dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+class RenderTask:
+    """
+    A render request, shared by all identical requests while it is in flight.
+
+    Attributes:
+        key: The key of the snippet specification.
+        output_file: The (content-addressed) path of the snippet, once known.
+        error: The error message if rendering failed.
+        ready: Set when the snippet can be fetched, i.e., when it is complete,
+            streamed (with streaming enabled in the render settings) or failed.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.output_file: str | None = None
+        self.error: str | None = None
+        self.ready = Event()
+
+
+class RenderQueue:
+    """
+    Renders snippets on demand in a bounded pool of worker threads.
+
+    Identical requests that are in flight are coalesced into a single render task.
+    The rendering modules (and their dependencies) are only imported by the workers,
+    so that serving files does not require them.
+
+    Attributes:
+        video_server_directory: The directory of the rendered snippets.
+        max_workers: The maximum number of concurrent renders.
+        max_pending: The maximum number of queued and running render tasks.
+    """
+
+    def __init__(
+        self,
+        video_server_directory: str,
+        *,
+        max_workers: int = 2,
+        max_pending: int = 32,
+    ):
+        self.video_server_directory = video_server_directory
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="render-worker"
+        )
+        self._tasks: dict[str, RenderTask] = {}
+        self._lock = Lock()
+
+    def submit(self, spec: Any) -> RenderTask:
+        """
+        Submits a render request, or joins an identical request in flight.
+
+        Args:
+            spec: The snippet specification (see validate_spec).
+
+        Returns:
+            The render task.
+
+        Raises:
+            ValueError: If the specification is invalid.
+            RuntimeError: If the render queue is full.
+        """
+        spec = validate_spec(spec)
+        key = get_spec_key(spec)
+        with self._lock:
+            if (task := self._tasks.get(key)) is not None:
+                return task
+            if len(self._tasks) >= self.max_pending:
+                raise RuntimeError("render queue is full")
+            task = RenderTask(key)
+            self._tasks[key] = task
+        self._executor.submit(self._render, task, spec)
+        return task
+
+    def _create_snippet(self, spec: dict[str, Any]):
+        from .render_settings import RenderSettings
+        from .video_snippet import VideoSnippet
+
+        render_settings = RenderSettings()
+        config_keys = RenderSettings.config_keys()
+        for key, value in spec.get("render_settings", {}).items():
+            if key not in config_keys:
+                raise ValueError(f"invalid render setting: {key}")
+            setattr(render_settings, key, value)
+        snippet = VideoSnippet(
+            spec["video_files"],
+            start=spec["start"],
+            stop=spec["stop"],
+            render_settings=render_settings,
+            video_server_directory=self.video_server_directory,
+            backend=spec.get("backend", "opencv"),
+            sequence_fps=spec.get("sequence_fps"),
+        )
+        snippet.observation_data = spec.get("observation_data", {})
+        return snippet
+
+    def _render(self, task: RenderTask, spec: dict[str, Any]) -> None:
+        try:
+            snippet = self._create_snippet(spec)
+            task.output_file = snippet.output_file
+            if not snippet.cut(on_stream=task.ready.set):
+                task.error = "rendering failed"
+        except Exception as e:  # noqa: BLE001 (reported to the client)
+            task.error = f"{type(e).__name__}: {e}"
+        finally:
+            with self._lock:
+                self._tasks.pop(task.key, None)
+            task.ready.set()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
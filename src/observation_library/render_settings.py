@@ -3,8 +3,33 @@ from typing import Any, List, Tuple
 
 import traitlets
 
+ENCODER_PROFILES = {
+    # fast encoding for snippets that are rendered on demand
+    "interactive preview": {
+        "codec": "libx264",
+        "encoder_preset": "ultrafast",
+        "crf": 26,
+        "bitrate": "",
+        "encoder_threads": 0,
+        "faststart": True,
+        "streaming": True,
+    },
+    # small files for exported snippets
+    "archive": {
+        "codec": "libx264",
+        "encoder_preset": "slow",
+        "crf": 23,
+        "bitrate": "",
+        "encoder_threads": 0,
+        "faststart": True,
+        "streaming": False,
+    },
+}
+
 
 class RenderSettings(traitlets.HasTraits):
+    _config_keys: list[str] | None = None
+
     temp_config = traitlets.Dict().tag(sync=True)
 
     interval_padding = traitlets.Float(default_value=1.0).tag(
@@ -75,6 +100,53 @@ class RenderSettings(traitlets.HasTraits):
     )
     macro_block_size = traitlets.Int(default_value=8, read_only=True).tag(sync=True)
 
+    overlay_backend_options = traitlets.List(
+        default_value=["opencv", "matplotlib"],
+        read_only=True,
+    ).tag(sync=True)
+    overlay_backend = traitlets.Unicode("opencv").tag(config=True, sync=True)
+
+    # encoder related settings
+    encoder_profile_options = traitlets.List(
+        default_value=["interactive preview", "archive", "customize"],
+        read_only=True,
+    ).tag(sync=True)
+    encoder_profile = traitlets.Unicode("interactive preview").tag(
+        config=True, sync=True
+    )
+    codec_options = traitlets.List(
+        # only codecs that browsers play in the snippet display (not hevc/libx265)
+        default_value=["libx264"],
+        read_only=True,
+    ).tag(sync=True)
+    codec = traitlets.Unicode("libx264").tag(config=True, sync=True)
+    encoder_preset_options = traitlets.List(
+        default_value=[
+            "ultrafast",
+            "superfast",
+            "veryfast",
+            "faster",
+            "fast",
+            "medium",
+            "slow",
+        ],
+        read_only=True,
+    ).tag(sync=True)
+    encoder_preset = traitlets.Unicode("ultrafast").tag(config=True, sync=True)
+    crf = traitlets.Int(default_value=26, min=0, max=51).tag(config=True, sync=True)
+    bitrate = traitlets.Unicode("").tag(
+        config=True, sync=True
+    )  # e.g. "4M", overrides crf if set
+    encoder_threads = traitlets.Int(default_value=0, min=0).tag(
+        config=True, sync=True
+    )  # 0: automatic
+    faststart = traitlets.Bool(default_value=True).tag(
+        config=True, sync=True
+    )  # moov atom first, playback starts before the download completes
+    streaming = traitlets.Bool(default_value=True).tag(
+        config=True, sync=True
+    )  # fragmented mp4 while streamed (playback starts while rendering), then remuxed
+
     def get_roi_padding(self) -> int:
         return 0 if not self.crop_roi else self.roi_padding
 
@@ -97,6 +169,30 @@ class RenderSettings(traitlets.HasTraits):
             raise traitlets.TraitError(f"invalid size preset: {value}")
         return value
 
+    @traitlets.validate("encoder_profile")
+    def _encoder_profile_validation(self, proposal) -> str:
+        if (value := proposal["value"]) not in self.encoder_profile_options:
+            raise traitlets.TraitError(f"invalid encoder profile: {value}")
+        return value
+
+    @traitlets.validate("codec")
+    def _codec_validation(self, proposal) -> str:
+        if (value := proposal["value"]) not in self.codec_options:
+            raise traitlets.TraitError(f"invalid codec: {value}")
+        return value
+
+    @traitlets.validate("encoder_preset")
+    def _encoder_preset_validation(self, proposal) -> str:
+        if (value := proposal["value"]) not in self.encoder_preset_options:
+            raise traitlets.TraitError(f"invalid encoder preset: {value}")
+        return value
+
+    @traitlets.validate("overlay_backend")
+    def _overlay_backend_validation(self, proposal) -> str:
+        if (value := proposal["value"]) not in self.overlay_backend_options:
+            raise traitlets.TraitError(f"invalid overlay backend: {value}")
+        return value
+
     def _parse_preset(self, preset) -> Tuple[None | int, None | int]:
         if preset == "customize":
             return None, None
@@ -126,6 +222,69 @@ class RenderSettings(traitlets.HasTraits):
             self.max_render_width, self.max_render_height
         )
 
+    @traitlets.observe("encoder_profile")
+    def _on_encoder_profile_change(self, change) -> None:
+        if change["old"] == change["new"]:
+            return
+        if (profile := ENCODER_PROFILES.get(change["new"])) is None:
+            return
+        with self.hold_trait_notifications():
+            for name, value in profile.items():
+                setattr(self, name, value)
+
+    @traitlets.observe(*ENCODER_PROFILES["archive"])
+    def _on_encoder_setting_change(self, change) -> None:
+        settings = {name: getattr(self, name) for name in ENCODER_PROFILES["archive"]}
+        self.encoder_profile = next(
+            (
+                profile_name
+                for profile_name, profile in ENCODER_PROFILES.items()
+                if profile == settings
+            ),
+            "customize",
+        )
+
+    def get_writer_parameters(self, *, streaming: bool = False) -> dict[str, Any]:
+        """
+        Returns the keyword arguments of imageio.get_writer for the encoder settings.
+
+        Args:
+            streaming: Whether the snippet is streamed while it is rendered, the output
+                is only fragmented if streaming is also enabled in the settings.
+        """
+        ffmpeg_params = ["-preset", self.encoder_preset]
+        if self.bitrate == "":
+            ffmpeg_params += ["-crf", str(self.crf)]
+        ffmpeg_params += ["-threads", str(self.encoder_threads)]
+        if streaming and self.streaming:
+            # a fragment per keyframe (every half second), each playable once written
+            ffmpeg_params += [
+                "-force_key_frames",
+                "expr:gte(t,n_forced*0.5)",
+                "-movflags",
+                "frag_keyframe+empty_moov+default_base_moof",
+            ]
+        elif self.faststart:
+            # moving the moov atom requires the complete file, not when streamed
+            ffmpeg_params += ["-movflags", "+faststart"]
+        return {
+            "codec": self.codec,
+            "quality": None,  # rate control with crf or bitrate instead
+            "bitrate": self.bitrate if self.bitrate != "" else None,
+            "pixelformat": "yuv420p",
+            "ffmpeg_params": ffmpeg_params,
+        }
+
+    def get_remux_parameters(self) -> list[str]:
+        """
+        Returns the ffmpeg output parameters that rewrite fragmented output (streamed
+        while rendered) into the container layout of output that is not streamed.
+        """
+        ffmpeg_params = ["-map", "0", "-c", "copy"]
+        if self.faststart:
+            ffmpeg_params += ["-movflags", "+faststart"]
+        return ffmpeg_params
+
     @traitlets.observe("available_keypoints")
     def _on_available_keypoints_change(self, change) -> None:
         keypoints = []
@@ -165,20 +324,20 @@ class RenderSettings(traitlets.HasTraits):
             setattr(self, name, default_value)
 
     def config_values(self) -> List:
-        return [
-            getattr(self, name)
-            for name, trait in RenderSettings().traits().items()
-            if "config" in trait.metadata
-            and name not in ["available_keypoints", "available_segments"]
-        ]
+        return [getattr(self, name) for name in self.config_keys()]
 
-    def config_keys(self) -> List[str]:
-        return [
-            name
-            for name, trait in RenderSettings().traits().items()
-            if "config" in trait.metadata
-            and name not in ["available_keypoints", "available_segments"]
-        ]
+    @classmethod
+    def config_keys(cls) -> List[str]:
+        # the config traits of RenderSettings itself, also for subclasses (e.g., the
+        # settings widget), computed only once instead of instantiating the class
+        if RenderSettings._config_keys is None:
+            RenderSettings._config_keys = [
+                name
+                for name, trait in RenderSettings.class_traits().items()
+                if "config" in trait.metadata
+                and name not in ["available_keypoints", "available_segments"]
+            ]
+        return list(RenderSettings._config_keys)
 
     def config(self) -> dict[str, Any]:
         return {
@@ -0,0 +1,145 @@
+from collections.abc import Mapping
+from typing import Any
+
+import numpy as np
+
+from .overlay import to_rgb_uint8
+from .render_settings import RenderSettings
+
+FLOAT_DIGITS = 6
+
+
+def canonicalize(value: Any) -> Any:
+    """
+    Converts a value to a canonical, JSON-like representation for hashing.
+
+    Floats are rounded, numpy scalars and arrays are converted to python types and
+    sequences to lists.
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if isinstance(value, bool) or value is None or isinstance(value, (int, str)):
+        return value
+    if isinstance(value, float):
+        rounded = round(value, FLOAT_DIGITS)
+        return int(rounded) if rounded.is_integer() else rounded
+    if isinstance(value, Mapping):
+        return {str(key): canonicalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(item) for item in value]
+    return str(value)
+
+
+def canonicalize_color(color: Any) -> Any:
+    try:
+        return "#{:02x}{:02x}{:02x}".format(*to_rgb_uint8(color))
+    except ValueError:
+        return canonicalize(color)
+
+
+def get_render_spec(
+    render_settings: RenderSettings,
+    *,
+    observation_data: Mapping,
+    individuals: list | None = None,
+    start: int,
+    stop: int,
+    render_size: tuple[int, int] | None = None,
+) -> dict[str, Any]:
+    """
+    Returns the effective render specification of a snippet.
+
+    Only settings and observation data that affect the rendered frames (or their
+    encoding) are part of the specification, e.g., label colors are dropped when
+    labels are not drawn, and settings that only determine the interval
+    (interval_padding), region of interest (crop_roi, roi_padding) or render size
+    (size_preset, max_render_width and max_render_height) are replaced by their
+    results. Equivalent configurations therefore have equal specifications.
+
+    Args:
+        render_settings: The render settings.
+        observation_data: The observation data of the snippet (see
+            observations.get_observation_data).
+        individuals: The individuals with trajectories (None if not drawn).
+        start: The first frame of the snippet.
+        stop: The stop frame (exclusive) of the snippet.
+        render_size: The render size (width, height) of the snippet.
+
+    Returns:
+        The render specification, with canonicalized values.
+    """
+    spec: dict[str, Any] = {
+        "render_size": render_size,
+        "overlay_backend": render_settings.overlay_backend,
+        # the profile name is inert, only its settings are part of the spec
+        "encoder": render_settings.get_writer_parameters(),
+    }
+    if "observations" not in observation_data:
+        # nothing is drawn without observation data
+        return canonicalize(spec)
+    observations = list(observation_data["observations"])
+    highlight = set(observation_data.get("highlight", []))
+    if not render_settings.draw_trajectories:
+        individuals = None
+    draw_label = render_settings.draw_label
+    draw_highlight = draw_label or (
+        individuals is not None and len(render_settings.apply_highlight_color_to) > 0
+    )
+    labels = []
+    for idx, observation in enumerate(observations):
+        # observations are drawn on frames within [start, stop]
+        if observation["stop"] < start or observation["start"] > stop - 1:
+            continue
+        label: dict[str, Any] = {
+            "start": max(start, observation["start"]),
+            "stop": min(stop - 1, observation["stop"]),
+        }
+        category = observation["category"]
+        if draw_label:
+            label["category"] = category
+        if draw_highlight and render_settings.highlight and idx in highlight:
+            label["highlight_color"] = canonicalize_color(
+                render_settings.override_highlight_color.get(
+                    category, render_settings.highlight_color
+                )
+            )
+        if len(label) > 2:
+            labels.append(label)
+    spec["labels"] = labels
+    if any("category" in label for label in labels):
+        spec["text_color"] = canonicalize_color(render_settings.text_color)
+        spec["box_color"] = canonicalize_color(render_settings.box_color)
+    if individuals is None:
+        return canonicalize(spec)
+    actor, recipient = None, None
+    if len(observations) > 0:
+        actor = observations[0]["actor"]
+        recipient = observations[0].get("recipient")
+    individuals_spec: dict[str, Any] = {
+        "individuals": sorted(map(str, individuals)),
+        "actor": None if actor not in individuals else str(actor),
+        "recipient": None if recipient not in individuals else str(recipient),
+        "keypoints": list(render_settings.keypoints),
+        "segments": render_settings.get_segments(),
+        "overlay_size": render_settings.overlay_size,
+    }
+    if individuals_spec["actor"] is not None:
+        individuals_spec["actor_color"] = canonicalize_color(
+            render_settings.actor_color
+        )
+    if individuals_spec["recipient"] is not None:
+        individuals_spec["recipient_color"] = canonicalize_color(
+            render_settings.recipient_color
+        )
+    if any(individual not in (actor, recipient) for individual in individuals):
+        individuals_spec["other_color"] = canonicalize_color(
+            render_settings.other_color
+        )
+    if any("highlight_color" in label for label in labels):
+        individuals_spec["apply_highlight_color_to"] = sorted(
+            render_settings.apply_highlight_color_to
+        )
+    spec["individuals"] = individuals_spec
+    return canonicalize(spec)
@@ -0,0 +1,47 @@
+import math
+from collections import defaultdict
+from collections.abc import Callable, Hashable, Iterable
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+def plan_render_jobs(  # noqa: UP047 (the package also imports on python 3.11)
+    jobs: Iterable[T],
+    *,
+    video_key: Callable[[T], Hashable],
+    start_key: Callable[[T], float],
+    num_workers: int | None = None,
+) -> list[list[T]]:
+    """
+    Groups render jobs by video and orders them by start frame to minimize seeking.
+
+    Each returned chunk should be rendered in order by a single worker that reuses
+    its video capture, so that consecutive jobs can read forward instead of seeking.
+    When num_workers is specified, large groups are split into consecutive chunks of
+    at most ceil(num_jobs / num_workers) jobs, so that all workers get work.
+
+    Args:
+        jobs: The render jobs.
+        video_key: Returns the video (e.g., group or tuple of video files) of a job.
+        start_key: Returns the (padded) start frame of a job.
+        num_workers: The number of workers to balance the chunks for.
+
+    Returns:
+        A list of chunks, largest first.
+    """
+    groups: dict[Hashable, list[T]] = defaultdict(list)
+    num_jobs = 0
+    for job in jobs:
+        groups[video_key(job)].append(job)
+        num_jobs += 1
+    max_chunk_size = num_jobs
+    if num_workers is not None and num_workers > 0:
+        max_chunk_size = max(1, math.ceil(num_jobs / num_workers))
+    chunks = []
+    for group_jobs in groups.values():
+        group_jobs = sorted(group_jobs, key=start_key)
+        for idx in range(0, len(group_jobs), max_chunk_size):
+            chunks.append(group_jobs[idx : idx + max_chunk_size])
+    # longest chunks first for better load balancing
+    return sorted(chunks, key=len, reverse=True)
@@ -0,0 +1,169 @@
+import atexit
+import hashlib
+import json
+import os
+import secrets
+import subprocess
+import sys
+import urllib.parse
+import urllib.request
+from threading import Lock
+
+from .video_server import TOKEN_VARIABLE
+
+PACKAGE = __name__.rpartition(".")[0]
+# imports the video server without the package __init__ (and its dependencies),
+# so that the server process only imports the stdlib
+BOOTSTRAP = f"""
+import sys
+import types
+
+package = types.ModuleType({PACKAGE!r})
+package.__path__ = [sys.argv[1]]
+sys.modules[{PACKAGE!r}] = package
+
+from {PACKAGE}.video_server import main
+
+main(sys.argv[2:])
+"""
+
+
+class VideoServerRegistry:
+    """
+    A single video server process, shared by all snippet displays of a process.
+
+    The server is started on first use and serves each snippet directory under its
+    own URL prefix. It is shut down at interpreter exit (or when the process exits
+    otherwise).
+
+    Attributes:
+        render_workers: The maximum number of concurrent renders per directory.
+    """
+
+    def __init__(self, *, render_workers: int = 2):
+        self.render_workers = render_workers
+        self._process: subprocess.Popen | None = None
+        self._port: int | None = None
+        self._token = ""
+        self._prefixes: dict[str, str] = {}
+        self._video_files: set[str] = set()
+        self._lock = Lock()
+        self._registered_atexit = False
+
+    @property
+    def is_running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _start(self) -> None:
+        self._token = secrets.token_hex(16)
+        self._prefixes = {}
+        self._video_files = set()
+        self._process = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                BOOTSTRAP,
+                os.path.dirname(os.path.abspath(__file__)),
+                "--no-directory",
+                "--host",
+                "localhost",
+                "--port",
+                "0",
+                "--render-workers",
+                str(self.render_workers),
+                "--parent-pid",
+                str(os.getpid()),
+                "--print-port",
+            ],
+            stdout=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            env={**os.environ, TOKEN_VARIABLE: self._token},
+            text=True,
+        )
+        assert self._process.stdout is not None
+        line = self._process.stdout.readline()
+        if not line.strip().isdigit():
+            self._process.kill()
+            self._process = None
+            raise RuntimeError("video server failed to start")
+        self._port = int(line)
+        if not self._registered_atexit:
+            atexit.register(self.shutdown)
+            self._registered_atexit = True
+
+    def _post(self, path: str, content: dict) -> None:
+        request = urllib.request.Request(
+            f"http://localhost:{self._port}/{path}",
+            data=json.dumps(content).encode(),
+            headers={
+                "Content-Type": "application/json",
+                "X-Server-Token": self._token,
+            },
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=10):
+            pass
+
+    def get_prefix(self, directory: str) -> str:
+        """
+        Returns the URL prefix of a snippet directory, starting the server if needed.
+        """
+        directory = os.path.abspath(directory)
+        with self._lock:
+            if not self.is_running:
+                self._start()
+            if directory not in self._prefixes:
+                os.makedirs(directory, exist_ok=True)
+                prefix = hashlib.sha1(directory.encode()).hexdigest()[:12]
+                self._post("directories", {"prefix": prefix, "directory": directory})
+                self._prefixes[directory] = prefix
+            return self._prefixes[directory]
+
+    def register_video_files(self, video_files) -> None:
+        """
+        Allows render requests for snippets of the video files, starting the server if
+        needed.
+        """
+        video_files = set(map(os.path.realpath, map(str, video_files)))
+        with self._lock:
+            if not self.is_running:
+                self._start()
+            video_files -= self._video_files
+            if len(video_files) == 0:
+                return
+            self._post("video_files", {"video_files": sorted(video_files)})
+            self._video_files |= video_files
+
+    def get_url(self, directory: str, file_name: str = "", *, video_files=()) -> str:
+        """
+        Returns the URL of a snippet (or directory) on the shared server.
+
+        Args:
+            directory: The snippet directory.
+            file_name: The file name (or path) of the snippet in the directory.
+            video_files: The video files of the snippet, allowed for render requests.
+
+        Returns:
+            The URL.
+        """
+        self.register_video_files(video_files)
+        prefix = self.get_prefix(directory)
+        file_name = urllib.parse.quote(os.path.basename(file_name))
+        return f"http://localhost:{self._port}/{prefix}/{file_name}"
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._process is None:
+                return
+            process, self._process = self._process, None
+            self._prefixes = {}
+            self._video_files = set()
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+video_server_registry = VideoServerRegistry()
@@ -0,0 +1,348 @@
+import json
+import os
+import secrets
+import socket
+import sqlite3
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import closing, contextmanager
+from pathlib import Path
+from threading import Event, Lock, Thread
+
+from .cache import get_file_signature
+
+MANIFEST_FILE = ".snippets.sqlite"
+MAX_BYTES_VARIABLE = "OBSERVATION_LIBRARY_SNIPPET_CACHE_BYTES"
+DEFAULT_MAX_BYTES = 20 * 2**30
+HEARTBEAT_INTERVAL = 2.0
+STALE_AFTER = 10.0  # seconds without heartbeat until a render lock is broken
+
+
+def get_partial_file(output_file: str) -> str:
+    """
+    Returns the path that a snippet is written to while it is rendered.
+    """
+    name, ext = os.path.splitext(output_file)
+    return f"{name}.partial{ext}"
+
+
+class RenderLock:
+    """
+    A lockfile that marks a snippet as being rendered, shared across processes.
+
+    The owner refreshes the modification time of the lockfile (heartbeat) while it
+    renders, so that the locks of crashed processes become stale and can be broken.
+
+    Attributes:
+        lock_file: The path of the lockfile.
+        stale_after: The time (seconds) without heartbeat until the lock is stale.
+    """
+
+    def __init__(self, output_file: str, *, stale_after: float = STALE_AFTER):
+        self.lock_file = f"{output_file}.lock"
+        self.stale_after = stale_after
+        self._stop_heartbeat: Event | None = None
+
+    @property
+    def is_owned(self) -> bool:
+        return self._stop_heartbeat is not None
+
+    def _is_stale(self, lock_file: str | None = None) -> bool:
+        try:
+            modified = os.path.getmtime(lock_file or self.lock_file)
+        except OSError:
+            return False  # released in the meantime
+        return time.time() - modified > self.stale_after
+
+    def _break(self) -> None:
+        # the lockfile is moved aside atomically, so that only one waiter breaks a
+        # stale lock, the lock of another waiter that broke it first is restored
+        broken_file = f"{self.lock_file}.{secrets.token_hex(8)}"
+        try:
+            os.rename(self.lock_file, broken_file)
+        except OSError:
+            return  # released or broken in the meantime
+        try:
+            if not self._is_stale(broken_file):
+                os.link(broken_file, self.lock_file)
+        except OSError:
+            pass  # acquired by another waiter in the meantime
+        finally:
+            os.remove(broken_file)
+
+    def acquire(self) -> bool:
+        """
+        Tries to acquire the lock without blocking, breaking stale locks.
+
+        Returns:
+            Whether the lock was acquired.
+        """
+        if self.is_owned:
+            return True
+        if self._is_stale():
+            self._break()
+        try:
+            fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            json.dump({"host": socket.gethostname(), "pid": os.getpid()}, f)
+        self._stop_heartbeat = Event()
+        Thread(
+            target=self._heartbeat, args=(self._stop_heartbeat,), daemon=True
+        ).start()
+        return True
+
+    def _heartbeat(self, stop: Event) -> None:
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                os.utime(self.lock_file)
+            except OSError:
+                pass  # e.g., moved aside while a waiter checks whether it is stale
+
+    def release(self) -> None:
+        if self._stop_heartbeat is None:
+            return
+        self._stop_heartbeat.set()
+        self._stop_heartbeat = None
+        try:
+            os.remove(self.lock_file)
+        except OSError:
+            pass
+
+
+def _get_source_signatures(video_files: Sequence[str | Path]) -> list:
+    signatures = []
+    for video_file in video_files:
+        try:
+            signatures.append(get_file_signature(video_file))
+        except OSError:
+            signatures.append({"path": str(video_file)})  # e.g., glob patterns
+    return signatures
+
+
+def _is_stale(signatures: list) -> bool:
+    # snippets are stale when a source video was modified or replaced, but not
+    # when it was (re)moved
+    for signature in signatures:
+        if "size" not in signature or not os.path.exists(signature["path"]):
+            continue
+        if get_file_signature(signature["path"]) != signature:
+            return True
+    return False
+
+
+class SnippetCache:
+    """
+    A managed directory of rendered snippets with a SQLite manifest.
+
+    The manifest records the size, render time, last access and source videos of
+    each snippet. The cache is kept within a byte budget by evicting the least
+    recently used snippets, and snippets of modified source videos are invalidated.
+
+    Attributes:
+        directory: The snippet directory.
+        max_bytes: The byte budget of the snippet directory.
+    """
+
+    def __init__(self, directory: str, *, max_bytes: int | None = None):
+        if max_bytes is None:
+            max_bytes = int(os.environ.get(MAX_BYTES_VARIABLE, DEFAULT_MAX_BYTES))
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+        self.manifest = os.path.join(directory, MANIFEST_FILE)
+        with self._transaction():
+            pass
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # the connection context only commits (or rolls back), it is closed
+        # explicitly so that connections do not accumulate in long running processes
+        with self._lock, closing(self._connect()) as connection, connection:
+            yield connection
+
+    def _connect(self) -> sqlite3.Connection:
+        # the directory may be deleted at any time (e.g., to clear the cache), a
+        # missing manifest is recreated empty
+        os.makedirs(self.directory, exist_ok=True)
+        connection = sqlite3.connect(self.manifest, timeout=30)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS snippets ("
+            "file TEXT PRIMARY KEY, size INTEGER, render_time REAL, "
+            "created REAL, last_access REAL, sources TEXT)"
+        )
+        return connection
+
+    def _remove(self, connection: sqlite3.Connection, file_name: str) -> None:
+        connection.execute("DELETE FROM snippets WHERE file = ?", (file_name,))
+        try:
+            os.remove(os.path.join(self.directory, file_name))
+        except OSError:
+            pass
+
+    def contains(self, output_file: str) -> bool:
+        """
+        Returns whether a snippet is cached and valid, and marks it as accessed.
+
+        Snippets that exist without manifest entry (e.g., rendered by earlier
+        versions) are added to the manifest.
+
+        Args:
+            output_file: The path of the snippet.
+
+        Returns:
+            Whether the snippet is cached.
+        """
+        file_name = os.path.basename(output_file)
+        with self._transaction() as connection:
+            row = connection.execute(
+                "SELECT sources FROM snippets WHERE file = ?", (file_name,)
+            ).fetchone()
+            if not os.path.exists(output_file):
+                if row is not None:
+                    self._remove(connection, file_name)
+                return False
+            if row is None:
+                self._insert(connection, output_file, sources=[], render_time=None)
+                return True
+            if _is_stale(json.loads(row[0])):
+                self._remove(connection, file_name)
+                return False
+            connection.execute(
+                "UPDATE snippets SET last_access = ? WHERE file = ?",
+                (time.time(), file_name),
+            )
+        return True
+
+    def _insert(
+        self,
+        connection: sqlite3.Connection,
+        output_file: str,
+        *,
+        sources: list,
+        render_time: float | None,
+    ) -> None:
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO snippets VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                os.path.basename(output_file),
+                os.path.getsize(output_file),
+                render_time,
+                now,
+                now,
+                json.dumps(sources),
+            ),
+        )
+
+    def add(
+        self,
+        output_file: str,
+        *,
+        video_files: Sequence[str | Path],
+        render_time: float | None = None,
+    ) -> None:
+        """
+        Adds a rendered snippet to the manifest and enforces the byte budget.
+
+        Args:
+            output_file: The path of the snippet.
+            video_files: The source videos of the snippet.
+            render_time: The render time in seconds.
+        """
+        with self._transaction() as connection:
+            self._insert(
+                connection,
+                output_file,
+                sources=_get_source_signatures(video_files),
+                render_time=render_time,
+            )
+        self.evict(keep=os.path.basename(output_file))
+
+    def evict(self, max_bytes: int | None = None, *, keep: str = "") -> int:
+        """
+        Removes least recently used snippets until the cache is within budget.
+
+        Args:
+            max_bytes: The budget, defaults to max_bytes of the cache.
+            keep: A file name that is not evicted (e.g., the snippet just added).
+
+        Returns:
+            The number of removed bytes.
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        removed = 0
+        with self._transaction() as connection:
+            rows = connection.execute(
+                "SELECT file, size FROM snippets ORDER BY last_access DESC"
+            ).fetchall()
+            num_bytes = 0
+            for file_name, size in rows:
+                num_bytes += size
+                if num_bytes <= max_bytes or file_name == keep:
+                    continue
+                self._remove(connection, file_name)
+                removed += size
+        return removed
+
+    def invalidate(self, video_file: str | Path) -> int:
+        """
+        Removes all snippets rendered from a source video.
+
+        Args:
+            video_file: The path of the source video.
+
+        Returns:
+            The number of removed snippets.
+        """
+        path = os.path.abspath(video_file)
+        removed = 0
+        with self._transaction() as connection:
+            for file_name, sources in connection.execute(
+                "SELECT file, sources FROM snippets"
+            ).fetchall():
+                if not any(
+                    source.get("path") in (path, str(video_file))
+                    for source in json.loads(sources)
+                ):
+                    continue
+                self._remove(connection, file_name)
+                removed += 1
+        return removed
+
+    def list_files(self) -> list[str]:
+        """
+        Returns the file names of all cached snippets, most recently used first.
+        """
+        with self._transaction() as connection:
+            rows = connection.execute(
+                "SELECT file FROM snippets ORDER BY last_access DESC"
+            ).fetchall()
+        return [
+            file_name
+            for (file_name,) in rows
+            if os.path.exists(os.path.join(self.directory, file_name))
+        ]
+
+    @property
+    def num_bytes(self) -> int:
+        with self._transaction() as connection:
+            (num_bytes,) = connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM snippets"
+            ).fetchone()
+        return num_bytes
+
+
+_snippet_caches: dict[str, SnippetCache] = {}
+
+
+def get_snippet_cache(directory: str) -> SnippetCache:
+    """
+    Returns the (shared) snippet cache of a directory.
+    """
+    key = os.path.abspath(directory)
+    if key not in _snippet_caches:
+        _snippet_caches[key] = SnippetCache(directory)
+    return _snippet_caches[key]
@@ -0,0 +1,110 @@
+from collections.abc import Mapping
+from itertools import pairwise
+from typing import Any, NamedTuple
+
+import numpy as np
+
+from .render_settings import RenderSettings
+
+
+class Label(NamedTuple):
+    category: str
+    color: Any
+    box_color: Any
+    highlighted: bool
+
+
+class LabelState(NamedTuple):
+    labels: tuple[Label, ...]  # labels to draw, in observation order
+    highlight_color: Any  # of the last active highlighted observation, or None
+
+
+class Timeline(NamedTuple):
+    states: tuple[LabelState, ...]
+    state_ids: np.ndarray  # state index per frame
+
+    def get(self, count: int) -> LabelState:
+        return self.states[self.state_ids[count]]
+
+
+def _get_label_state(
+    render_settings: RenderSettings,
+    observations: list[Mapping],
+    active: list[int],
+    highlight: set[int],
+) -> LabelState:
+    labels = []
+    highlight_color = None
+    for idx in active:
+        highlighted = render_settings.highlight and idx in highlight
+        category = observations[idx]["category"]
+        if highlighted:
+            highlight_color = render_settings.override_highlight_color.get(
+                category, render_settings.highlight_color
+            )
+        if not render_settings.draw_label:
+            continue
+        labels.append(
+            Label(
+                category,
+                color=highlight_color if highlighted else render_settings.text_color,
+                box_color=(
+                    highlight_color if highlighted else render_settings.box_color
+                ),
+                highlighted=highlighted,
+            )
+        )
+    return LabelState(tuple(labels), highlight_color)
+
+
+def build_timeline(
+    observation_data: Mapping,
+    render_settings: RenderSettings,
+    *,
+    start: int,
+    num_frames: int,
+) -> Timeline | None:
+    """
+    Precomputes the labels and highlight color of each frame of a snippet.
+
+    Frames are grouped into runs between observation boundaries, each run with its
+    label state, so that per-frame lookups are O(1).
+
+    Args:
+        observation_data: The observation data of the snippet (see
+            observations.get_observation_data).
+        render_settings: The render settings.
+        start: The first frame of the snippet.
+        num_frames: The number of frames of the snippet.
+
+    Returns:
+        The timeline, or None without observation data.
+    """
+    if "observations" not in observation_data:
+        return None
+    observations = list(observation_data["observations"])
+    highlight = set(observation_data.get("highlight", []))
+    stop = start + num_frames
+    # observations are active on frames within [start, stop] (inclusive)
+    starts = np.array([observation["start"] for observation in observations], dtype=int)
+    stops = np.array([observation["stop"] for observation in observations], dtype=int)
+    stops += 1
+    boundaries = np.unique(
+        np.clip(np.concatenate([[start, stop], starts, stops]), start, stop)
+    )
+    states: dict[tuple[int, ...], int] = {}
+    state_list: list[LabelState] = []
+    state_ids = np.zeros(num_frames, dtype=np.int32)
+    for run_start, run_stop in pairwise(boundaries):
+        active = tuple(
+            np.flatnonzero((starts <= run_start) & (stops > run_start)).tolist()
+        )
+        if active not in states:
+            states[active] = len(state_list)
+            state_list.append(
+                _get_label_state(render_settings, observations, list(active), highlight)
+            )
+        state_ids[run_start - start : run_stop - start] = states[active]
+    if len(state_list) == 0:
+        state_list.append(LabelState((), None))
+    return Timeline(tuple(state_list), state_ids)
@@ -1,8 +1,7 @@
 import cv2
-import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.backends.backend_agg import FigureCanvasAgg
-from PIL import Image
+from matplotlib.figure import Figure
 
 
 def closest_divisible(number: float, divisor: int) -> int:
@@ -14,19 +13,38 @@ def closest_divisible(number: float, divisor: int) -> int:
     return int(closest_smaller_number)
 
 
-def crop_and_scale(img, *, max_width, max_height, roi=None, block_size=None):
-    img_cropped = img
-    if roi is not None:
-        img_cropped = img[roi[1] : (roi[3] + 1), roi[0] : (roi[2] + 1)]
-    crop_height, crop_width = img_cropped.shape[:2]
+def get_crop_size(width, height, roi=None):
+    if roi is None:
+        return width, height
+    # roi is inclusive and clipped to the image
+    return (
+        min(width, roi[2] + 1) - roi[0],
+        min(height, roi[3] + 1) - roi[1],
+    )
+
+
+def get_scaled_size(crop_width, crop_height, *, max_width, max_height, block_size=None):
     scale = (
         np.array([max_width, max_height]) / np.asarray([crop_width, crop_height])
     ).min()
     scaled_size = crop_width * scale, crop_height * scale
     if block_size is not None:
-        scaled_size = tuple(closest_divisible(size, block_size) for size in scaled_size)
-    else:
-        scaled_size = list(map(lambda size: int(round(size)), scaled_size))
+        return tuple(closest_divisible(size, block_size) for size in scaled_size)
+    return tuple(map(lambda size: int(round(size)), scaled_size))
+
+
+def crop_and_scale(img, *, max_width, max_height, roi=None, block_size=None):
+    img_cropped = img
+    if roi is not None:
+        img_cropped = img[roi[1] : (roi[3] + 1), roi[0] : (roi[2] + 1)]
+    crop_height, crop_width = img_cropped.shape[:2]
+    scaled_size = get_scaled_size(
+        crop_width,
+        crop_height,
+        max_width=max_width,
+        max_height=max_height,
+        block_size=block_size,
+    )
     img_scaled = cv2.resize(img_cropped, dsize=scaled_size)
     return img_cropped, img_scaled
 
@@ -43,7 +61,8 @@ class ImageOverlay:
         self.crop_size = np.asarray(
             crop_size if crop_size is not None else original_size
         )
-        self.fig = plt.figure(
+        # not managed by pyplot, so that overlays can be drawn from worker threads
+        self.fig = Figure(
             figsize=(
                 self.render_size[0] / self.dpi,
                 self.render_size[1] / self.dpi,
@@ -51,6 +70,9 @@ class ImageOverlay:
             dpi=self.dpi,
         )
         self.ax = self.fig.add_axes((0, 0, 1, 1))
+        self.fig.patch.set_facecolor((0, 0, 0, 0))
+        # the canvas is reused for all frames
+        self.canvas = FigureCanvasAgg(self.fig)
 
     @property
     def dpi(self):
@@ -81,13 +103,11 @@ class ImageOverlay:
 
     @property
     def _overlay_numpy(self):
-        self.fig.patch.set_facecolor((0, 0, 0, 0))
         self.ax.axis("off")
-        canvas = FigureCanvasAgg(self.fig)
-        canvas.draw()
-        *_, width, height = canvas.figure.bbox.bounds
+        self.canvas.draw()
+        *_, width, height = self.fig.bbox.bounds
         width, height = int(width), int(height)
-        buffer = canvas.buffer_rgba()
+        buffer = self.canvas.buffer_rgba()
         overlay_numpy = np.frombuffer(buffer, dtype=np.uint8)
         overlay_numpy = overlay_numpy.reshape(height, width, 4)
         if width != self.render_size[0] or height != self.render_size[1]:
@@ -95,26 +115,36 @@ class ImageOverlay:
             overlay_numpy = cv2.resize(overlay_numpy, tuple(map(int, self.render_size)))
         return overlay_numpy
 
-    def _to_rgb(self, image, background_color=(255, 255, 255)):
-        """
-        http://stackoverflow.com/a/9459208/284318
+    def draw_overlay(self, img):
         """
-        image.load()
-        background = Image.new("RGB", image.size, background_color)
-        # use alpha channel as mask
-        background.paste(image, mask=image.split()[3])
-        return background
+        Composites the overlay into an RGB image (in place) and returns it.
 
-    def draw_overlay(self, img):
+        Only the bounding box of non-transparent overlay pixels is blended, RGBA images
+        are copied to an RGB image first.
+        """
         img_width = img.shape[1]
         img_height = img.shape[0]
         if img_width != self.render_size[0] or img_height != self.render_size[1]:
             raise ValueError(
                 f"image size ({img_width, img_height}) does not match render size ({tuple(self.render_size)})"
             )
-        image = Image.fromarray(img)
-        overlay = Image.fromarray(self._overlay_numpy)
-        # use overlay alpha as mask
-        image.paste(overlay, (0, 0), overlay)
-        image = self._to_rgb(image)
-        return np.asarray(image)
+        if img.shape[2] != 3 or not img.flags.writeable:
+            img = np.ascontiguousarray(img[..., :3])
+        overlay = self._overlay_numpy
+        alpha = overlay[..., 3]
+        rows = np.flatnonzero(alpha.any(axis=1))
+        if rows.size == 0:
+            return img
+        columns = np.flatnonzero(alpha[rows[0] : rows[-1] + 1].any(axis=0))
+        region = (
+            slice(rows[0], rows[-1] + 1),
+            slice(columns[0], columns[-1] + 1),
+        )
+        # premultiplied blending in integer arithmetic, (x + 127) // 255 rounds
+        alpha = alpha[region][..., np.newaxis].astype(np.uint16)
+        blended = overlay[region][..., :3] * alpha
+        blended += img[region] * (255 - alpha)
+        blended += 127
+        blended //= 255
+        img[region] = blended
+        return img
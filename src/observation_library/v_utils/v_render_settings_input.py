@@ -22,6 +22,10 @@ class RenderSettingsInput(v.VuetifyTemplate, RenderSettings):  # type: ignore
     max_render_height_input = traitlets.Any().tag(
         sync=True, **widgets.widget_serialization
     )
+    crf_input = traitlets.Any().tag(sync=True, **widgets.widget_serialization)
+    encoder_threads_input = traitlets.Any().tag(
+        sync=True, **widgets.widget_serialization
+    )
 
     actor_color_input = traitlets.Any().tag(sync=True, **widgets.widget_serialization)
     recipient_color_input = traitlets.Any().tag(
@@ -64,6 +68,13 @@ class RenderSettingsInput(v.VuetifyTemplate, RenderSettings):  # type: ignore
             value=self.max_render_height, min=256, max=5000, step=1, label="Height (px)"
         )
 
+        self.crf_input = BoundedInput(
+            value=self.crf, min=0, max=51, step=1, label="CRF"
+        )
+        self.encoder_threads_input = BoundedInput(
+            value=self.encoder_threads, min=0, max=64, step=1, label="Threads"
+        )
+
         self.actor_color_input = ColorPicker(color=self.actor_color, label="Actor")
         self.recipient_color_input = ColorPicker(
             color=self.recipient_color, label="Recipient"
@@ -101,6 +112,16 @@ class RenderSettingsInput(v.VuetifyTemplate, RenderSettings):  # type: ignore
             ((self.roi_padding_input, "value")),
             transform=(int, int),
         )
+        traitlets.link(
+            (self, "crf"),
+            ((self.crf_input, "value")),
+            transform=(int, int),
+        )
+        traitlets.link(
+            (self, "encoder_threads"),
+            ((self.encoder_threads_input, "value")),
+            transform=(int, int),
+        )
         traitlets.link((self, "actor_color"), (self.actor_color_input, "color"))
         traitlets.link((self, "recipient_color"), (self.recipient_color_input, "color"))
         traitlets.link((self, "other_color"), (self.other_color_input, "color"))
@@ -152,10 +173,14 @@ class RenderSettingsInput(v.VuetifyTemplate, RenderSettings):  # type: ignore
             return
         color = change["new"]
         overridden = color != self.highlight_color
+        # assign a new dictionary, in-place changes are not observed (e.g., by
+        # snippets that memoize their render job)
+        override_highlight_color = dict(self.override_highlight_color)
         if overridden:
-            self.override_highlight_color[self.selected_category] = color
-        elif self.selected_category in self.override_highlight_color:
-            self.override_highlight_color.pop(self.selected_category)
+            override_highlight_color[self.selected_category] = color
+        else:
+            override_highlight_color.pop(self.selected_category, None)
+        self.override_highlight_color = override_highlight_color
         self.overridden_highlight = overridden
 
     def vue_reset_override_highlight_color(self, *args):
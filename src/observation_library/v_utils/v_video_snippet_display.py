@@ -1,14 +1,10 @@
-import os
-import signal
-import socketserver
-from multiprocessing import Process
 from threading import Thread
 
 import ipyvuetify as v
 import ipywidgets as widgets
 import traitlets
 
-from ..video_server import run_server
+from ..server_registry import video_server_registry
 from .v_progress_bar import ProgressBar
 from .v_video_container import VideoContainer
 
@@ -31,16 +27,6 @@ class VideoSnippetDisplay(v.VuetifyTemplate):  # type: ignore
     def __init__(self, snippet):
         self.snippet = snippet
         self.thread = None
-        with socketserver.TCPServer(("localhost", 0), None) as s:  # type: ignore
-            self.port = s.server_address[1]
-        self.server_process = Process(
-            target=run_server,
-            kwargs={
-                "video_directory": self.snippet.video_server_directory,
-                "port": self.port,
-            },
-        )
-        self.server_process.start()
         self.progress_bar = ProgressBar(label="Preparing video:", style_="height: 25px")
         self.progress_bar_container = v.Layout(
             children=[self.progress_bar],
@@ -52,18 +38,21 @@ class VideoSnippetDisplay(v.VuetifyTemplate):  # type: ignore
         except ValueError:
             output_file = ""
         self.video_container = VideoContainer(
-            url=f"http://localhost:{self.port}/{output_file}",
+            url=self.get_url(output_file),
             class_="pa-4",
             style_="width: 100%; height: auto; max-height: 400px",
         )
         self.active_widget = self.progress_bar_container
         super().__init__()
 
-    def interrupt_server_process(self):
-        if self.server_process is None or (pid := self.server_process.pid) is None:
-            return
-        os.kill(pid, signal.SIGINT)
-        self.server_process.join()
+    def get_url(self, output_file):
+        # all displays share a single video server (started on first use), which
+        # only renders snippets of the videos of displayed snippets
+        return video_server_registry.get_url(
+            self.snippet.video_server_directory,
+            output_file,
+            video_files=self.snippet.video_files,
+        )
 
     def interrupt(self):
         if self.thread is None:
@@ -75,27 +64,28 @@ class VideoSnippetDisplay(v.VuetifyTemplate):  # type: ignore
         return True
 
     def cut(self, *, video_snippet_dialog=None):
+        def _show_video():
+            self.active_widget = self.video_container
+            self.video_container.url = self.get_url(self.snippet.output_file)
+
         def _cut():
             self.active_widget = self.progress_bar_container
             if video_snippet_dialog is not None:
                 video_snippet_dialog.show_actions = False
-            success = self.snippet.cut(progress_bar=self.progress_bar)
+            # with streaming, the video is shown while the snippet is rendered
+            success = self.snippet.cut(
+                progress_bar=self.progress_bar, on_stream=_show_video
+            )
             if video_snippet_dialog is not None:
                 video_snippet_dialog.show_actions = True
             if success:
-                self.active_widget = self.video_container
-                self.video_container.url = (
-                    f"http://localhost:{self.port}/{self.snippet.output_file}"
-                )
+                _show_video()
             self.progress_bar.value = 0
 
         if self.thread is not None:
             self.interrupt()
-        if os.path.exists(self.snippet.output_file):
-            self.active_widget = self.video_container
-            self.video_container.url = (
-                f"http://localhost:{self.port}/{self.snippet.output_file}"
-            )
+        if self.snippet.snippet_cache.contains(self.snippet.output_file):
+            _show_video()
             return True
         self.thread = Thread(target=_cut)
         self.thread.start()
@@ -0,0 +1,155 @@
+import os
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from typing import NamedTuple
+
+import cv2
+
+from .cache import get_cache_directory, get_file_key
+from .keyframe_index import load_keyframe_index
+
+
+class VideoMetadata(NamedTuple):
+    width: int
+    height: int
+    fps: float
+    frames: int
+    verified: bool = False  # frames counted from packets instead of container header
+
+
+def probe_video(cap: cv2.VideoCapture) -> VideoMetadata:
+    return VideoMetadata(
+        width=int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        height=int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        fps=cap.get(cv2.CAP_PROP_FPS),
+        frames=int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+    )
+
+
+def verify_metadata(path: str | Path, metadata: VideoMetadata) -> VideoMetadata:
+    # counting packets also builds (and caches) the keyframe index
+    keyframe_index = load_keyframe_index(path)
+    if keyframe_index is None:
+        return metadata
+    return metadata._replace(frames=keyframe_index.num_frames, verified=True)
+
+
+class VideoMetadataStore:
+    """
+    A persistent (SQLite) store of video metadata, keyed by file path, size and
+    modification time.
+
+    Attributes:
+        database: The path to the SQLite database.
+    """
+
+    def __init__(self, directory: str | None = None):
+        if directory is None:
+            directory = get_cache_directory()
+        os.makedirs(directory, exist_ok=True)
+        self.database = os.path.join(directory, "video_metadata.sqlite")
+        self._memory: dict[str, VideoMetadata] = {}
+        self._lock = Lock()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                "key TEXT PRIMARY KEY, path TEXT, width INTEGER, height INTEGER, "
+                "fps REAL, frames INTEGER, verified INTEGER)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.database, timeout=30)
+
+    def get(self, path: str | Path) -> VideoMetadata | None:
+        try:
+            key = get_file_key(path)
+        except OSError:
+            return None
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+        try:
+            with self._connect() as connection:
+                row = connection.execute(
+                    "SELECT width, height, fps, frames, verified FROM metadata "
+                    "WHERE key = ?",
+                    (key,),
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        metadata = VideoMetadata(*row[:4], verified=bool(row[4]))
+        with self._lock:
+            self._memory[key] = metadata
+        return metadata
+
+    def set(self, path: str | Path, metadata: VideoMetadata) -> None:
+        key = get_file_key(path)
+        with self._lock:
+            self._memory[key] = metadata
+        try:
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        key,
+                        os.path.abspath(path),
+                        metadata.width,
+                        metadata.height,
+                        metadata.fps,
+                        metadata.frames,
+                        int(metadata.verified),
+                    ),
+                )
+        except sqlite3.Error:
+            pass  # keep in memory only, e.g., on read-only file systems
+
+    def load(
+        self,
+        path: str | Path,
+        *,
+        cap: cv2.VideoCapture | None = None,
+        verify: bool = False,
+    ) -> VideoMetadata:
+        """
+        Returns the stored metadata of a video file, probing it if necessary.
+
+        Args:
+            path: The path to the video file.
+            cap: An opened capture of the video file for probing.
+            verify: Whether to count the frames of the video once (full packet scan).
+
+        Returns:
+            The video metadata.
+
+        Raises:
+            ValueError: If the video cannot be opened.
+        """
+        metadata = self.get(path)
+        if metadata is None:
+            release = cap is None
+            if cap is None:
+                cap = cv2.VideoCapture(str(path))
+            if not cap.isOpened():
+                raise ValueError(f"Error opening video: {path}")
+            metadata = probe_video(cap)
+            if release:
+                cap.release()
+            if not verify:
+                self.set(path, metadata)
+        if verify and not metadata.verified:
+            metadata = verify_metadata(path, metadata)
+            self.set(path, metadata)
+        return metadata
+
+
+_metadata_store: VideoMetadataStore | None = None
+
+
+def get_metadata_store() -> VideoMetadataStore:
+    global _metadata_store
+    if _metadata_store is None:
+        _metadata_store = VideoMetadataStore()
+    return _metadata_store
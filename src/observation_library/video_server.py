@@ -1,43 +1,366 @@
 import argparse
+import email.utils
+import html
 import http.server
+import json
 import os
-import socketserver
+import re
+import secrets
+import string
+import threading
+import time
+import urllib.parse
 
-from jinja2 import Template
+# only stdlib modules, the server runs in a lightweight subprocess (see
+# server_registry), rendering modules are imported on demand by the render queue
+from .render_queue import RenderQueue, validate_spec
+from .snippet_cache import get_partial_file, get_snippet_cache
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+# snippet file names are content-addressed, cached files never change
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+STREAM_CHUNK_SIZE = 2**16
+STREAM_POLL_INTERVAL = 0.05
+STREAM_TIMEOUT = 60  # seconds without new data until a stream is dropped
+MAX_SPEC_BYTES = 2**24
+TOKEN_VARIABLE = "OBSERVATION_LIBRARY_VIDEO_SERVER_TOKEN"
+PREFIX_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+RESERVED_PREFIXES = ("render", "directories", "video_files")
+VIDEO_ITEM = """
+            <li>
+                <p>{name}</p>
+                <video width="320" height="240" controls>
+                    <source src="{url}" type="{video_type}" />
+                    Your browser does not support the video tag.
+                </video>
+            </li>"""
+NO_VIDEOS_ITEM = """
+            <li>No video files found in this directory.</li>"""
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parses a single byte range (inclusive start and end) of a Range header.
+
+    Returns:
+        The range, or None if the header is not a single byte range.
+
+    Raises:
+        ValueError: If the range is not satisfiable.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None:
+        return None  # unsupported (e.g., multiple ranges), serve the entire file
+    start, end = match.groups()
+    if start == "" and end == "":
+        return None
+    if start == "":
+        # suffix range, the last bytes of the file
+        length = int(end)
+        if length == 0:
+            raise ValueError("unsatisfiable range")
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = size - 1 if end == "" else min(int(end), size - 1)
+    if start >= size or start > end:
+        raise ValueError("unsatisfiable range")
+    return start, end
 
 
 class VideoHandler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, video_directory: str = ".", port: int, **kwargs):
-        self.video_directory = video_directory
-        self.port = port
-        super().__init__(*args, **kwargs)
+    protocol_version = "HTTP/1.1"
+
+    server: "VideoServer"
 
     def log_request(self, code="-", size="-"):
         return
 
+    def resolve(self) -> tuple[str, str] | None:
+        # returns the prefix of the snippet directory and the remaining path
+        path = urllib.parse.urlsplit(self.path).path.lstrip("/")
+        prefix, _, rest = path.partition("/")
+        if prefix in self.server.directories and prefix != "":
+            return prefix, rest
+        if "" in self.server.directories:
+            return "", path
+        return None
+
+    def get_file_path(self) -> str | None:
+        if (resolved := self.resolve()) is None:
+            return None
+        prefix, rest = resolved
+        # translate_path sanitizes the path (e.g., drops "..") relative to directory
+        self.directory = self.server.directories[prefix]
+        return self.translate_path(f"/{rest}")
+
     def do_GET(self):
-        if self.path == "/":
+        if urllib.parse.urlsplit(self.path).path == "/":
+            # the manifest only lists completed snippets
             videos = [
-                os.path.join(self.video_directory, video_file)
-                for video_file in os.listdir(self.video_directory)
+                self.server.get_url(prefix, video_file)
+                for prefix, directory in self.server.directories.items()
+                for video_file in get_snippet_cache(directory).list_files()
                 if video_file.lower().endswith((".mp4", ".avi", ".mov"))
             ]
             content = self.generate_html(videos).encode("utf-8")
             self.send_response(200)
             self.send_header("Content-type", "text/html")
+            self.send_header("Content-Length", str(len(content)))
+            self.send_header("Cache-Control", "no-cache")
             self.end_headers()
             try:
                 self.wfile.write(content)
             except BrokenPipeError:
                 pass
         else:
-            super().do_GET()
+            self.send_file()
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_SPEC_BYTES:
+            raise ValueError("request body too large")
+        return json.loads(self.rfile.read(length))
+
+    def do_POST(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path == "/directories":
+            self.register_directory()
+            return
+        if path == "/video_files":
+            self.register_video_files()
+            return
+        prefix, _, endpoint = path.lstrip("/").rpartition("/")
+        if endpoint != "render" or prefix not in self.server.directories:
+            self.send_error(404, "Not found")
+            return
+        if not self.check_token():
+            return
+        try:
+            spec = validate_spec(self.read_json())
+            if not all(map(self.server.is_known_video_file, spec["video_files"])):
+                # only videos of the observations, not arbitrary files of the host
+                self.send_json(403, {"error": "unknown video files"})
+                return
+            task = self.server.get_render_queue(prefix).submit(spec)
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except RuntimeError as e:
+            self.send_json(503, {"error": str(e)})
+            return
+        # complete, streamed or failed
+        task.ready.wait()
+        if task.error is not None or task.output_file is None:
+            self.send_json(500, {"error": task.error})
+            return
+        url = self.server.get_url(prefix, os.path.basename(task.output_file))
+        # the content-addressed url of the snippet, clients follow the redirect
+        self.send_json(303, {"url": url}, headers={"Location": url})
+
+    def check_token(self) -> bool:
+        # only the process that started the server (and its clients) know the token
+        token = self.headers.get("X-Server-Token", "")
+        if self.server.token is None or not secrets.compare_digest(
+            token, self.server.token
+        ):
+            self.send_error(403, "Forbidden")
+            return False
+        return True
+
+    def register_directory(self):
+        if not self.check_token():
+            return
+        try:
+            content = self.read_json()
+            self.server.add_directory(content["prefix"], content["directory"])
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        self.send_json(200, {"url": self.server.get_url(content["prefix"])})
+
+    def register_video_files(self):
+        if not self.check_token():
+            return
+        try:
+            video_files = self.read_json()["video_files"]
+            if not isinstance(video_files, list) or not all(
+                isinstance(video_file, str) for video_file in video_files
+            ):
+                raise ValueError("video_files must be a list of paths")
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        self.server.add_video_files(video_files)
+        self.send_json(200, {"video_files": len(self.server.video_files)})
+
+    def send_json(self, code, content, *, headers=None):
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass
+
+    def do_HEAD(self):
+        self.send_file(head=True)
+
+    def send_file(self, head=False):
+        if (path := self.get_file_path()) is None:
+            self.send_error(404, "File not found")
+            return
+        if not os.path.isfile(path) and os.path.isfile(get_partial_file(path)):
+            self.send_partial_file(path, head=head)
+            return
+        if not os.path.isfile(path):
+            self.send_error(404, "File not found")
+            return
+        try:
+            f = open(path, "rb")  # noqa: SIM115 (closed below)
+        except OSError:
+            self.send_error(404, "File not found")
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            etag = f'"{os.path.basename(path)}-{size:x}-{stat.st_mtime_ns:x}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", CACHE_CONTROL)
+                self.end_headers()
+                return
+            byte_range = None
+            range_header = self.headers.get("Range")
+            if_range = self.headers.get("If-Range")
+            if range_header is not None and (if_range is None or if_range == etag):
+                try:
+                    byte_range = parse_range(range_header, size)
+                except ValueError:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+            start, end = byte_range if byte_range is not None else (0, size - 1)
+            self.send_response(206 if byte_range is not None else 200)
+            self.send_header("Content-Type", self.guess_type(path))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(end - start + 1))
+            if byte_range is not None:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.send_header("ETag", etag)
+            self.send_header(
+                "Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True)
+            )
+            self.send_header("Cache-Control", CACHE_CONTROL)
+            self.end_headers()
+            if head or size == 0:
+                return
+            try:
+                self.copy_range(f, start, end - start + 1)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client closed the connection, e.g., while scrubbing
+
+    def send_partial_file(self, path, head=False):
+        # the snippet is still being rendered, stream the growing (fragmented) file
+        partial_file = get_partial_file(path)
+        try:
+            f = open(partial_file, "rb")  # noqa: SIM115 (closed below)
+        except OSError:
+            self.send_error(404, "File not found")
+            return
+        chunked = self.request_version != "HTTP/1.0"
+        with f:
+            self.send_response(200)
+            self.send_header("Content-Type", self.guess_type(path))
+            if chunked:
+                self.send_header("Transfer-Encoding", "chunked")
+            else:
+                self.close_connection = True  # the end of the body is the end
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            if head:
+                return
+            try:
+                self.copy_growing_file(f, path, chunked=chunked)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def copy_growing_file(self, f, path, *, chunked):
+        partial_file = get_partial_file(path)
+
+        def write(chunk):
+            if chunked:
+                chunk = f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n"
+            self.wfile.write(chunk)
+
+        idle = 0.0
+        while True:
+            if chunk := f.read(STREAM_CHUNK_SIZE):
+                write(chunk)
+                idle = 0.0
+                continue
+            if not os.path.exists(partial_file):
+                if not os.path.exists(path):
+                    # removed when rendering failed, the body remains incomplete
+                    self.close_connection = True
+                    return
+                # renamed when complete, the file does not grow anymore
+                while chunk := f.read(STREAM_CHUNK_SIZE):
+                    write(chunk)
+                break
+            if idle > STREAM_TIMEOUT:
+                self.close_connection = True
+                return
+            time.sleep(STREAM_POLL_INTERVAL)
+            idle += STREAM_POLL_INTERVAL
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+    def copy_range(self, f, offset, count):
+        self.wfile.flush()
+        if hasattr(os, "sendfile"):
+            # zero-copy from the page cache to the socket
+            try:
+                while count > 0:
+                    sent = os.sendfile(
+                        self.connection.fileno(), f.fileno(), offset, count
+                    )
+                    if sent == 0:
+                        return
+                    offset += sent
+                    count -= sent
+                return
+            except (BrokenPipeError, ConnectionResetError):
+                raise
+            except OSError:
+                pass  # e.g., unsupported file system, continue with copying
+        f.seek(offset)
+        while count > 0:
+            chunk = f.read(min(count, 2**20))
+            if not chunk:
+                break
+            self.wfile.write(chunk)
+            count -= len(chunk)
 
     def generate_html(self, videos):
         template_file = os.path.join(os.path.dirname(__file__), "server.html")
         with open(template_file, "r") as f:
-            template = Template(f.read())
-        return template.render(videos=videos, video_type=self.get_video_type)
+            template = string.Template(f.read())
+        items = [
+            VIDEO_ITEM.format(
+                name=html.escape(urllib.parse.unquote(video)),
+                url=html.escape(video, quote=True),
+                video_type=self.get_video_type(video),
+            )
+            for video in videos
+        ]
+        return template.substitute(videos="".join(items) or NO_VIDEOS_ITEM)
 
     def get_video_type(self, video_filename):
         if video_filename.lower().endswith(".mp4"):
@@ -49,13 +372,139 @@ class VideoHandler(http.server.SimpleHTTPRequestHandler):
         return "video/mp4"  # Default type
 
 
-def run_server(video_directory: str, *, port: int = 8000, verbose: bool = False):
-    def handler(*args, **kwargs):
-        return VideoHandler(*args, video_directory=video_directory, port=port, **kwargs)
+class VideoServer(http.server.ThreadingHTTPServer):
+    """
+    Serves snippet directories under URL prefixes and renders snippets on demand.
 
-    with socketserver.TCPServer(("", port), handler) as httpd:
+    Snippets of a directory are served at /<prefix>/<file name> and rendered with
+    POST /<prefix>/render (see render_queue.validate_spec), the directory with an
+    empty prefix is served at the root. Further directories can be registered with
+    POST /directories, and the video files that snippets may be rendered from with
+    POST /video_files. All POST requests require the server token.
+
+    Attributes:
+        directories: The snippet directories by prefix.
+        video_files: The (resolved) video files that snippets may be rendered from.
+        token: The token required for POST requests (None to disable them).
+        render_workers: The maximum number of concurrent renders per directory.
+        max_pending_renders: The maximum number of pending renders per directory.
+    """
+
+    # one thread per connection, slow clients (or seeking) do not block others
+    daemon_threads = True
+
+    def __init__(
+        self,
+        server_address,
+        *,
+        token: str | None = None,
+        render_workers: int = 2,
+        max_pending_renders: int = 32,
+    ):
+        super().__init__(server_address, VideoHandler)
+        self.directories: dict[str, str] = {}
+        self.video_files: frozenset[str] = frozenset()
+        self.token = token
+        self.render_workers = render_workers
+        self.max_pending_renders = max_pending_renders
+        self._render_queues: dict[str, RenderQueue] = {}
+        self._lock = threading.Lock()
+
+    def add_directory(self, prefix: str, directory: str) -> None:
+        if prefix != "" and (
+            PREFIX_PATTERN.match(prefix) is None or prefix in RESERVED_PREFIXES
+        ):
+            raise ValueError(f"invalid prefix: {prefix}")
+        if not os.path.isdir(directory):
+            raise ValueError(f"not a directory: {directory}")
+        with self._lock:
+            self.directories = {**self.directories, prefix: os.path.abspath(directory)}
+            self._render_queues.pop(prefix, None)
+
+    def add_video_files(self, video_files) -> None:
+        video_files = frozenset(map(os.path.realpath, video_files))
+        with self._lock:
+            self.video_files = self.video_files | video_files
+
+    def is_known_video_file(self, video_file: str) -> bool:
+        # resolved, so that neither ".." nor symbolic links escape the known files
+        return os.path.realpath(video_file) in self.video_files
+
+    def get_url(self, prefix: str, file_name: str = "") -> str:
+        path = f"{prefix}/{file_name}" if prefix != "" else file_name
+        return "/" + urllib.parse.quote(path)
+
+    def get_render_queue(self, prefix: str) -> RenderQueue:
+        # snippets are rendered on demand by a bounded pool of workers
+        with self._lock:
+            if prefix not in self._render_queues:
+                self._render_queues[prefix] = RenderQueue(
+                    self.directories[prefix],
+                    max_workers=self.render_workers,
+                    max_pending=self.max_pending_renders,
+                )
+            return self._render_queues[prefix]
+
+    def server_close(self):
+        super().server_close()
+        with self._lock:
+            for render_queue in self._render_queues.values():
+                render_queue.shutdown()
+
+
+def _watch_parent(httpd: VideoServer, parent_pid: int) -> None:
+    # the server exits with the process that started it, even if it was killed
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    httpd.shutdown()
+
+
+def run_server(
+    video_directory: str | None = None,
+    *,
+    video_files=(),
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    verbose: bool = False,
+    render_workers: int = 2,
+    max_pending_renders: int = 32,
+    token: str | None = None,
+    parent_pid: int | None = None,
+    print_port: bool = False,
+):
+    """
+    Runs the video server until it is interrupted.
+
+    Args:
+        video_directory: The snippet directory served at the root (optional).
+        video_files: The video files that snippets may be rendered from.
+        host: The host to bind to (only the local machine by default).
+        port: The port to serve on (0 to choose a free port).
+        verbose: Whether to print status messages.
+        render_workers: The maximum number of concurrent renders per directory.
+        max_pending_renders: The maximum number of pending renders per directory.
+        token: The token required for POST requests (e.g., render requests).
+        parent_pid: Shut down when the process with this id exits.
+        print_port: Whether to print the port (e.g., for the starting process).
+    """
+    with VideoServer(
+        (host, port),
+        token=token,
+        render_workers=render_workers,
+        max_pending_renders=max_pending_renders,
+    ) as httpd:
+        if video_directory is not None:
+            httpd.add_directory("", video_directory)
+        httpd.add_video_files(video_files)
+        port = httpd.server_address[1]
+        if print_port:
+            print(port, flush=True)
         if verbose:
             print(f"Serving at port {port} from {video_directory}")
+        if parent_pid is not None:
+            threading.Thread(
+                target=_watch_parent, args=(httpd, parent_pid), daemon=True
+            ).start()
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
@@ -67,7 +516,7 @@ def run_server(video_directory: str, *, port: int = 8000, verbose: bool = False)
                 print("Server closed.")
 
 
-if __name__ == "__main__":
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Local Video Server")
     parser.add_argument(
         "-d",
@@ -76,10 +525,54 @@ if __name__ == "__main__":
         default=os.getcwd(),
         help="Directory to serve videos from (default: current directory)",
     )
+    parser.add_argument(
+        "--no-directory",
+        action="store_true",
+        help="Only serve directories registered with POST /directories",
+    )
+    parser.add_argument(
+        "--video-files",
+        type=str,
+        nargs="*",
+        default=[],
+        help="Video files that snippets may be rendered from",
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Host to bind to (default: 127.0.0.1, use 0.0.0.0 for all)",
+    )
     parser.add_argument(
         "-p", "--port", type=int, default=8000, help="Port to serve on (default: 8000)"
     )
+    parser.add_argument(
+        "-w",
+        "--render-workers",
+        type=int,
+        default=2,
+        help="Maximum number of concurrent renders (default: 2)",
+    )
+    parser.add_argument(
+        "--parent-pid", type=int, default=None, help="Exit with this process"
+    )
+    parser.add_argument(
+        "--print-port", action="store_true", help="Print the port once serving"
+    )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
-    run_server(video_directory=args.directory, port=args.port)
+    run_server(
+        video_directory=None if args.no_directory else args.directory,
+        video_files=args.video_files,
+        host=args.host,
+        port=args.port,
+        render_workers=args.render_workers,
+        token=os.environ.get(TOKEN_VARIABLE),
+        parent_pid=args.parent_pid,
+        print_port=args.print_port,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,40 @@
+import logging
 import os
+import subprocess
+import time
 from collections.abc import Sequence
+from contextlib import ExitStack
+from functools import partial
 from pathlib import Path
-from threading import current_thread
+from queue import Empty, Queue
+from threading import Event, Semaphore, Thread, current_thread
+from typing import NamedTuple
 
 import cv2
 import imageio
-import matplotlib.pyplot as plt
+import imageio_ffmpeg
+import numpy as np
 import vassi.features as asf
-from matplotlib.collections import LineCollection
 from vassi.data_structures.utils import OutOfInterval
+from vassi.dataset.utils import IndividualIdentifier
 from vassi.utils import hash_dict
-from vassi.visualization import adjust_lightness, get_trajectory_range
+from vassi.visualization import get_trajectory_range
 
-from .multi_video_capture import MultiVideoCapture
+from .capture_pool import capture_pool as default_capture_pool
+from .frame_cache import frame_cache as default_frame_cache
+from .frame_cache import get_frame_cache_key
+from .frame_sources import get_snippet_name
+from .overlay import OVERLAY_BACKENDS, get_overlay
 from .render_settings import RenderSettings
-from .utils import ImageOverlay, crop_and_scale
+from .render_spec import get_render_spec
+from .snippet_cache import RenderLock, get_partial_file, get_snippet_cache
+from .timeline import build_timeline
+from .utils import crop_and_scale, get_crop_size, get_scaled_size
+
+RENDER_LOCK_POLL_INTERVAL = 0.1
+
+# not printed, snippets are also rendered in the video server process
+logger = logging.getLogger(__name__)
 
 
 def get_roi(trajectories, individuals, interval):
@@ -47,6 +67,197 @@ def get_roi(trajectories, individuals, interval):
     return list(map(lambda v: int(round(v)), roi))
 
 
+class TrajectoryData(NamedTuple):
+    individuals: tuple[IndividualIdentifier, ...]
+    keypoints: np.ndarray  # (frames, individuals, keypoints, 2)
+    segments: np.ndarray  # (frames, individuals, segments, 2, 2)
+    valid: np.ndarray  # (frames, individuals)
+
+
+def get_trajectory_data(
+    trajectories, *, start, stop, keypoints, segments, roi=None, size
+) -> TrajectoryData:
+    # slice each trajectory once for all frames in [start, stop), normalized to roi
+    if roi is None:
+        offset, extent = np.zeros(2), np.asarray(size)
+    else:
+        offset = np.asarray(roi[:2])
+        extent = np.asarray((roi[2] - roi[0], roi[3] - roi[1]))
+    num_frames = stop - start
+    individuals = tuple(trajectories.keys())
+    shape = (num_frames, len(individuals))
+    trajectory_data = TrajectoryData(
+        individuals=individuals,
+        keypoints=np.full((*shape, len(keypoints), 2), np.nan),
+        segments=np.full((*shape, len(segments), 2, 2), np.nan),
+        valid=np.zeros(shape, dtype=bool),
+    )
+    for individual_idx, individual in enumerate(individuals):
+        trajectory = trajectories[individual]
+        if len(trajectory) == 0:
+            continue
+        first, last = trajectory.timestamps.min(), trajectory.timestamps.max()
+        if max(first, start) > min(last, stop - 1):
+            continue
+        try:
+            trajectory = trajectory.slice_window(max(first, start), min(last, stop - 1))
+        except OutOfInterval:
+            continue
+        # raises IndexError for keypoints that are not available
+        trajectory_keypoints = asf.keypoints(trajectory, keypoints=keypoints)
+        trajectory_segments = asf.posture_segments(trajectory, keypoint_pairs=segments)
+        frame_indices = np.round(np.asarray(trajectory.timestamps)).astype(int) - start
+        in_window = (frame_indices >= 0) & (frame_indices < num_frames)
+        frame_indices = frame_indices[in_window]
+        trajectory_data.keypoints[frame_indices, individual_idx] = (
+            trajectory_keypoints[in_window] - offset
+        ) / extent
+        trajectory_data.segments[frame_indices, individual_idx] = (
+            trajectory_segments[in_window] - offset
+        ) / extent
+        trajectory_data.valid[frame_indices, individual_idx] = True
+    return trajectory_data
+
+
+class CutJob:
+    def __init__(
+        self,
+        *,
+        output_file,
+        partial_file,
+        start,
+        num_frames,
+        padded_roi,
+        fps,
+        macro_block_size,
+        render,
+        writer_parameters=None,
+        remux_parameters=None,
+        decoder_output=None,
+        frame_key=None,
+        snippet_cache=None,
+        video_files=(),
+        on_stream=None,
+        render_lock=None,
+    ):
+        self.output_file = output_file
+        self.partial_file = partial_file
+        self.start = start
+        self.num_frames = num_frames
+        self.padded_roi = padded_roi
+        self.fps = fps
+        self.macro_block_size = macro_block_size
+        self.render = render
+        self.writer_parameters = (
+            writer_parameters if writer_parameters is not None else {}
+        )
+        # set when the output is fragmented for streaming, the stored snippet is
+        # rewritten into the layout of unstreamed output (same render spec and file)
+        self.remux_parameters = remux_parameters
+        # set when frames are cropped, scaled and converted by the decoder
+        self.decoder_output = decoder_output
+        # identifies the decoded frames in the frame cache
+        self.frame_key = frame_key
+        # finished snippets are registered in the snippet cache manifest
+        self.snippet_cache = snippet_cache
+        self.video_files = video_files
+        # called once the partial file can be streamed (with fragmented output)
+        self.on_stream = on_stream
+        # held while rendering, released when finished
+        self.render_lock = render_lock
+        self.created = time.perf_counter()
+        self.writer = None
+
+    def write(self, frame):
+        if self.writer is None:
+            # opened with the first frame, so that pending jobs hold no resources
+            self.writer = imageio.get_writer(
+                self.partial_file,
+                fps=self.fps,
+                macro_block_size=self.macro_block_size,
+                **self.writer_parameters,
+            )
+        self.writer.append_data(frame)
+        if (
+            self.on_stream is not None
+            # the encoder creates the file once it has buffered enough frames
+            and os.path.exists(self.partial_file)
+            and os.path.getsize(self.partial_file) > 0
+        ):
+            on_stream, self.on_stream = self.on_stream, None
+            on_stream()
+
+    def finish(self, success):
+        try:
+            if self.writer is not None:
+                writer, self.writer = self.writer, None
+                writer.close()
+        except BaseException:
+            success = False  # the partial file is incomplete
+            raise
+        finally:
+            try:
+                self._store(success)
+            finally:
+                if self.render_lock is not None:
+                    self.render_lock.release()
+
+    def _store(self, success):
+        # moves the complete snippet into the cache, or removes the partial file
+        if success and os.path.exists(self.partial_file):
+            if self.remux_parameters is not None:
+                self._remux()
+            os.replace(self.partial_file, self.output_file)
+            if self.snippet_cache is not None:
+                self.snippet_cache.add(
+                    self.output_file,
+                    video_files=self.video_files,
+                    render_time=time.perf_counter() - self.created,
+                )
+        elif os.path.exists(self.partial_file):
+            os.remove(self.partial_file)
+
+    def _remux(self):
+        # rewrites the container of the partial file without re-encoding, the snippet
+        # is not stored (and the partial file removed) if this fails
+        name, ext = os.path.splitext(self.partial_file)
+        remuxed_file = f"{name}.remux{ext}"
+        try:
+            subprocess.run(
+                [
+                    imageio_ffmpeg.get_ffmpeg_exe(),
+                    "-v",
+                    "error",
+                    "-nostdin",
+                    "-y",
+                    "-i",
+                    self.partial_file,
+                    *self.remux_parameters,
+                    remuxed_file,
+                ],
+                check=True,
+                capture_output=True,
+            )
+            os.replace(remuxed_file, self.partial_file)
+        except BaseException:
+            os.remove(self.partial_file)
+            raise
+        finally:
+            if os.path.exists(remuxed_file):
+                os.remove(remuxed_file)
+
+
+class RenderJob(NamedTuple):
+    # the inputs of a cut, derived from the snippet and its render settings
+    padded_start: float
+    padded_stop: float
+    roi: tuple[int, int, int, int] | None
+    padded_roi: tuple[int, int, int, int] | None
+    render_size: tuple[int, int]
+    render_spec: dict
+    output_file: str
+
+
 class VideoSnippet:
     def __init__(
         self,
@@ -56,8 +267,33 @@ class VideoSnippet:
         stop,
         render_settings=None,
         video_server_directory=".",
+        pipelined=False,
+        num_overlay_workers=1,
+        queue_size=16,
+        use_keyframe_index=False,
+        verify_frame_count=False,
+        capture_pool=None,
+        backend="opencv",
+        sequence_fps=None,
+        frame_cache=None,
     ):
         self.output_files = []
+        self._render_job = None
+        self._render_settings = None
+        self.use_keyframe_index = use_keyframe_index
+        self.verify_frame_count = verify_frame_count
+        # the ffmpeg backend crops, scales and converts frames while decoding,
+        # frame stores (see frame_sources.transcode_to_memmap) are memory-mapped
+        self.backend = backend
+        # frame rate of image sequences (directories or glob patterns of images)
+        self.sequence_fps = sequence_fps
+        self.capture_pool = (
+            capture_pool if capture_pool is not None else default_capture_pool
+        )
+        # decoded frames are reused when only overlay settings change
+        self.frame_cache = (
+            frame_cache if frame_cache is not None else default_frame_cache
+        )
         self._cap = None
         self._video_files: Sequence[str | Path] | None = None
         if len(video_files) > 0:
@@ -70,6 +306,11 @@ class VideoSnippet:
         self.trajectories = {}
         self.observation_data = {}
         self.video_server_directory = video_server_directory
+        # pipelined cutting runs decoding, overlay drawing and encoding concurrently,
+        # queue_size limits the number of frames held in memory
+        self.pipelined = pipelined
+        self.num_overlay_workers = num_overlay_workers
+        self.queue_size = queue_size
 
     @property
     def video_files(self):
@@ -77,8 +318,16 @@ class VideoSnippet:
 
     @video_files.setter
     def video_files(self, video_files):
-        self._cap = MultiVideoCapture(video_files)
+        # pooled captures keep their position and open files between snippets
+        self._cap = self.capture_pool.get(
+            video_files,
+            use_keyframe_index=self.use_keyframe_index,
+            verify_frame_count=self.verify_frame_count,
+            backend=self.backend,
+            sequence_fps=self.sequence_fps,
+        )
         self._video_files = video_files
+        self._invalidate()
 
     @property
     def cap(self):
@@ -86,19 +335,123 @@ class VideoSnippet:
             raise ValueError("not initialized")
         return self._cap
 
+    def _invalidate(self, *args):
+        self._render_job = None
+
     @property
-    def padded_start(self):
-        return max(0, self.start - self.render_settings.interval_padding * self.cap.fps)
+    def start(self):
+        return self._start
+
+    @start.setter
+    def start(self, start):
+        self._start = start
+        self._invalidate()
 
     @property
-    def padded_stop(self):
-        return min(
-            self.cap.total_frames,
-            self.stop + self.render_settings.interval_padding * self.cap.fps,
-        )
+    def stop(self):
+        return self._stop
+
+    @stop.setter
+    def stop(self, stop):
+        self._stop = stop
+        self._invalidate()
 
     @property
-    def roi(self):
+    def trajectories(self):
+        return self._trajectories
+
+    @trajectories.setter
+    def trajectories(self, trajectories):
+        self._trajectories = trajectories
+        self._invalidate()
+
+    @property
+    def observation_data(self):
+        return self._observation_data
+
+    @observation_data.setter
+    def observation_data(self, observation_data):
+        self._observation_data = observation_data
+        self._invalidate()
+
+    @property
+    def video_server_directory(self):
+        return self._video_server_directory
+
+    @video_server_directory.setter
+    def video_server_directory(self, video_server_directory):
+        self._video_server_directory = video_server_directory
+        self._invalidate()
+
+    @property
+    def render_settings(self):
+        return self._render_settings
+
+    @render_settings.setter
+    def render_settings(self, render_settings):
+        if self._render_settings is not None:
+            self._render_settings.unobserve(self._invalidate)
+        # any trait change may change the render job
+        render_settings.observe(self._invalidate)
+        self._render_settings = render_settings
+        self._invalidate()
+
+    @property
+    def render_job(self):
+        """
+        The render job of the snippet, computed once and invalidated when the
+        snippet inputs or render settings change.
+
+        Note that in-place modifications (e.g., of the trajectories dictionary) are
+        not tracked, assign a new value instead.
+        """
+        if self._render_job is None:
+            self._render_job = self._create_render_job()
+        return self._render_job
+
+    def _create_render_job(self):
+        if self.video_files is None:
+            raise ValueError("specify video_files")
+        padding = self.render_settings.interval_padding * self.cap.fps
+        padded_start = max(0, self.start - padding)
+        padded_stop = min(self.cap.total_frames, self.stop + padding)
+        roi = self._get_roi(padded_start, padded_stop)
+        padded_roi = self._get_padded_roi(roi)
+        render_size = self._get_render_size(padded_roi)
+        render_spec = get_render_spec(
+            self.render_settings,
+            observation_data=self.observation_data,
+            individuals=(
+                list(self.trajectories.keys()) if len(self.trajectories) > 0 else None
+            ),
+            start=int(padded_start),
+            stop=int(padded_stop),
+            render_size=render_size,
+        )
+        name, ext = get_snippet_name(self.video_files[0])
+        identifier = {
+            "name": name,
+            "ext": ext,
+            "video_files": self.video_files,
+            "start": int(padded_start),
+            "stop": int(padded_stop),
+            "roi": padded_roi,
+            # only settings and data that affect the rendered frames
+            "render_spec": render_spec,
+        }
+        identifier = hash_dict(identifier)
+        file_name = f"{name}_{identifier}{ext}"
+        return RenderJob(
+            padded_start=padded_start,
+            padded_stop=padded_stop,
+            roi=roi,
+            padded_roi=padded_roi,
+            render_size=render_size,
+            render_spec=render_spec,
+            output_file=os.path.join(self.video_server_directory, file_name),
+        )
+
+    def _get_roi(self, padded_start, padded_stop):
         if self.trajectories == {} or not self.render_settings.crop_roi:
             return None
         individuals = []
@@ -108,24 +461,37 @@ class VideoSnippet:
                 if "recipient" not in observation:
                     continue
                 individuals.append(observation["recipient"])
-        return get_roi(
-            self.trajectories, set(individuals), (self.padded_start, self.padded_stop)
-        )
+        return get_roi(self.trajectories, set(individuals), (padded_start, padded_stop))
 
-    @property
-    def padded_roi(self):
-        if self.roi is None:
+    def _get_padded_roi(self, roi):
+        if roi is None:
             return None
-        if not all(map(lambda value: isinstance(value, int), self.roi)):
+        if not all(map(lambda value: isinstance(value, int), roi)):
             raise ValueError("Invalid ROI with non-int values")
         padding = self.render_settings.get_roi_padding()
         return (
-            max(0, self.roi[0] - padding),
-            max(0, self.roi[1] - padding),
-            min(self.video_width - 1, self.roi[2] + padding),
-            min(self.video_height - 1, self.roi[3] + padding),
+            max(0, roi[0] - padding),
+            max(0, roi[1] - padding),
+            min(self.video_width - 1, roi[2] + padding),
+            min(self.video_height - 1, roi[3] + padding),
         )
 
+    @property
+    def padded_start(self):
+        return self.render_job.padded_start
+
+    @property
+    def padded_stop(self):
+        return self.render_job.padded_stop
+
+    @property
+    def roi(self):
+        return self.render_job.roi
+
+    @property
+    def padded_roi(self):
+        return self.render_job.padded_roi
+
     @property
     def video_width(self):
         return int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -136,48 +502,305 @@ class VideoSnippet:
 
     @property
     def output_file(self):
-        if self.video_files is None:
-            raise ValueError("specify video_files")
-        name, ext = os.path.splitext(os.path.basename(self.video_files[0]))
-        identifier = {
-            "name": name,
-            "ext": ext,
-            "video_files": self.video_files,
-            "start": int(self.padded_start),
-            "stop": int(self.padded_stop),
-            "roi": self.padded_roi,
-            "trajectories": list(self.trajectories.keys()),
-            "observation_data": self.observation_data,
-            "render_settings": self.render_settings.config(),
+        return self.render_job.output_file
+
+    @property
+    def render_spec(self):
+        return self.render_job.render_spec
+
+    @property
+    def snippet_cache(self):
+        return get_snippet_cache(self.video_server_directory)
+
+    @property
+    def partial_file(self):
+        # rendering writes here first, so that output_file only exists when complete
+        return get_partial_file(self.output_file)
+
+    def _get_overlay(self, original_size, crop_size, render_size):
+        return get_overlay(
+            self.render_settings.overlay_backend,
+            original_size=original_size,
+            crop_size=crop_size,
+            render_size=render_size,
+        )
+
+    def _decode_frame(self, job):
+        ret, frame = self.cap.read()
+        if not ret or frame is None:
+            return None
+        if job.decoder_output is not None:
+            return (
+                (self.video_width, self.video_height),
+                get_crop_size(self.video_width, self.video_height, job.padded_roi),
+                frame,
+            )
+        return self._scale_frame(frame, job.padded_roi)
+
+    def _get_render_size(self, padded_roi):
+        return get_scaled_size(
+            *get_crop_size(self.video_width, self.video_height, padded_roi),
+            max_width=self.render_settings.max_render_width,
+            max_height=self.render_settings.max_render_height,
+            block_size=self.render_settings.macro_block_size,
+        )
+
+    def _get_decoder_output(self, padded_roi):
+        return {
+            "roi": padded_roi,
+            "size": self._get_render_size(padded_roi),
+            "pixel_format": OVERLAY_BACKENDS[
+                self.render_settings.overlay_backend
+            ].pixel_format,
         }
-        identifier = hash_dict(identifier)
-        file_name = f"{name}_{identifier}{ext}"
-        return os.path.join(self.video_server_directory, file_name)
 
-    def cut(
+    def _configure_decoder(self, job):
+        # pooled captures are shared, always (re)set the decoder output
+        if not self.cap.supports_output:
+            return
+        if job is None or job.decoder_output is None:
+            self.cap.set_output()
+            return
+        self.cap.set_output(**job.decoder_output)
+
+    def _read_frames(self, job):
+        # yields decoded frames of the job, from the frame cache if possible
+        if (cached := self.frame_cache.get(job.frame_key)) is not None:
+            for frame in cached.frames:
+                yield cached.original_size, cached.crop_size, frame
+            return
+        self._configure_decoder(job)
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, job.start)
+        collected = None
+        for count in range(job.num_frames):
+            decoded = self._decode_frame(job)
+            if decoded is None:
+                return
+            original_size, crop_size, frame = decoded
+            if count == 0 and self.frame_cache.accepts(frame.nbytes * job.num_frames):
+                # preallocated, so that frames are not copied again when cached
+                collected = np.empty((job.num_frames, *frame.shape), dtype=frame.dtype)
+            if collected is not None:
+                collected[count] = frame
+                if count == job.num_frames - 1:
+                    self.frame_cache.put(
+                        job.frame_key,
+                        original_size=original_size,
+                        crop_size=crop_size,
+                        frames=collected,
+                    )
+            yield decoded
+
+    def _scale_frame(self, frame, padded_roi):
+        frame_cropped, frame_scaled = crop_and_scale(
+            frame,
+            roi=padded_roi,
+            max_width=self.render_settings.max_render_width,
+            max_height=self.render_settings.max_render_height,
+            block_size=self.render_settings.macro_block_size,
+        )
+        return (
+            frame.shape[:2][::-1],
+            frame_cropped.shape[:2][::-1],
+            frame_scaled,
+        )
+
+    def _render_frame(
         self,
+        overlay,
+        frame_scaled,
+        count,
         *,
-        progress_bar=None,
+        timeline,
+        trajectory_data,
+        actor,
+        recipient,
+        convert_color=True,
     ):
-        if os.path.exists(self.output_file):
-            if progress_bar is not None:
-                progress_bar.value = 100
-            return True
-        if not os.path.exists(self.video_server_directory):
-            os.makedirs(self.video_server_directory, exist_ok=True)
-        num_frames = int(self.padded_stop) - int(self.padded_start)
-        padded_roi = self.padded_roi
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, int(self.padded_start))
+        if convert_color:
+            frame_scaled = cv2.cvtColor(frame_scaled, overlay.color_conversion)
+        else:
+            # overlays draw in place, decoded frames may be cached
+            frame_scaled = frame_scaled.copy()
+        overlay.clear()
+        if timeline is not None:
+            # labels and highlight color are precomputed per frame
+            label_state = timeline.get(count)
+            for label in label_state.labels:
+                overlay.draw_label(
+                    label.category,
+                    color=label.color,
+                    box_color=label.box_color,
+                    highlighted=label.highlighted,
+                )
+            highlight_color = label_state.highlight_color
+
+            for individual_idx, individual in enumerate(trajectory_data.individuals):
+                if not trajectory_data.valid[count, individual_idx]:
+                    continue
+                color = self.render_settings.other_color
+                zorder = 0
+                if individual == actor:
+                    if (
+                        highlight_color is None
+                        or not self.render_settings.apply_highlight_color_to_actor()
+                    ):
+                        color = self.render_settings.actor_color
+                    else:
+                        color = highlight_color
+                    zorder = 2
+                elif individual == recipient:
+                    if (
+                        highlight_color is None
+                        or not self.render_settings.apply_highlight_color_to_recipient()
+                    ):
+                        color = self.render_settings.recipient_color
+                    else:
+                        color = highlight_color
+                    zorder = 1
+                overlay.draw_individual(
+                    trajectory_data.keypoints[count, individual_idx],
+                    trajectory_data.segments[count, individual_idx],
+                    color=color,
+                    size=self.render_settings.overlay_size,
+                    zorder=zorder,
+                )
+        return overlay.draw_overlay(frame_scaled)
+
+    def _cut_sequential(self, job, *, progress_bar):
+        thread = current_thread()
+        overlay = None
         count = 0
-        writer = imageio.get_writer(
-            self.output_file,
-            fps=self.cap.get(cv2.CAP_PROP_FPS),
-            macro_block_size=self.render_settings.macro_block_size,
-        )
+        success = True
+        frames = self._read_frames(job)
+        try:
+            while count < job.num_frames:
+                if getattr(thread, "interrupt", False):
+                    success = False
+                    break
+                decoded = next(frames, None)
+                if decoded is None:
+                    success = False
+                    break
+                original_size, crop_size, frame_scaled = decoded
+                if overlay is None:
+                    overlay = self._get_overlay(
+                        original_size, crop_size, frame_scaled.shape[:2][::-1]
+                    )
+                job.write(job.render(overlay, frame_scaled, count))
+                count += 1
+                if progress_bar is not None:
+                    progress_bar.value = 100 * count / job.num_frames
+        finally:
+            if overlay is not None:
+                overlay.close()
+        return success
+
+    def _cut_pipelined(self, job, *, progress_bar):
+        # decoder thread -> overlay worker threads -> encoding in the calling thread,
+        # the semaphore caps the number of frames in flight across all stages
         thread = current_thread()
+        stop = Event()
+        in_flight = Semaphore(max(1, self.queue_size))
+        num_workers = max(1, self.num_overlay_workers)
+        decoded_frames = Queue()
+        rendered_frames = Queue()
+        errors = []
+        frames = self._read_frames(job)
+
+        def decode():
+            try:
+                for count in range(job.num_frames):
+                    while not in_flight.acquire(timeout=0.1):
+                        if stop.is_set():
+                            return
+                    if stop.is_set():
+                        return
+                    decoded = next(frames, None)
+                    if decoded is None:
+                        return
+                    decoded_frames.put((count, decoded))
+            except Exception as e:  # noqa: BLE001 (raised in the calling thread)
+                errors.append(e)
+                stop.set()
+            finally:
+                for _ in range(num_workers):
+                    decoded_frames.put(None)
+
+        def draw():
+            overlay = None
+            try:
+                while (item := decoded_frames.get()) is not None:
+                    if stop.is_set():
+                        continue
+                    count, (original_size, crop_size, frame_scaled) = item
+                    if overlay is None:
+                        overlay = self._get_overlay(
+                            original_size, crop_size, frame_scaled.shape[:2][::-1]
+                        )
+                    rendered_frames.put(
+                        (count, job.render(overlay, frame_scaled, count))
+                    )
+            except Exception as e:  # noqa: BLE001 (raised in the calling thread)
+                errors.append(e)
+                stop.set()
+            finally:
+                if overlay is not None:
+                    overlay.close()
+                rendered_frames.put(None)
+
+        threads = [Thread(target=decode, daemon=True)] + [
+            Thread(target=draw, daemon=True) for _ in range(num_workers)
+        ]
+        for stage in threads:
+            stage.start()
+        pending = {}
+        count = 0
+        finished_workers = 0
         success = True
+        try:
+            while count < job.num_frames and finished_workers < num_workers:
+                if getattr(thread, "interrupt", False):
+                    success = False
+                    break
+                try:
+                    item = rendered_frames.get(timeout=0.1)
+                except Empty:
+                    continue
+                if item is None:
+                    finished_workers += 1
+                    continue
+                pending[item[0]] = item[1]
+                # frames may arrive out of order from multiple workers
+                while count in pending:
+                    job.write(pending.pop(count))
+                    in_flight.release()
+                    count += 1
+                    if progress_bar is not None:
+                        progress_bar.value = 100 * count / job.num_frames
+        finally:
+            stop.set()
+            for stage in threads:
+                stage.join()
+        if len(errors) > 0:
+            raise errors[0]
+        return success and count == job.num_frames
 
-        overlay = None
+    def _prepare_cut(self, *, decoder_output=True, on_stream=None, render_lock=None):
+        padded_roi = self.padded_roi
+        try:
+            trajectory_data = get_trajectory_data(
+                self.trajectories if self.render_settings.draw_trajectories else {},
+                start=int(self.padded_start),
+                stop=int(self.padded_stop),
+                keypoints=tuple(self.render_settings.keypoints),
+                segments=self.render_settings.get_segments(),
+                roi=padded_roi,
+                size=(self.video_width, self.video_height),
+            )
+        except IndexError as e:
+            logger.warning(f"Cannot draw the trajectories of the snippet: {e}")
+            return None
         actor = None
         recipient = None
         if (
@@ -187,184 +810,263 @@ class VideoSnippet:
             # maybe warn if they are not all consistent
             actor = self.observation_data["observations"][0]["actor"]
             recipient = self.observation_data["observations"][0]["recipient"]
+        if decoder_output and self.cap.supports_output:
+            decoder_output = self._get_decoder_output(padded_roi)
+        else:
+            decoder_output = None
+        frame_key = get_frame_cache_key(
+            self.video_files,
+            start=self.padded_start,
+            stop=self.padded_stop,
+            roi=padded_roi,
+            render_size=self.render_job.render_size,
+            pixel_format=(
+                "bgr24" if decoder_output is None else decoder_output["pixel_format"]
+            ),
+        )
+        return CutJob(
+            output_file=self.output_file,
+            partial_file=self.partial_file,
+            start=int(self.padded_start),
+            num_frames=int(self.padded_stop) - int(self.padded_start),
+            padded_roi=padded_roi,
+            fps=self.cap.get(cv2.CAP_PROP_FPS),
+            macro_block_size=self.render_settings.macro_block_size,
+            writer_parameters=self.render_settings.get_writer_parameters(
+                streaming=on_stream is not None
+            ),
+            remux_parameters=(
+                self.render_settings.get_remux_parameters()
+                if on_stream is not None and self.render_settings.streaming
+                else None
+            ),
+            render=partial(
+                self._render_frame,
+                timeline=build_timeline(
+                    self.observation_data,
+                    self.render_settings,
+                    start=int(self.padded_start),
+                    num_frames=int(self.padded_stop) - int(self.padded_start),
+                ),
+                trajectory_data=trajectory_data,
+                actor=actor,
+                recipient=recipient,
+                convert_color=decoder_output is None,
+            ),
+            decoder_output=decoder_output,
+            frame_key=frame_key,
+            snippet_cache=self.snippet_cache,
+            video_files=list(map(str, self.video_files)),
+            on_stream=on_stream if self.render_settings.streaming else None,
+            render_lock=render_lock,
+        )
+
+    def cut(
+        self,
+        *,
+        progress_bar=None,
+        on_stream=None,
+    ):
+        """
+        Renders the snippet to its output file, unless it is already cached.
+
+        Args:
+            progress_bar: An optional progress bar.
+            on_stream: An optional callback, called once when the snippet can be
+                streamed from the video server while it is rendered (only with
+                streaming enabled in the render settings).
+
+        Returns:
+            Whether the snippet was rendered (or cached) successfully.
+        """
+        if self.snippet_cache.contains(self.output_file):
+            if progress_bar is not None:
+                progress_bar.value = 100
+            return True
+        if not os.path.exists(self.video_server_directory):
+            os.makedirs(self.video_server_directory, exist_ok=True)
+        render_lock = RenderLock(self.output_file)
+        if not self._wait_for_render_lock(render_lock, on_stream=on_stream):
+            return False
+        try:
+            if self.snippet_cache.contains(self.output_file):
+                # rendered by the previous lock owner
+                if progress_bar is not None:
+                    progress_bar.value = 100
+                return True
+            job = self._prepare_cut(on_stream=on_stream, render_lock=render_lock)
+            if job is None:
+                return False
+            cut = self._cut_pipelined if self.pipelined else self._cut_sequential
+            success = False
+            with self.cap.lock:
+                try:
+                    success = cut(job, progress_bar=progress_bar)
+                finally:
+                    job.finish(success)
+            return success
+        finally:
+            # released when the job is finished, or here if it was never started
+            render_lock.release()
 
-        while count < num_frames:
+    def _wait_for_render_lock(self, render_lock, *, on_stream=None):
+        # snippets that are rendered by another process (or thread) are not rendered
+        # again, wait for the render to finish (or fail) instead
+        thread = current_thread()
+        while not render_lock.acquire():
             if getattr(thread, "interrupt", False):
-                success = False
-                break
-            ret, frame = self.cap.read()
-            if not ret or frame is None:
-                success = False
-                break
-            frame_cropped, frame_scaled = crop_and_scale(
-                frame,
-                roi=padded_roi,
-                max_width=self.render_settings.max_render_width,
-                max_height=self.render_settings.max_render_height,
-                block_size=self.render_settings.macro_block_size,
-            )
-            frame_scaled = cv2.cvtColor(frame_scaled, cv2.COLOR_BGR2RGBA)
-            if overlay is None:
-                overlay = ImageOverlay(
-                    original_size=frame.shape[:2][::-1],
-                    crop_size=frame_cropped.shape[:2][::-1],
-                    render_size=frame_scaled.shape[:2][::-1],
-                )
+                return False
+            partial_file = self.partial_file
+            if (
+                on_stream is not None
+                and self.render_settings.streaming
+                and os.path.exists(partial_file)
+                and os.path.getsize(partial_file) > 0
+            ):
+                # the video server streams the partial file of the other render
+                on_stream()
+                on_stream = None
+            time.sleep(RENDER_LOCK_POLL_INTERVAL)
+        return True
 
-            # overlay plotting
-            ax = overlay.get_axes()
-            if "observations" in self.observation_data:
-                observations = self.observation_data["observations"]
-                frame_idx = self.cap.frame - 1  # reading increments to the next
-                highlight = (
-                    []
-                    if "highlight" not in self.observation_data
-                    else self.observation_data["highlight"]
-                )
-                highlight_color = None
+    def cut_many(self, snippets, *, progress_bar=None):
+        """
+        Cuts multiple snippets of the same video files, decoding each frame only once.
 
-                for idx, observation in enumerate(observations):
-                    if (
-                        frame_idx < observation["start"]
-                        or frame_idx > observation["stop"]
-                    ):
-                        continue
-                    highlighted = self.render_settings.highlight and idx in highlight
-                    category = observation["category"]
-                    if highlighted:
-                        try:
-                            highlight_color = (
-                                self.render_settings.override_highlight_color[category]
-                            )
-                        except KeyError:
-                            highlight_color = self.render_settings.highlight_color
-                    if not self.render_settings.draw_label:
-                        continue
-                    ax.text(
-                        0.5,
-                        0.1,
-                        category,
-                        ha="center",
-                        va="center",
-                        color=(
-                            highlight_color
-                            if highlighted
-                            else self.render_settings.text_color
-                        ),
-                        fontsize=12,
-                        bbox=dict(
-                            boxstyle="round",
-                            lw=1 if highlighted else 0,
-                            ec=(
-                                highlight_color
-                                if highlighted
-                                else self.render_settings.box_color
-                            ),
-                            fc=(
-                                *adjust_lightness(
-                                    (
-                                        highlight_color
-                                        if highlighted
-                                        else self.render_settings.box_color
-                                    ),
-                                    1.5,
-                                ),
-                                0.5,
-                            ),
-                        ),
-                        zorder=3,
-                        transform=ax.transAxes,
-                    )
+        Frames in the union of all (padded) snippet intervals are decoded in order and
+        passed to all snippets that contain them, each with its own ROI, scaling and
+        overlay. Writers are opened and finalized as snippets start and end.
 
-                for individual, trajectory in self.trajectories.items():
-                    if not self.render_settings.draw_trajectories:
-                        break
-                    try:
-                        trajectory = trajectory.slice_window(frame_idx, frame_idx)
-                    except OutOfInterval:
-                        continue
-                    try:
-                        keypoints = asf.keypoints(
-                            trajectory,
-                            keypoints=tuple(self.render_settings.keypoints),
-                        )
-                        segments = asf.posture_segments(
-                            trajectory,
-                            keypoint_pairs=tuple(self.render_settings.get_segments()),
-                        )
-                    except IndexError as e:
-                        print(e, flush=True)
-                        success = False
-                        break
-                    keypoints = keypoints[0]
-                    segments = segments[0]  # only one timestamp
-
-                    if padded_roi is None:
-                        # simple case without roi
-                        keypoints = keypoints / (self.video_width, self.video_height)
-                        segments = segments / (self.video_width, self.video_height)
-                    else:
-                        keypoints = (keypoints - padded_roi[:2]) / (
-                            padded_roi[2] - padded_roi[0],
-                            padded_roi[3] - padded_roi[1],
-                        )
-                        segments = (segments - padded_roi[:2]) / (
-                            padded_roi[2] - padded_roi[0],
-                            padded_roi[3] - padded_roi[1],
-                        )
-                    keypoints[..., 1] = 1 - keypoints[..., 1]
-                    segments[..., 1] = 1 - segments[..., 1]
-
-                    color = self.render_settings.other_color
-                    zorder = 0
-                    if individual == actor:
-                        if (
-                            highlight_color is None
-                            or not self.render_settings.apply_highlight_color_to_actor()
-                        ):
-                            color = self.render_settings.actor_color
-                        else:
-                            color = highlight_color
-                        zorder = 2
-                    elif individual == recipient:
-                        if (
-                            highlight_color is None
-                            or not self.render_settings.apply_highlight_color_to_recipient()
-                        ):
-                            color = self.render_settings.recipient_color
-                        else:
-                            color = highlight_color
-                        zorder = 1
-
-                    ax.add_collection(
-                        LineCollection(
-                            segments,
-                            color=color,
-                            lw=overlay.get_pixel_size(
-                                self.render_settings.overlay_size / 2
-                            ),
-                            transform=ax.transAxes,
-                            zorder=zorder,
-                        )
+        Args:
+            snippets: A sequence of snippet specifications (dictionaries with start,
+                stop and optionally observation_data and trajectories). The snippet is
+                updated to each specification in turn, so that its attributes reflect
+                the last one afterwards.
+            progress_bar: An optional progress bar.
+
+        Returns:
+            A list of booleans indicating which snippets were cut successfully.
+        """
+        results: list[bool] = [False] * len(snippets)
+        jobs: dict[str, tuple[list[int], CutJob]] = {}
+        # snippets that are rendered by others, by output file
+        locked: dict[str, tuple[list[int], RenderLock]] = {}
+        # locks of the snippets that are rendered here
+        acquired: list[RenderLock] = []
+        if not os.path.exists(self.video_server_directory):
+            os.makedirs(self.video_server_directory, exist_ok=True)
+        try:
+            for idx, snippet in enumerate(snippets):
+                self.start = snippet["start"]
+                self.stop = snippet["stop"]
+                if "observation_data" in snippet:
+                    self.observation_data = snippet["observation_data"]
+                if "trajectories" in snippet:
+                    self.trajectories = snippet["trajectories"]
+                if (output_file := self.output_file) in jobs:
+                    # identical snippets are only rendered once
+                    jobs[output_file][0].append(idx)
+                    continue
+                if output_file in locked:
+                    locked[output_file][0].append(idx)
+                    continue
+                if self.snippet_cache.contains(output_file):
+                    results[idx] = True
+                    continue
+                render_lock = RenderLock(output_file)
+                if not render_lock.acquire():
+                    locked[output_file] = ([idx], render_lock)
+                    continue
+                acquired.append(render_lock)
+                # frames are shared between snippets with different ROIs, so the
+                # decoder always outputs full frames
+                if (
+                    job := self._prepare_cut(
+                        decoder_output=False, render_lock=render_lock
                     )
-                    ax.scatter(
-                        *keypoints.T,
-                        s=overlay.get_pixel_size(self.render_settings.overlay_size)
-                        ** 2,
-                        c=color,
-                        lw=0,
-                        transform=ax.transAxes,
-                        zorder=zorder,
+                ) is None:
+                    render_lock.release()
+                    continue
+                jobs[output_file] = ([idx], job)
+        except BaseException:
+            # no job was started, none of the snippets is rendered
+            for render_lock in acquired:
+                render_lock.release()
+            raise
+        if len(jobs) > 0:
+            self._cut_jobs(jobs, results, progress_bar=progress_bar)
+        elif progress_bar is not None:
+            progress_bar.value = 100
+        for output_file, (indices, render_lock) in locked.items():
+            # wait for renders of other processes, but do not repeat failed ones
+            thread = current_thread()
+            while not render_lock.acquire():
+                if getattr(thread, "interrupt", False):
+                    return results
+                time.sleep(RENDER_LOCK_POLL_INTERVAL)
+            render_lock.release()
+            if self.snippet_cache.contains(output_file):
+                for idx in indices:
+                    results[idx] = True
+        return results
+
+    def _cut_jobs(self, jobs, results, *, progress_bar):
+        pending = sorted(jobs.values(), key=lambda item: item[1].start)
+        active: list[tuple[list[int], CutJob]] = []
+        overlays = {}
+        thread = current_thread()
+        num_frames = 0
+        union_stop = -1
+        for _, job in pending:
+            job_stop = job.start + job.num_frames
+            num_frames += max(0, job_stop - max(job.start, union_stop))
+            union_stop = max(union_stop, job_stop)
+        count = 0
+        frame_idx = pending[0][1].start
+        self.cap.lock.acquire()
+        try:
+            self._configure_decoder(None)
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            while len(pending) > 0 or len(active) > 0:
+                if len(active) == 0 and pending[0][1].start > frame_idx:
+                    # gap between snippets
+                    frame_idx = pending[0][1].start
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+                while len(pending) > 0 and pending[0][1].start <= frame_idx:
+                    active.append(pending.pop(0))
+                if getattr(thread, "interrupt", False):
+                    break
+                ret, frame = self.cap.read()
+                if not ret or frame is None:
+                    break
+                for indices, job in active:
+                    original_size, crop_size, frame_scaled = self._scale_frame(
+                        frame, job.padded_roi
                     )
-            if not success:
-                break
-            writer.append_data(overlay.draw_overlay(frame_scaled))
-            count += 1
-            if progress_bar is not None:
-                progress_bar.value = 100 * count / num_frames
-        if overlay is not None:
-            plt.close(overlay.fig)
-        writer.close()
-        if not success and os.path.exists(self.output_file):
-            os.remove(self.output_file)
-        return success
+                    if (overlay := overlays.get(job.output_file)) is None:
+                        overlay = self._get_overlay(
+                            original_size, crop_size, frame_scaled.shape[:2][::-1]
+                        )
+                        overlays[job.output_file] = overlay
+                    job.write(job.render(overlay, frame_scaled, frame_idx - job.start))
+                frame_idx += 1
+                count += 1
+                if progress_bar is not None:
+                    progress_bar.value = 100 * count / num_frames
+                for indices, job in list(active):
+                    if frame_idx < job.start + job.num_frames:
+                        continue
+                    active.remove((indices, job))
+                    overlays.pop(job.output_file).close()
+                    job.finish(True)
+                    for idx in indices:
+                        results[idx] = True
+        finally:
+            self.cap.lock.release()
+            for overlay in overlays.values():
+                overlay.close()
+            # all jobs are finished (and their locks released), even if one fails
+            with ExitStack() as stack:
+                for _, job in active + pending:
+                    stack.callback(job.finish, False)
+        return results
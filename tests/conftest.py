@@ -0,0 +1,14 @@
+import pytest
+from helpers import write_video
+
+
+@pytest.fixture
+def cache_directory(tmp_path, monkeypatch):
+    directory = tmp_path / "cache"
+    monkeypatch.setenv("OBSERVATION_LIBRARY_CACHE", str(directory))
+    return directory
+
+
+@pytest.fixture
+def encoded_video(tmp_path):
+    return write_video(tmp_path / "video.mp4", 600)
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+NUM_BITS = 12
+BIT_WIDTH = 10
+
+
+def encode_frame_number(frame: int, *, width: int = 128, height: int = 64):
+    # frame number as blocks of black and white bits, robust to compression
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    for bit in range(NUM_BITS):
+        if frame >> bit & 1:
+            x = bit * BIT_WIDTH
+            img[height // 4 : 3 * height // 4, x : x + BIT_WIDTH] = 255
+    return img
+
+
+def decode_frame_number(img) -> int:
+    row = img[img.shape[0] // 2]
+    return sum(
+        1 << bit
+        for bit in range(NUM_BITS)
+        if row[bit * BIT_WIDTH + BIT_WIDTH // 2].mean() > 127
+    )
+
+
+def write_video(path, num_frames, *, fps=25, gop_size=50):
+    imageio = pytest.importorskip("imageio")
+    writer = imageio.get_writer(
+        str(path),
+        fps=fps,
+        codec="libx264",
+        quality=None,
+        pixelformat="yuv420p",
+        macro_block_size=8,
+        # long gop with b-frames, presentation and decoding order differ
+        ffmpeg_params=["-g", str(gop_size), "-bf", "2", "-sc_threshold", "0"],
+    )
+    for frame in range(num_frames):
+        writer.append_data(encode_frame_number(frame))
+    writer.close()
+    return str(path)
+
+
+def read_frames(path, *, width: int = 128, height: int = 64):
+    # decoded frames of a (rendered) video, scaled back to the encoded frame size
+    cv2 = pytest.importorskip("cv2")
+    cap = cv2.VideoCapture(str(path))
+    frames = []
+    while True:
+        ret, img = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA))
+    cap.release()
+    return np.stack(frames)
+
+
+def read_box_types(path) -> list[str]:
+    # the top-level boxes (atoms) of an mp4 file, e.g. moov before mdat (faststart)
+    box_types = []
+    with open(path, "rb") as file:
+        while len(header := file.read(8)) == 8:
+            size = int.from_bytes(header[:4], "big")
+            box_types.append(header[4:].decode("latin-1"))
+            if size == 1:
+                size = int.from_bytes(file.read(8), "big") - 8
+            elif size == 0:
+                break  # extends to the end of the file
+            file.seek(size - 8, 1)
+    return box_types
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("vassi.utils")
+
+from observation_library.frame_cache import FrameCache, get_frame_cache_key
+
+
+def put_frames(cache, key, num_bytes):
+    cache.put(
+        key,
+        original_size=(64, 32),
+        crop_size=(64, 32),
+        frames=np.zeros(num_bytes, dtype=np.uint8),
+    )
+
+
+@pytest.mark.parametrize("use_directory", [False, True])
+def test_byte_bound(tmp_path, use_directory):
+    cache = FrameCache(
+        max_bytes=300, directory=str(tmp_path) if use_directory else None
+    )
+    for key in ("a", "b", "c"):
+        put_frames(cache, key, 100)
+    assert cache.get("a") is not None  # most recently used
+    put_frames(cache, "d", 100)
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in ("a", "c", "d"))
+    # too large to be cached, nothing is evicted
+    assert not cache.accepts(301)
+    put_frames(cache, "e", 301)
+    assert cache.get("e") is None
+    assert cache.get("a") is not None
+    if use_directory:
+        assert sorted(path.stem for path in tmp_path.glob("*.npy")) == ["a", "c", "d"]
+        # reloaded from the directory
+        assert FrameCache(max_bytes=300, directory=str(tmp_path)).get("d") is not None
+
+
+def test_max_bytes_variable(monkeypatch):
+    monkeypatch.setenv("OBSERVATION_LIBRARY_FRAME_CACHE_BYTES", "0")
+    cache = FrameCache()
+    assert cache.max_bytes == 0
+    assert not cache.accepts(1)
+
+
+def test_cache_key(tmp_path):
+    video_file = tmp_path / "video.mp4"
+    video_file.write_bytes(b"video")
+    default = {
+        "start": 10,
+        "stop": 20,
+        "roi": (0, 0, 63, 31),
+        "render_size": (64, 32),
+        "pixel_format": "rgb24",
+    }
+    key = get_frame_cache_key([video_file], **default)
+    assert get_frame_cache_key([video_file], **default) == key
+    for name, value in [
+        ("start", 11),
+        ("stop", 21),
+        ("roi", (0, 0, 31, 31)),
+        ("roi", None),
+        ("render_size", (32, 16)),
+        ("pixel_format", "bgr24"),
+    ]:
+        assert get_frame_cache_key([video_file], **{**default, name: value}) != key
+    # the source video was modified
+    video_file.write_bytes(b"modified video")
+    assert get_frame_cache_key([video_file], **default) != key
+
+
+def test_cache_hit_skips_decoding(tmp_path, cache_directory, encoded_video):
+    pytest.importorskip("cv2")
+    pytest.importorskip("matplotlib")
+    from observation_library.video_snippet import VideoSnippet
+
+    snippet = VideoSnippet(
+        [encoded_video],
+        start=100,
+        stop=150,
+        video_server_directory=str(tmp_path / "snippets"),
+        frame_cache=FrameCache(),
+    )
+    job = snippet._prepare_cut()
+    decoded = [frame for _, _, frame in snippet._read_frames(job)]
+    assert len(decoded) == job.num_frames
+
+    def decode_frame(job):
+        raise AssertionError("decoded a cached frame")
+
+    snippet._decode_frame = decode_frame
+    cached = [frame for _, _, frame in snippet._read_frames(snippet._prepare_cut())]
+    assert len(cached) == len(decoded)
+    assert all(np.array_equal(a, b) for a, b in zip(decoded, cached))
+    # other overlay settings use the same frames
+    snippet.render_settings.overlay_backend = "matplotlib"
+    assert snippet._prepare_cut().frame_key == job.frame_key
+    # another crop does not
+    snippet._get_roi = lambda padded_start, padded_stop: (0, 0, 63, 63)
+    snippet._invalidate()
+    assert snippet._prepare_cut().frame_key != job.frame_key
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+from helpers import decode_frame_number, encode_frame_number, write_video
+
+cv2 = pytest.importorskip("cv2")
+
+from observation_library.frame_sources import is_image_sequence
+from observation_library.multi_video_capture import MultiVideoCapture
+from observation_library.video_metadata import VideoMetadataStore
+
+
+@pytest.fixture
+def image_directory(tmp_path):
+    directory = tmp_path / "frames"
+    directory.mkdir()
+    for frame in range(12):
+        cv2.imwrite(str(directory / f"frame_{frame}.png"), encode_frame_number(frame))
+    return directory
+
+
+def test_is_image_sequence(tmp_path, image_directory):
+    video_file = write_video(tmp_path / "rec[1].mp4", 10)
+    assert is_image_sequence(image_directory)
+    assert is_image_sequence(os.path.join(image_directory, "frame_*.png"))
+    # video files with glob characters in their names
+    assert not is_image_sequence(video_file)
+    assert not is_image_sequence(tmp_path / "missing*.mp4")
+
+
+def test_read_video_with_glob_characters(tmp_path, cache_directory):
+    video_file = write_video(tmp_path / "rec[1].mp4", 10)
+    cap = MultiVideoCapture(
+        [video_file], metadata_store=VideoMetadataStore(str(cache_directory))
+    )
+    assert cap.total_frames == 10
+    ret, img = cap.read()
+    assert ret and decode_frame_number(img) == 0
+
+
+def test_read_image_sequence(image_directory, cache_directory):
+    cap = MultiVideoCapture(
+        [os.path.join(image_directory, "frame_*.png")],
+        sequence_fps=25,
+        metadata_store=VideoMetadataStore(str(cache_directory)),
+    )
+    assert cap.total_frames == 12
+    # natural sort order
+    for frame in range(12):
+        ret, img = cap.read()
+        assert ret and decode_frame_number(img) == frame
@@ -0,0 +1,39 @@
+import random
+
+import pytest
+from helpers import decode_frame_number
+
+cv2 = pytest.importorskip("cv2")
+
+from observation_library.keyframe_index import load_keyframe_index
+from observation_library.multi_video_capture import MultiVideoCapture
+from observation_library.video_metadata import VideoMetadataStore
+
+
+def test_keyframe_index(cache_directory, encoded_video):
+    index = load_keyframe_index(encoded_video)
+    assert index is not None
+    assert index.num_frames == 600
+    assert index.keyframes[0] == 0
+    assert len(index.timestamps) == 600
+    assert index.get_keyframe(75) <= 75
+    # cached
+    assert load_keyframe_index(encoded_video, build=False) == index
+
+
+@pytest.mark.parametrize("use_keyframe_index", [False, True])
+def test_random_seek_accuracy(cache_directory, encoded_video, use_keyframe_index):
+    cap = MultiVideoCapture(
+        [encoded_video, encoded_video],
+        use_keyframe_index=use_keyframe_index,
+        max_grab_frames=0,  # always seek
+        metadata_store=VideoMetadataStore(str(cache_directory)),
+    )
+    random.seed(0)
+    frames = [random.randrange(cap.total_frames) for _ in range(50)]
+    for frame in frames:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame)
+        ret, img = cap.read()
+        assert ret
+        assert decode_frame_number(img) == frame % 600
+    cap.release()
@@ -0,0 +1,144 @@
+import pytest
+
+pytest.importorskip("matplotlib")
+pytest.importorskip("traitlets")
+vassi_utils = pytest.importorskip("vassi.utils")
+
+from observation_library.render_settings import RenderSettings
+from observation_library.render_spec import get_render_spec
+
+OBSERVATION_DATA = {
+    "observations": [
+        {"category": "a", "start": 10, "stop": 20, "actor": 1, "recipient": 2},
+        {"category": "b", "start": 15, "stop": 40, "actor": 1, "recipient": 2},
+    ],
+    "highlight": [0, 1],
+}
+
+
+def get_key(render_settings, *, observation_data=OBSERVATION_DATA, individuals=None):
+    spec = get_render_spec(
+        render_settings,
+        observation_data=observation_data,
+        individuals=individuals,
+        start=0,
+        stop=50,
+        render_size=(640, 480),
+    )
+    return vassi_utils.hash_dict(spec)
+
+
+def create_settings(**kwargs):
+    render_settings = RenderSettings()
+    render_settings.highlight = True
+    for name, value in kwargs.items():
+        setattr(render_settings, name, value)
+    return render_settings
+
+
+def test_equal_defaults():
+    assert get_key(RenderSettings()) == get_key(RenderSettings())
+
+
+def test_dict_key_order():
+    first = create_settings(override_highlight_color={"a": "#00FF00", "b": "#0000FF"})
+    second = create_settings(override_highlight_color={"b": "#0000FF", "a": "#00FF00"})
+    assert get_key(first) == get_key(second)
+    reordered = {
+        "highlight": [0, 1],
+        "observations": [
+            {key: observation[key] for key in reversed(list(observation))}
+            for observation in OBSERVATION_DATA["observations"]
+        ],
+    }
+    assert get_key(first, observation_data=reordered) == get_key(first)
+
+
+def test_float_and_color_formatting():
+    individuals = [1, 2]
+    first = create_settings(overlay_size=5, actor_color="#ff0000")
+    second = create_settings(overlay_size=5.0000000001, actor_color=(1.0, 0.0, 0.0))
+    assert get_key(first, individuals=individuals) == get_key(
+        second, individuals=individuals
+    )
+    assert get_key(create_settings(text_color="#FFFFFF")) == get_key(
+        create_settings(text_color=(1, 1, 1))
+    )
+
+
+@pytest.mark.parametrize(
+    "name, value",
+    [
+        # resolved to the interval, region of interest and render size
+        ("interval_padding", 3.0),
+        ("crop_roi", False),
+        ("roi_padding", 10),
+        ("size_preset", "HD (1280x720)"),
+        # trajectories are not drawn without individuals
+        ("overlay_size", 10.0),
+        ("actor_color", "#00FF00"),
+        ("segments", []),
+    ],
+)
+def test_irrelevant_traits(name, value):
+    assert get_key(create_settings(**{name: value})) == get_key(create_settings())
+
+
+def test_labels_not_drawn():
+    first = create_settings(draw_label=False, text_color="#FF0000")
+    second = create_settings(draw_label=False, text_color="#00FF00")
+    assert get_key(first) == get_key(second)
+
+
+@pytest.mark.parametrize(
+    "name, value",
+    [
+        ("text_color", "#FF0000"),
+        ("box_color", "#000000"),
+        ("highlight_color", "#00FF00"),
+        ("override_highlight_color", {"a": "#00FF00"}),
+        ("draw_label", False),
+        ("overlay_backend", "matplotlib"),
+        ("crf", 30),
+        ("encoder_preset", "slow"),
+    ],
+)
+def test_relevant_traits(name, value):
+    assert get_key(create_settings(**{name: value})) != get_key(create_settings())
+
+
+def test_relevant_trajectory_traits():
+    individuals = [1, 2, 3]
+    default = get_key(create_settings(), individuals=individuals)
+    for name, value in [
+        ("overlay_size", 6.0),
+        ("actor_color", "#00FF00"),
+        ("other_color", "#00FF00"),
+        ("draw_trajectories", False),
+    ]:
+        key = get_key(create_settings(**{name: value}), individuals=individuals)
+        assert key != default, name
+
+
+def test_observation_data():
+    changed = {
+        **OBSERVATION_DATA,
+        "observations": [
+            {**OBSERVATION_DATA["observations"][0], "category": "c"},
+            OBSERVATION_DATA["observations"][1],
+        ],
+    }
+    settings = create_settings()
+    assert get_key(settings, observation_data=changed) != get_key(settings)
+
+
+def test_writer_parameters():
+    settings = create_settings()
+    ffmpeg_params = settings.get_writer_parameters()["ffmpeg_params"]
+    assert "+faststart" in ffmpeg_params
+    assert "-force_key_frames" not in ffmpeg_params
+    ffmpeg_params = settings.get_writer_parameters(streaming=True)["ffmpeg_params"]
+    assert "frag_keyframe+empty_moov+default_base_moof" in ffmpeg_params
+    settings.streaming = False
+    ffmpeg_params = settings.get_writer_parameters(streaming=True)["ffmpeg_params"]
+    assert "+faststart" in ffmpeg_params
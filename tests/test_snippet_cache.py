@@ -0,0 +1,114 @@
+import os
+import shutil
+import sqlite3
+import time
+
+import pytest
+
+from observation_library.snippet_cache import RenderLock, SnippetCache
+
+
+def write_snippet(directory, name, num_bytes):
+    path = directory / name
+    path.write_bytes(b"\0" * num_bytes)
+    return str(path)
+
+
+def test_add_contains_evict(tmp_path):
+    directory = tmp_path / "snippets"
+    cache = SnippetCache(str(directory), max_bytes=250)
+    first = write_snippet(directory, "first.mp4", 100)
+    cache.add(first, video_files=[])
+    second = write_snippet(directory, "second.mp4", 100)
+    cache.add(second, video_files=[])
+    assert cache.contains(first)  # most recently used
+    third = write_snippet(directory, "third.mp4", 100)
+    cache.add(third, video_files=[])
+    assert cache.list_files() == ["third.mp4", "first.mp4"]
+    assert not cache.contains(second)
+    assert cache.num_bytes == 200
+
+
+def test_invalidate_modified_source(tmp_path):
+    directory = tmp_path / "snippets"
+    video_file = tmp_path / "video.mp4"
+    video_file.write_bytes(b"video")
+    cache = SnippetCache(str(directory))
+    snippet = write_snippet(directory, "snippet.mp4", 10)
+    cache.add(snippet, video_files=[str(video_file)])
+    assert cache.contains(snippet)
+    video_file.write_bytes(b"modified video")
+    assert not cache.contains(snippet)
+
+
+def test_deleted_directory(tmp_path):
+    directory = tmp_path / "snippets"
+    cache = SnippetCache(str(directory))
+    snippet = write_snippet(directory, "snippet.mp4", 10)
+    cache.add(snippet, video_files=[])
+    # users clear the cache by deleting the directory
+    shutil.rmtree(directory)
+    assert not cache.contains(snippet)
+    assert cache.list_files() == []
+    assert cache.num_bytes == 0
+    snippet = write_snippet(directory, "snippet.mp4", 10)
+    cache.add(snippet, video_files=[])
+    assert cache.contains(snippet)
+
+
+def make_stale(render_lock):
+    modified = time.time() - 2 * render_lock.stale_after
+    os.utime(render_lock.lock_file, (modified, modified))
+
+
+def test_render_lock(tmp_path):
+    output_file = str(tmp_path / "snippet.mp4")
+    first, second = RenderLock(output_file), RenderLock(output_file)
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert not os.path.exists(first.lock_file)
+    assert second.acquire()
+    second.release()
+
+
+def test_break_stale_render_lock(tmp_path):
+    output_file = str(tmp_path / "snippet.mp4")
+    crashed, first, second = (RenderLock(output_file) for _ in range(3))
+    assert crashed.acquire()
+    crashed._stop_heartbeat.set()
+    make_stale(crashed)
+    assert first._is_stale() and second._is_stale()
+    # the first waiter breaks the stale lock and acquires it, before the second
+    # waiter (that also found it stale) breaks it
+    assert first.acquire()
+    second._break()
+    assert os.path.exists(first.lock_file)
+    assert not second.acquire()
+    assert os.listdir(tmp_path) == ["snippet.mp4.lock"]
+    first.release()
+
+
+def test_connections_are_closed(tmp_path, monkeypatch):
+    connections = []
+    connect = sqlite3.connect
+
+    def track_connect(*args, **kwargs):
+        connections.append(connect(*args, **kwargs))
+        return connections[-1]
+
+    monkeypatch.setattr(sqlite3, "connect", track_connect)
+    directory = tmp_path / "snippets"
+    cache = SnippetCache(str(directory), max_bytes=150)
+    for name in ("first.mp4", "second.mp4"):
+        cache.add(write_snippet(directory, name, 100), video_files=[])
+    assert cache.contains(str(directory / "second.mp4"))
+    assert cache.list_files() == ["second.mp4"]
+    assert cache.num_bytes == 100
+    assert cache.invalidate(tmp_path / "video.mp4") == 0
+    assert len(connections) > 0
+    for connection in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute("SELECT 1")
+    # committed, visible to other connections
+    assert SnippetCache(str(directory)).list_files() == ["second.mp4"]
@@ -0,0 +1,108 @@
+import pytest
+
+pytest.importorskip("traitlets")
+
+from observation_library.render_settings import RenderSettings
+from observation_library.timeline import build_timeline
+
+
+def get_observation_data(*intervals, highlight=()):
+    return {
+        "observations": [
+            {"category": category, "start": start, "stop": stop}
+            for category, start, stop in intervals
+        ],
+        "highlight": list(highlight),
+    }
+
+
+def get_categories(timeline, num_frames):
+    return [
+        tuple(label.category for label in timeline.get(count).labels)
+        for count in range(num_frames)
+    ]
+
+
+def test_without_observations():
+    assert build_timeline({}, RenderSettings(), start=0, num_frames=10) is None
+    timeline = build_timeline(
+        get_observation_data(), RenderSettings(), start=0, num_frames=10
+    )
+    assert get_categories(timeline, 10) == [()] * 10
+
+
+def test_run_boundaries():
+    timeline = build_timeline(
+        get_observation_data(("a", 10, 20)), RenderSettings(), start=0, num_frames=50
+    )
+    # observations are active until their stop frame (inclusive)
+    assert get_categories(timeline, 50) == [()] * 10 + [("a",)] * 11 + [()] * 29
+    # runs with the same labels share their state
+    assert len(timeline.states) == 2
+    assert timeline.state_ids[9] == timeline.state_ids[21]
+
+
+def test_clipped_to_snippet():
+    timeline = build_timeline(
+        get_observation_data(("a", 0, 14), ("b", 18, 100)),
+        RenderSettings(),
+        start=10,
+        num_frames=10,
+    )
+    assert get_categories(timeline, 10) == [("a",)] * 5 + [()] * 3 + [("b",)] * 2
+
+
+def test_overlapping_observations():
+    timeline = build_timeline(
+        get_observation_data(("a", 10, 20), ("b", 15, 40)),
+        RenderSettings(),
+        start=0,
+        num_frames=50,
+    )
+    assert get_categories(timeline, 50) == (
+        [()] * 10 + [("a",)] * 5 + [("a", "b")] * 6 + [("b",)] * 20 + [()] * 9
+    )
+
+
+def test_adjacent_observations():
+    timeline = build_timeline(
+        get_observation_data(("a", 10, 19), ("b", 20, 29)),
+        RenderSettings(),
+        start=0,
+        num_frames=40,
+    )
+    assert get_categories(timeline, 40) == (
+        [()] * 10 + [("a",)] * 10 + [("b",)] * 10 + [()] * 10
+    )
+
+
+def test_highlight():
+    render_settings = RenderSettings()
+    render_settings.highlight = True
+    render_settings.override_highlight_color = {"b": "#00FF00"}
+    timeline = build_timeline(
+        get_observation_data(("a", 0, 9), ("b", 5, 14), ("c", 0, 14), highlight=[0, 1]),
+        render_settings,
+        start=0,
+        num_frames=15,
+    )
+    first, both, second = timeline.get(0), timeline.get(5), timeline.get(10)
+    assert first.highlight_color == render_settings.highlight_color
+    # the highlight color of the last active highlighted observation
+    assert both.highlight_color == "#00FF00"
+    assert second.highlight_color == "#00FF00"
+    a, b, c = both.labels
+    assert a.highlighted and a.color == a.box_color == render_settings.highlight_color
+    assert b.highlighted and b.color == b.box_color == "#00FF00"
+    assert not c.highlighted
+    assert c.color == render_settings.text_color
+    assert c.box_color == render_settings.box_color
+    render_settings.draw_label = False
+    timeline = build_timeline(
+        get_observation_data(("a", 0, 9), highlight=[0]),
+        render_settings,
+        start=0,
+        num_frames=10,
+    )
+    assert timeline.get(0).labels == ()
+    assert timeline.get(0).highlight_color == render_settings.highlight_color
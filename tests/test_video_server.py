@@ -0,0 +1,119 @@
+import http.client
+import json
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from observation_library.video_server import VideoServer
+
+FILE_SIZE = 2**22
+TOKEN = "token"
+
+
+@pytest.fixture
+def video_server(tmp_path):
+    content = os.urandom(FILE_SIZE)
+    (tmp_path / "snippet.mp4").write_bytes(content)
+    server = VideoServer(("127.0.0.1", 0), token=TOKEN)
+    server.add_directory("", str(tmp_path))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, content
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def get_range(port, header):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        connection.request("GET", "/snippet.mp4", headers={"Range": header})
+        response = connection.getresponse()
+        return response.status, response.getheader("Content-Range"), response.read()
+    finally:
+        connection.close()
+
+
+def post(port, path, content, *, token=TOKEN):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        connection.request(
+            "POST",
+            path,
+            body=json.dumps(content),
+            headers={"Content-Type": "application/json", "X-Server-Token": token},
+        )
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def test_concurrent_ranged_requests(video_server):
+    server, content = video_server
+    port = server.server_address[1]
+    random.seed(0)
+    ranges = []
+    for _ in range(256):
+        start = random.randrange(FILE_SIZE)
+        ranges.append((start, min(start + random.randrange(2**16), FILE_SIZE - 1)))
+    with ThreadPoolExecutor(32) as executor:
+        responses = list(
+            executor.map(
+                lambda byte_range: get_range(port, "bytes={}-{}".format(*byte_range)),
+                ranges,
+            )
+        )
+    for (start, end), (status, content_range, body) in zip(ranges, responses):
+        assert status == 206
+        assert content_range == f"bytes {start}-{end}/{FILE_SIZE}"
+        assert body == content[start : end + 1]
+
+
+def test_open_and_suffix_ranges(video_server):
+    server, content = video_server
+    port = server.server_address[1]
+    status, content_range, body = get_range(port, f"bytes={FILE_SIZE - 10}-")
+    assert status == 206
+    assert content_range == f"bytes {FILE_SIZE - 10}-{FILE_SIZE - 1}/{FILE_SIZE}"
+    assert body == content[-10:]
+    status, content_range, body = get_range(port, "bytes=-100")
+    assert status == 206
+    assert content_range == f"bytes {FILE_SIZE - 100}-{FILE_SIZE - 1}/{FILE_SIZE}"
+    assert body == content[-100:]
+
+
+def test_unsatisfiable_range(video_server):
+    server, _ = video_server
+    status, content_range, body = get_range(
+        server.server_address[1], f"bytes={FILE_SIZE}-"
+    )
+    assert status == 416
+    assert content_range == f"bytes */{FILE_SIZE}"
+    assert body == b""
+
+
+def test_render_requires_token(video_server, tmp_path):
+    server, _ = video_server
+    port = server.server_address[1]
+    spec = {"video_files": [str(tmp_path / "video.mp4")], "start": 0, "stop": 10}
+    assert post(port, "/video_files", {"video_files": []}, token="")[0] == 403
+    assert post(port, "/render", spec, token="")[0] == 403
+    assert post(port, "/render", spec, token="wrong")[0] == 403
+
+
+def test_render_rejects_unknown_video_files(video_server, tmp_path):
+    server, _ = video_server
+    port = server.server_address[1]
+    known = tmp_path / "videos" / "video.mp4"
+    status, _ = post(port, "/video_files", {"video_files": [str(known)]})
+    assert status == 200
+    assert server.is_known_video_file(f"{tmp_path}/videos/../videos/video.mp4")
+    for video_file in ["/etc/passwd", str(tmp_path / "videos" / ".." / "other.mp4")]:
+        spec = {"video_files": [str(known), video_file], "start": 0, "stop": 10}
+        assert post(port, "/render", spec)[0] == 403
+    assert post(port, "/render", {"video_files": "video.mp4"})[0] == 400
+    assert post(port, "/video_files", {"video_files": "video.mp4"})[0] == 400
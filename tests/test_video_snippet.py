@@ -0,0 +1,191 @@
+import os
+
+import numpy as np
+import pytest
+from helpers import (
+    decode_frame_number,
+    encode_frame_number,
+    read_box_types,
+    read_frames,
+)
+
+pytest.importorskip("cv2")
+pytest.importorskip("matplotlib")
+pytest.importorskip("vassi.utils")
+
+from observation_library.frame_cache import FrameCache
+from observation_library.render_settings import RenderSettings
+from observation_library.snippet_cache import (
+    RenderLock,
+    get_partial_file,
+)
+from observation_library.video_snippet import VideoSnippet
+
+
+def test_cut_streams_with_default_settings(tmp_path, cache_directory, encoded_video):
+    snippet = VideoSnippet(
+        [str(encoded_video)],
+        start=100,
+        stop=200,
+        video_server_directory=str(tmp_path / "snippets"),
+    )
+    streamed = []
+
+    def on_stream():
+        # the partial file is streamed by the video server while it is rendered
+        streamed.append(os.path.getsize(get_partial_file(snippet.output_file)))
+
+    assert snippet.cut(on_stream=on_stream)
+    assert len(streamed) == 1 and streamed[0] > 0
+    assert os.path.getsize(snippet.output_file) > 0
+    assert not os.path.exists(get_partial_file(snippet.output_file))
+    assert snippet.snippet_cache.contains(snippet.output_file)
+    # rendered fragmented for streaming, stored with faststart (as unstreamed)
+    box_types = read_box_types(snippet.output_file)
+    assert "moof" not in box_types
+    assert box_types.index("moov") < box_types.index("mdat")
+    frames = read_frames(snippet.output_file)
+    # padded by one second (interval_padding)
+    assert [decode_frame_number(img) for img in frames] == list(range(75, 225))
+
+
+def test_unstreamed_cut_matches_streamed_layout(
+    tmp_path, cache_directory, encoded_video
+):
+    box_types = []
+    for on_stream in (lambda: None, None):
+        snippet = VideoSnippet(
+            [str(encoded_video)],
+            start=100,
+            stop=200,
+            render_settings=RenderSettings(interval_padding=0, faststart=False),
+            video_server_directory=str(tmp_path / f"streamed={on_stream is not None}"),
+        )
+        assert snippet.cut(on_stream=on_stream)
+        box_types.append(read_box_types(snippet.output_file))
+    streamed, unstreamed = box_types
+    assert "moof" not in streamed
+    assert streamed.index("mdat") < streamed.index("moov")
+    assert streamed == unstreamed
+
+
+def create_snippet(tmp_path, video_file):
+    return VideoSnippet(
+        [str(video_file)],
+        start=100,
+        stop=200,
+        video_server_directory=str(tmp_path / "snippets"),
+    )
+
+
+def test_cut_releases_render_lock(tmp_path, cache_directory, encoded_video):
+    snippet = create_snippet(tmp_path, encoded_video)
+
+    def prepare_cut(**kwargs):
+        raise RuntimeError("failed")
+
+    snippet._prepare_cut = prepare_cut
+    with pytest.raises(RuntimeError):
+        snippet.cut()
+    assert not os.path.exists(f"{snippet.output_file}.lock")
+
+
+def test_cut_many_releases_render_locks(tmp_path, cache_directory, encoded_video):
+    snippet = create_snippet(tmp_path, encoded_video)
+    prepare_cut = snippet._prepare_cut
+    prepared = []
+
+    def fail_second(**kwargs):
+        if len(prepared) == 1:
+            raise RuntimeError("failed")
+        prepared.append(prepare_cut(**kwargs))
+        return prepared[-1]
+
+    snippet._prepare_cut = fail_second
+    with pytest.raises(RuntimeError):
+        snippet.cut_many([{"start": 100, "stop": 200}, {"start": 300, "stop": 400}])
+    assert os.listdir(tmp_path / "snippets") == [".snippets.sqlite"]
+
+
+def test_finish_releases_render_lock(tmp_path, cache_directory, encoded_video):
+    snippet = create_snippet(tmp_path, encoded_video)
+    assert snippet.cut()
+
+    class Writer:
+        def close(self):
+            raise OSError("failed")
+
+    render_lock = RenderLock(str(tmp_path / "snippets" / "other.mp4"))
+    assert render_lock.acquire()
+    job = snippet._prepare_cut(render_lock=render_lock)
+    job.writer = Writer()
+    with open(job.partial_file, "wb"):
+        pass
+    with pytest.raises(OSError):
+        job.finish(True)
+    assert not render_lock.is_owned
+    assert not os.path.exists(render_lock.lock_file)
+    assert not os.path.exists(job.partial_file)
+
+
+def test_pipelined_cut_matches_sequential(tmp_path, cache_directory, encoded_video):
+    outputs = []
+    for pipelined in (False, True):
+        snippet = VideoSnippet(
+            [str(encoded_video)],
+            start=100,
+            stop=200,
+            render_settings=RenderSettings(interval_padding=0),
+            video_server_directory=str(tmp_path / f"pipelined={pipelined}"),
+            pipelined=pipelined,
+            num_overlay_workers=3,
+            queue_size=4,
+            frame_cache=FrameCache(max_bytes=0),  # decode both times
+        )
+        assert snippet.cut()
+        outputs.append(read_frames(snippet.output_file))
+    sequential, pipelined = outputs
+    assert [decode_frame_number(img) for img in pipelined] == list(range(100, 200))
+    assert np.array_equal(sequential, pipelined)
+
+
+def test_cut_many_decodes_overlapping_snippets_once(
+    tmp_path, cache_directory, encoded_video
+):
+    snippet = VideoSnippet(
+        [str(encoded_video)],
+        start=0,
+        stop=10,
+        render_settings=RenderSettings(interval_padding=0, roi_padding=0),
+        video_server_directory=str(tmp_path / "snippets"),
+    )
+    # the region of interest of each snippet (inclusive), usually from trajectories
+    rois = {100: (0, 0, 59, 63), 130: (60, 0, 127, 63), 300: (20, 10, 99, 53)}
+    snippet._get_roi = lambda padded_start, padded_stop: rois[int(padded_start)]
+    read = snippet.cap.read
+    num_reads = 0
+
+    def count_reads():
+        nonlocal num_reads
+        num_reads += 1
+        return read()
+
+    snippet.cap.read = count_reads
+    specs = [
+        {"start": 100, "stop": 160},
+        {"start": 130, "stop": 200},
+        {"start": 300, "stop": 320},
+        {"start": 100, "stop": 160},  # rendered once
+    ]
+    assert snippet.cut_many(specs) == [True] * len(specs)
+    assert num_reads == 100 + 20
+    for spec in specs:
+        snippet.start, snippet.stop = spec["start"], spec["stop"]
+        x0, y0, x1, y1 = rois[spec["start"]]
+        frames = read_frames(
+            snippet.output_file, width=x1 - x0 + 1, height=y1 - y0 + 1
+        ).astype(float)
+        assert len(frames) == spec["stop"] - spec["start"]
+        for frame, img in zip(range(spec["start"], spec["stop"]), frames):
+            expected = encode_frame_number(frame)[y0 : y1 + 1, x0 : x1 + 1]
+            assert np.abs(img - expected).mean() < 10